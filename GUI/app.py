@@ -1,21 +1,44 @@
+import argparse
 import sys
 
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QSplitter
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QSplitter, QTabWidget, QShortcut
 from PyQt5.QtCore import Qt, QTimer, QSize
-from PyQt5.QtGui import QIcon
+from PyQt5.QtGui import QIcon, QKeySequence
 from pathlib import Path
 
 from arduino_panel import ArduinoPanel
 from chiller_panel import ChillerPanel
 from hv_panel import HVPanel
 from lv_panel import LVPanel
+from plot_panel import PlotPanel
+from stands_panel import StandsPanel
+from diagnostics_panel import DiagnosticsPanel
+from lag_monitor import EventLoopLagMonitor
 
 MAIN_DIR = Path(__file__).parent.parent
 gui_dir = MAIN_DIR / "GUI"
 sys.path.append(str(gui_dir))
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
+
+from timeseries import TimeSeriesStore
+from rollup import RollupEngine
+from sqlite_store import SQLiteStore
+from bus import Bus
+from interlock import InterlockEngine, stand_rules
+from snapshot import DEFAULT_NAME, SnapshotReader, follow
+from api import DEFAULT_PORT, APIServer
+from config import DEFAULT_CONFIG, load_config
+from profiler import SamplingProfiler
+from stability import StabilityDetector, stand_trackers
+from supervisor import Supervisor, snapshot_name
+import command_stats
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, stand=None, db_path=None, snapshot=None, api_port=None, config=None, supervisor=None,
+                 diagnostics=False):
         super().__init__()
         
         self.setWindowTitle("ETL Testing GUI")
@@ -23,11 +46,53 @@ class MainWindow(QMainWindow):
         self.setStyleSheet("background-color: #3b3b3b;")
         self.setWindowIcon(QIcon(str(gui_dir / "icon.png")))
 
+        # ----- Devices of the stand this window drives -----
+        self.config = config if config is not None else load_config()
+        self.stand = stand if stand is not None else self.config.stand()
+        self.supervisor = supervisor
+
+        # ----- Every reading is published once and fanned out to subscribers -----
+        self.bus = Bus()
+        # ----- Shared recent history of every reading -----
+        self.store = TimeSeriesStore()
+        self.bus.attach("store", lambda m: self.store.append_reading(m.device, m.values, m.stamp.monotonic()))
+        # ----- Raw / 1 s / 1 min / 1 h rollups of logged readings -----
+        self.rollups = RollupEngine(MAIN_DIR / "Environmental Data" / "Rollups")
+        self.backends = [self.rollups]
+        # ----- Optional SQLite telemetry database -----
+        self.db = None
+        if db_path is not None:
+            self.db = SQLiteStore(db_path)
+            self.backends.append(self.db)
+        # ----- Readings come from the ports, or from an acquisition daemon's snapshot -----
+        self.snapshot = None
+        self.interlock = None
+        if snapshot is not None:
+            # The daemon owns the ports and runs the interlocks
+            self.snapshot = SnapshotReader.wait(snapshot)
+            self.follow_thread, self.follow_stop_evt = follow(self.snapshot, self.bus)
+        else:
+            # ----- Interlocks, evaluated off the GUI thread -----
+            self.interlock = InterlockEngine(stand_rules(self.stand), log_dir=MAIN_DIR / "Environmental Data" / "Interlock Logs",
+                                            bus=self.bus)
+        # ----- Settling of the bath and TCs; the daemon publishes its own -----
+        self.stability = None
+        if snapshot is None:
+            self.stability = StabilityDetector(self.bus, stand_trackers(self.stand))
+        # ----- Optional read-only monitoring API -----
+        self.api = None
+        if api_port is not None:
+            self.api = APIServer(self.bus, port=api_port)
+
         # ----- Build panels -----
-        self.ard = ArduinoPanel()
-        self.chill = ChillerPanel()
-        self.hv = HVPanel()
-        self.lv = LVPanel()    
+        self.ard = ArduinoPanel(bus=self.bus, backends=self.backends, interlock=self.interlock,
+                             config=self.stand.first("Arduino"))
+        self.chill = ChillerPanel(bus=self.bus, backends=self.backends, interlock=self.interlock,
+                               config=self.stand.first("Chiller"))
+        self.hv = HVPanel(bus=self.bus, backends=self.backends, interlock=self.interlock,
+                       config=self.stand.first("HV"))
+        self.lv = LVPanel(bus=self.bus, backends=self.backends, interlock=self.interlock,
+                       config=self.stand.first("LV"))
 
         # ----- Left column: vertical splitter (Arduino / Chiller / HV / LV) -----
         self.left_split = QSplitter(Qt.Vertical)
@@ -38,8 +103,11 @@ class MainWindow(QMainWindow):
 
         self.left_split.setHandleWidth(6)    
 
-        # ----- Right column: vertical splitter (Module Testing) -----
+        # ----- Right column: vertical splitter (Live Plots / Module Testing) -----
+        self.plots = PlotPanel(self.store, self.rollups)
+
         self.right_split = QSplitter(Qt.Vertical)
+        self.right_split.addWidget(self.plots)
         self.right_split.setHandleWidth(6)
 
 
@@ -55,12 +123,84 @@ class MainWindow(QMainWindow):
         root.setContentsMargins(8, 8, 8, 8)
         root.setSpacing(8)
         root.addWidget(self.main_split)
-        self.setCentralWidget(container)
+
+        # ----- Sampling profiler and event loop lag, toggled at runtime -----
+        self.lag_monitor = EventLoopLagMonitor(parent=self)
+        self.profiler = SamplingProfiler(lag_monitor=self.lag_monitor)
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self, activated=self._shortcut_profiling)
+
+        # ----- Tabs: this stand / overview of every stand / command latencies -----
+        self.stands = None
+        self.diagnostics = None
+        if len(self.config.stands) > 1 or supervisor is not None or diagnostics:
+            self.tabs = QTabWidget()
+            self.tabs.setStyleSheet("""
+            QTabBar::tab { color: #ffffff; background: #2b2b2b; padding: 6px 16px; }
+            QTabBar::tab:selected { background: #4b4b4b; }
+            """)
+            self.tabs.addTab(container, self.stand.name)
+            if len(self.config.stands) > 1 or supervisor is not None:
+                self.stands = StandsPanel(self.config, supervisor)
+                self.tabs.addTab(self.stands, "Stands")
+            if diagnostics:
+                self.diagnostics = DiagnosticsPanel(remote=snapshot is not None, toggle_profiling=self.toggle_profiling,
+                                                    lag_monitor=self.lag_monitor)
+                self.tabs.addTab(self.diagnostics, "Diagnostics")
+            self.setCentralWidget(self.tabs)
+        else:
+            self.setCentralWidget(container)
 
         QTimer.singleShot(0, self._init_split_sizes)
 
+    def toggle_profiling(self):
+        """Starts profiling, or stops it and returns the path of the flamegraph input."""
+        if not self.profiler.running:
+            self.lag_monitor.reset()
+            self.profiler.reset()
+            self.lag_monitor.start()
+            self.profiler.start()
+            print("Profiling started")
+            return None
+        self.profiler.stop()
+        self.lag_monitor.stop()
+        path = self.profiler.dump()
+        print(self.lag_monitor.format())
+        with open(path.with_suffix(".lag.txt"), "w") as f:
+            f.write(self.lag_monitor.format() + "\n")
+        return path
+
+    def _shortcut_profiling(self):
+        path = self.toggle_profiling()
+        if self.diagnostics is not None:
+            self.diagnostics.show_profiling(path)
+
+    def closeEvent(self, event):
+        if self.profiler.running:
+            self.toggle_profiling()
+        if self.stands is not None:
+            self.stands.close_views()
+        if self.diagnostics is not None:
+            self.diagnostics.stop()
+        if self.snapshot is not None:
+            self.follow_stop_evt.set()
+            self.follow_thread.join(timeout=1)
+            self.snapshot.close()
+        if self.interlock is not None:
+            self.interlock.stop()
+        if self.stability is not None:
+            self.stability.stop()
+        if self.api is not None:
+            self.api.close()
+        self.bus.close()
+        self.rollups.flush()
+        if self.db is not None:
+            self.db.close()
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        super().closeEvent(event)
+
     def _init_split_sizes(self):
-        total_w = self.centralWidget().width()
+        total_w = self.main_split.width()
         self.main_split.setSizes([total_w // 2, total_w // 2])
 
         # Left split: Arduino/Chiller/HV equal heights 1:1:1
@@ -71,8 +211,32 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="ETL Testing GUI")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--stand", help="stand to drive, by default the first in the config")
+    parser.add_argument("--db", help="also log readings to this SQLite database")
+    parser.add_argument("--daemon", nargs="?", const=DEFAULT_NAME, metavar="SHM",
+                        help="plot readings from a running acquisition daemon instead of the serial ports")
+    parser.add_argument("--api", type=int, nargs="?", const=DEFAULT_PORT, metavar="PORT",
+                        help="serve the read-only monitoring API on localhost")
+    parser.add_argument("--supervise", action="store_true",
+                        help="acquire every stand of the config in worker processes and follow --stand's snapshot")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help="record serial command latencies and show them in a Diagnostics tab")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setWindowIcon(QIcon(str(gui_dir / "icon.png")))
-    window = MainWindow()
+    config = load_config(args.config)
+    stand = config.stand(args.stand)
+    supervisor = None
+    if args.supervise:
+        supervisor = Supervisor(args.config)
+        supervisor.start()
+        args.daemon = snapshot_name(stand.name)
+    if args.diagnostics:
+        command_stats.enable()
+    window = MainWindow(stand, db_path=args.db, snapshot=args.daemon, api_port=args.api,
+                        config=config, supervisor=supervisor, diagnostics=args.diagnostics)
     window.show()
     sys.exit(app.exec_())
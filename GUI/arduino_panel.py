@@ -2,7 +2,6 @@ import sys
 import threading
 import serial
 import time
-import os
 
 from PyQt5.QtWidgets import QGridLayout, QPushButton, QLabel, QHBoxLayout, QVBoxLayout
 from pathlib import Path
@@ -11,14 +10,24 @@ from PyQt5.QtGui import QFont
 from panel import Panel
 
 MAIN_DIR = Path(__file__).parent.parent
-ard_dir = MAIN_DIR / "drivers" / "Arduino"
-sys.path.append(str(ard_dir))
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
 
-from arduino_driver import Arduino
+from config import DeviceConfig
+from data_logger import DataLogger
+from pollers import ArduinoPoller, last_stamp
 
 class ArduinoPanel(Panel):
-    def __init__(self, title="Arduino"):
+    def __init__(self, title="Arduino", bus=None, backends=None, interlock=None, config=None):
         super().__init__(title)
+        self.bus = bus
+        self.config = config or DeviceConfig.default("Arduino")
+        self.interlock = interlock
+        self.logger = DataLogger(self.config.name, "Arduino Data", "sensor_data", backends)
 
         self.setObjectName("arduinoPanel")
         self.setStyleSheet("""
@@ -72,7 +81,6 @@ class ArduinoPanel(Panel):
         self.recording_thread = None
 
         self.log_status = False
-        self.log_timestamp = None
 
         self.btn_connect = QPushButton("Connect")
         self.btn_connect.setObjectName("greenButton")
@@ -138,8 +146,9 @@ class ArduinoPanel(Panel):
         buttons_and_labels.addLayout(button_row)
         buttons_and_labels.addLayout(label_grid)
         self.subgrid.addLayout(buttons_and_labels, 1, 0, 1, 2, alignment=Qt.AlignTop)
-        self.arduino = Arduino("/dev/arduino", baudrate=115200, timeout=1.0)
-        self.sample_time = 2.5
+        self.arduino = None
+        self.sample_time = self.config.interval
+        self.rates = ArduinoPoller.make_rates(**self.config.poll_settings)
 
     def start_recording(self):
         if self.recording_thread != None:
@@ -148,14 +157,16 @@ class ArduinoPanel(Panel):
         
         self.recorder_stop_evt = threading.Event()
         try:
-            self.arduino.connect()
+            self.arduino = self.config.open()
+            if self.interlock is not None:
+                self.interlock.attach(self.config.name, self.arduino, self.config.type)
             self.lbl_status.setText("Connected")
         except serial.SerialException as e:
             print(f"Failed to connect: {e}")
 
         time.sleep(self.sample_time)
         self.recorder_stop_evt.clear()
-        self.recording_thread = threading.Thread(target=self.record, daemon=True)
+        self.recording_thread = threading.Thread(target=self.record, name="record", daemon=True)
         self.recording_thread.start()
         self.btn_disconnect.setEnabled(True)
         self.btn_connect.setEnabled(False)
@@ -170,6 +181,8 @@ class ArduinoPanel(Panel):
             self.recording_thread.join(timeout=1)
             self.recording_thread = None
         if self.arduino:
+            if self.interlock is not None:
+                self.interlock.detach(self.config.name)
             self.arduino.close()
             self.lbl_status.setText("Disconnected")
             self.ambtemp_lbl.setText("Ambient Temp: --.-°C")
@@ -190,6 +203,16 @@ class ArduinoPanel(Panel):
     def record(self):
         while not self.recorder_stop_evt.is_set():
             data = self.arduino.get_data()
+            stamp = last_stamp(self.arduino)
+
+            reading = None
+            if data is None:
+                self.rates.hurry()
+            else:
+                reading = ArduinoPoller.reading(self.arduino)
+                self.rates.update(reading)
+                if self.bus is not None:
+                    self.bus.publish(self.config.name, reading, stamp)
 
             self.lbl_status.setText("Connected" if self.arduino.is_connected else "Disconnected")
 
@@ -242,24 +265,15 @@ class ArduinoPanel(Panel):
                 time.sleep(1)
 
             if self.log_status:
-                timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
-                maindir = Path(__file__).parent.parent
-
-                resultdir = maindir / "Environmental Data" / "Arduino Data"
-                if not os.path.isdir(resultdir):
-                    os.makedirs(resultdir)
-
-                resultdir.mkdir(exist_ok=True)
-
-                outfile = resultdir / f"sensor_data_{self.log_timestamp}.csv"
-                with open(outfile, 'a') as f:
-                    f.write(f"{timestamp}: {data}\n")
-            time.sleep(self.sample_time)
+                self.logger.write(data, reading, stamp)
+            # Faster while readings change or the TCs near the dew point, slower while flat
+            self.recorder_stop_evt.wait(self.rates.period)
 
     def toggle_log(self):
         self.log_status = not self.log_status
         if self.log_status:
             self.lbl_logging.setText("Logging")
-            self.log_timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
+            self.logger.start()
         else:
             self.lbl_logging.setText("Not Logging")
+            self.logger.stop()
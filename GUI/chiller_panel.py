@@ -2,7 +2,6 @@ import sys
 import threading
 import serial
 import time
-import os
 
 from PyQt5.QtWidgets import QPushButton, QLabel, QLineEdit, QHBoxLayout, QVBoxLayout
 from pathlib import Path
@@ -11,14 +10,25 @@ from PyQt5.QtGui import QFont
 from panel import Panel
 
 MAIN_DIR = Path(__file__).parent.parent
-chill_dir = MAIN_DIR / "drivers" / "Chiller"
-sys.path.append(str(chill_dir))
-
-from chiller_driver import Chiller
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
+
+from config import DeviceConfig
+from data_logger import DataLogger
+from pollers import ChillerPoller, poll_stamp
+from stability import STABILITY_DEVICE
 
 class ChillerPanel(Panel):
-    def __init__(self, title="Chiller"):
+    def __init__(self, title="Chiller", bus=None, backends=None, interlock=None, config=None):
         super().__init__(title)
+        self.bus = bus
+        self.config = config or DeviceConfig.default("Chiller")
+        self.interlock = interlock
+        self.logger = DataLogger(self.config.name, "Chiller Data", "chiller_data", backends)
 
         self.setObjectName("ChillerPanel")
         self.setStyleSheet("""
@@ -71,7 +81,6 @@ class ChillerPanel(Panel):
         self.chiller_stop_evt = None
         self.chiller_thread = None
         self.log_status = False
-        self.log_timestamp = None
 
         self.btn_connect = QPushButton("Connect")
         self.btn_connect.setObjectName("greenButton")
@@ -113,6 +122,14 @@ class ChillerPanel(Panel):
         label_row.addWidget(self.lbl_set_temp)
         label_row.addWidget(self.lbl_curr_temp)
 
+        # Whether the bath has settled, or how long it is expected to take
+        self.lbl_stability = make_label("Bath: ---")
+        stability_row = QHBoxLayout()
+        stability_row.addWidget(self.lbl_stability)
+        stability_row.addStretch(1)
+        if self.bus is not None:
+            self.bus.attach(f"{self.config.name}-stability", self.show_stability, devices=[STABILITY_DEVICE])
+
         input_row = QHBoxLayout()
 
         self.lbl_power_toggle = make_label("Power: ")
@@ -141,11 +158,12 @@ class ChillerPanel(Panel):
         layout = QVBoxLayout()
         layout.addLayout(button_row)
         layout.addLayout(label_row)
+        layout.addLayout(stability_row)
         layout.addLayout(input_row)
         layout.addStretch(1)
 
         self.subgrid.addLayout(layout, 1, 0, 5, 3)
-        self.sample_time = 1.0
+        self.sample_time = self.config.interval
         self.cmd_waiting = False
 
     def start_chiller(self):
@@ -155,13 +173,15 @@ class ChillerPanel(Panel):
         
         self.chiller_stop_evt = threading.Event()
         try:
-            self.chiller = JULABO("/dev/chiller", baud=4800)
+            self.chiller = self.config.open()
+            if self.interlock is not None:
+                self.interlock.attach(self.config.name, self.chiller, self.config.type)
             self.lbl_status.setText("Connected")
         except serial.SerialException as e:
             print(f"Failed to connect: {e}")
         
         self.chiller_stop_evt.clear()
-        self.chiller_thread = threading.Thread(target=self.chiller_run, daemon=True)
+        self.chiller_thread = threading.Thread(target=self.chiller_run, name="chiller_run", daemon=True)
         self.chiller_thread.start()
         self.btn_disconnect.setEnabled(True)
         self.btn_connect.setEnabled(False)
@@ -177,6 +197,8 @@ class ChillerPanel(Panel):
             self.chiller_thread.join()
             self.chiller_thread = None
         if self.chiller:
+            if self.interlock is not None:
+                self.interlock.detach(self.config.name)
             self.chiller.close()
             self.lbl_status.setText("Disconnected")
             self.lbl_power.setText("Power: ---")
@@ -201,12 +223,14 @@ class ChillerPanel(Panel):
         while not self.chiller_stop_evt.is_set():
             if not self.cmd_waiting:
                 try:
-                    self.curr_temp = self.chiller.get_temperature()
-                    self.set_temp = self.chiller.get_work_temperature()
+                    messages = ChillerPoller.read_chiller(self.chiller)
+                    values = {key: value for reading, _ in messages for key, value in reading.items()}
+                    self.curr_temp = values["TEMP"]
+                    self.set_temp = values["TSET"]
+                    self.power = values["POWER"]
                     self.lbl_curr_temp.setText(f"Current Temp: {self.curr_temp:.2f} °C")
                     self.lbl_set_temp.setText(f"Set Temp: {self.set_temp:.2f} °C")
-                    self.power = self.chiller.get_power().strip()
-                    if self.power == '1':
+                    if self.power:
                         self.lbl_power.setText("Power: ON")
                         self.btn_power_on.setEnabled(False)
                         self.btn_power_off.setEnabled(True)
@@ -214,22 +238,14 @@ class ChillerPanel(Panel):
                         self.lbl_power.setText("Power: OFF")
                         self.btn_power_on.setEnabled(True)
                         self.btn_power_off.setEnabled(False)
-                    
-                    if self.log_status:
-                        timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
-                        maindir = Path(__file__).parent.parent
-
-                        resultdir = maindir / "Environmental Data" / "Chiller Data"
-                        if not os.path.isdir(resultdir):
-                            os.makedirs(resultdir)
-
-                        resultdir.mkdir(exist_ok=True)
 
-                        outfile = resultdir / f"chiller_data_{self.log_timestamp}.csv"
-
-                        data = {"Power": self.power.strip(), "Set Temp (°C)": self.set_temp, "Curr Temp (°C)": self.curr_temp}
-                        with open(outfile, 'a') as f:
-                            f.write(f"{timestamp}: {data}\n")
+                    for reading, stamp in messages:
+                        if self.bus is not None:
+                            self.bus.publish(self.config.name, reading, stamp)
+                        if self.log_status:
+                            self.logger.add_reading(reading, stamp)
+                    if self.log_status:
+                        self.logger.write(ChillerPoller.log_data(values), None, poll_stamp(messages))
 
                 except Exception as e:
                     print(f"Error reading chiller data: {e}")
@@ -241,10 +257,26 @@ class ChillerPanel(Panel):
 
             time.sleep(self.sample_time)
 
+    def show_stability(self, message):
+        # Values followed from a daemon's snapshot are NaN rather than None
+        values = {k: v for k, v in message.values.items() if v is not None and v == v}
+        drift = values.get("BATH_DRIFT")
+        if drift is None:
+            self.lbl_stability.setText("Bath: ---")
+            return
+        if values.get("BATH_STABLE"):
+            state = "stable"
+        elif values.get("BATH_ETA") is not None:
+            state = f"settling, ~{values['BATH_ETA'] / 60:.0f} min to go"
+        else:
+            state = "settling"
+        self.lbl_stability.setText(f"Bath: {state} (drift {drift:+.3f} K/min, noise {values['BATH_NOISE']:.3f} K)")
+
     def toggle_log(self):
         self.log_status = not self.log_status
         if self.log_status:
             self.lbl_logging.setText("Logging")
-            self.log_timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
+            self.logger.start()
         else:
-            self.lbl_logging.setText("Not Logging")
\ No newline at end of file
+            self.lbl_logging.setText("Not Logging")
+            self.logger.stop()
\ No newline at end of file
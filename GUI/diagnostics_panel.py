@@ -0,0 +1,126 @@
+import sys
+
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QVBoxLayout, QHBoxLayout, QPushButton, QCheckBox, QLabel
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QColor
+from pathlib import Path
+from panel import Panel
+
+MAIN_DIR = Path(__file__).parent.parent
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+
+import command_stats
+
+REFRESH_MS = 2000
+
+# (header, summary key, format)
+COLUMNS = [
+    ("Count", "count", "{}"),
+    ("p50 (ms)", "p50_ms", "{:.1f}"),
+    ("p90 (ms)", "p90_ms", "{:.1f}"),
+    ("p99 (ms)", "p99_ms", "{:.1f}"),
+    ("Max (ms)", "max_ms", "{:.1f}"),
+    ("Busy (s)", "busy_s", "{:.1f}"),
+    ("Timeouts", "timeouts", "{}"),
+    ("Errors", "errors", "{}"),
+    ("Bytes out", "bytes_out", "{}"),
+    ("Bytes in", "bytes_in", "{}"),
+]
+
+class DiagnosticsPanel(Panel):
+    """Serial command latencies of the drivers in this process, slowest total time first.
+
+    With `toggle_profiling` (MainWindow.toggle_profiling) it also starts and
+    stops the sampling profiler and shows the event loop lag.
+    """
+    def __init__(self, title="Diagnostics", remote=False, toggle_profiling=None, lag_monitor=None):
+        super().__init__(title)
+        self.toggle_profiling = toggle_profiling
+        self.lag_monitor = lag_monitor
+
+        self.setObjectName("DiagnosticsPanel")
+        self.setStyleSheet("""
+        #DiagnosticsPanel QWidget { color: #ffffff; }
+        QTableWidget { gridline-color: #5b5b5b; border: none; }
+        QHeaderView::section { background-color: #3b3b3b; color: #ffffff; border: 1px solid #5b5b5b; padding: 4px; }
+        QPushButton { color: #ffffff; background-color: #007bff; border: none; border-radius: 10px; padding: 8px 14px; font-weight: 600; }
+        """)
+
+        self.chk_record = QCheckBox("Record command latencies")
+        self.chk_record.setChecked(command_stats.ENABLED)
+        self.chk_record.toggled.connect(command_stats.enable)
+        self.btn_reset = QPushButton("Reset")
+        self.btn_reset.clicked.connect(self.reset)
+        # With --daemon the drivers live in the daemon, which serves them on /api/commands
+        self.lbl_note = QLabel("The daemon owns the ports: run it with --command-stats and see /api/commands" if remote else "")
+
+        top_row = QHBoxLayout()
+        top_row.addWidget(self.chk_record)
+        top_row.addWidget(self.btn_reset)
+        top_row.addWidget(self.lbl_note, 1, Qt.AlignLeft)
+
+        self.btn_profile = QPushButton("Start Profiling")
+        self.btn_profile.clicked.connect(self.profile)
+        self.btn_profile.setEnabled(toggle_profiling is not None)
+        self.lbl_profile = QLabel("Ctrl+Shift+P also toggles profiling")
+        self.lbl_lag = QLabel("Event loop lag: --")
+        profile_row = QHBoxLayout()
+        profile_row.addWidget(self.btn_profile)
+        profile_row.addWidget(self.lbl_profile, 1, Qt.AlignLeft)
+        profile_row.addWidget(self.lbl_lag)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels([header for header, _, _ in COLUMNS])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        layout = QVBoxLayout()
+        layout.addLayout(top_row)
+        layout.addLayout(profile_row)
+        layout.addWidget(self.table)
+        self.subgrid.addLayout(layout, 1, 0)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_MS)
+
+    def refresh(self):
+        rows = [(f"{driver}  {command}", s) for driver, commands in command_stats.snapshot().items()
+                for command, s in commands.items()]
+        rows.sort(key=lambda row: -row[1]["busy_s"])
+        self.table.setRowCount(len(rows))
+        self.table.setVerticalHeaderLabels([label for label, _ in rows])
+        for row, (_, summary) in enumerate(rows):
+            for col, (_, key, fmt) in enumerate(COLUMNS):
+                value = summary[key]
+                item = self.table.item(row, col)
+                if item is None:
+                    item = QTableWidgetItem()
+                    item.setTextAlignment(Qt.AlignCenter)
+                    self.table.setItem(row, col, item)
+                item.setText("--" if value is None else fmt.format(value))
+                if key in ("timeouts", "errors"):
+                    item.setForeground(QColor("#f87171" if value else "#ffffff"))
+
+        if self.lag_monitor is not None and self.lag_monitor.running:
+            self.lbl_lag.setText(self.lag_monitor.format())
+
+    def profile(self):
+        path = self.toggle_profiling()
+        self.show_profiling(path)
+
+    def show_profiling(self, path):
+        if path is None:
+            self.btn_profile.setText("Stop Profiling")
+            self.lbl_profile.setText("Profiling...")
+        else:
+            self.btn_profile.setText("Start Profiling")
+            self.lbl_profile.setText(f"Written to {path}")
+
+    def reset(self):
+        command_stats.reset()
+        self.refresh()
+
+    def stop(self):
+        self.timer.stop()
@@ -2,7 +2,6 @@ import sys
 import threading
 import serial
 import time
-import os
 
 from PyQt5.QtWidgets import QPushButton, QLabel, QLineEdit, QHBoxLayout, QVBoxLayout
 from pathlib import Path
@@ -11,14 +10,24 @@ from PyQt5.QtGui import QFont
 from panel import Panel
 
 MAIN_DIR = Path(__file__).parent.parent
-hv_dir = MAIN_DIR / "drivers" / "HV"
-sys.path.append(str(hv_dir))
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
 
-from hv_driver import HVPowerSupply
+from config import DeviceConfig
+from data_logger import DataLogger
+from pollers import HVPoller, poll_stamp
 
 class HVPanel(Panel):
-    def __init__(self, title="HV Supply"):
+    def __init__(self, title="HV Supply", bus=None, backends=None, interlock=None, config=None):
         super().__init__(title)
+        self.bus = bus
+        self.config = config or DeviceConfig.default("HV")
+        self.interlock = interlock
+        self.logger = DataLogger(self.config.name, "HV Supply Data", "hv_supply_data", backends)
 
         self.setObjectName("HVPanel")
         self.setStyleSheet("""
@@ -71,7 +80,6 @@ class HVPanel(Panel):
         self.hv_stop_evt = None
         self.hv_thread = None
         self.log_status = False
-        self.log_timestamp = None
 
         self.btn_connect = QPushButton("Connect")
         self.btn_connect.setObjectName("greenButton")
@@ -175,7 +183,7 @@ class HVPanel(Panel):
 
 
         self.subgrid.addLayout(main_layout, 1, 0, 5, 5, Qt.AlignTop)
-        self.sample_time = 0.5
+        self.sample_time = self.config.interval
         self.cmd_waiting = False
         self.cmd = None
 
@@ -188,14 +196,16 @@ class HVPanel(Panel):
         
         self.hv_stop_evt = threading.Event()
         try:
-            # TODO: Add more channels
-            self.hv = HVPowerSupply("/dev/hv_supply", baud=9600, bd_addr=0, channel=0)
+            self.hv = self.config.open()
+            self.plan = HVPoller.make_plan(**self.config.poll_settings)
+            if self.interlock is not None:
+                self.interlock.attach(self.config.name, self.hv, self.config.type, on_command=self.plan.invalidate)
             self.lbl_status.setText("Connected")
         except serial.SerialException as e:
             print(f"Failed to connect: {e}")
         
         self.hv_stop_evt.clear()
-        self.hv_thread = threading.Thread(target=self.hv_run, daemon=True)
+        self.hv_thread = threading.Thread(target=self.hv_run, name="hv_run", daemon=True)
         self.hv_thread.start()
         self.btn_disconnect.setEnabled(True)
         self.btn_connect.setEnabled(False)
@@ -211,6 +221,8 @@ class HVPanel(Panel):
             self.hv_thread.join()
             self.hv_thread = None
         if self.hv:
+            if self.interlock is not None:
+                self.interlock.detach(self.config.name)
             self.hv.close()
             self.lbl_status.setText("Disconnected")
             self.lbl_set_voltage.setText("VSET: --- V")
@@ -225,14 +237,22 @@ class HVPanel(Panel):
     def hv_run(self):
         while not self.hv_stop_evt.is_set():
             if not self.cmd_waiting:
-                self.vset = self.hv.extract_float_value(self.hv.read_vset())
-                self.vmon = self.hv.extract_float_value(self.hv.read_vmon())
-                self.iset = self.hv.extract_float_value(self.hv.read_iset())
-                self.imon = self.hv.extract_float_value(self.hv.read_imon())
-                self.status = int(self.hv.read_status()['VAL'])
-                self.output = self.status & 1
-
-                if self.output:
+                messages = HVPoller.read_plan(self.plan, self.hv)
+                if not messages:
+                    time.sleep(self.wait_time())
+                    continue
+                values = self.plan.values
+                self.vset = values["VSET"]
+                self.vmon = values["VMON"]
+                self.iset = values["ISET"]
+                self.imon = values["IMON"]
+                self.status = values["STAT"]
+                self.output = HVPoller.output(self.status)
+
+                if self.output is None:
+                    # No status yet, or the last reply failed: leave the buttons as they are
+                    self.lbl_channel.setText("OUTPUT: ---")
+                elif self.output:
                     self.lbl_channel.setText("OUTPUT: ON")
                     self.btn_channel_off.setEnabled(True)
                     self.btn_channel_on.setEnabled(False)
@@ -245,21 +265,15 @@ class HVPanel(Panel):
                 self.lbl_set_current.setText(f"ISET: {self.iset} uA")
                 self.lbl_mon_voltage.setText(f"VMON: {self.vmon} V")
                 self.lbl_mon_current.setText(f"IMON: {self.imon} uA")
+                # Only what was read this time goes out, each under the stamp of its own read;
+                # the text log keeps one full row per poll
+                for reading, stamp in messages:
+                    if self.bus is not None:
+                        self.bus.publish(self.config.name, reading, stamp)
+                    if self.log_status:
+                        self.logger.add_reading(reading, stamp)
                 if self.log_status:
-                    timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
-                    maindir = Path(__file__).parent.parent
-
-                    resultdir = maindir / "Environmental Data" / "HV Supply Data"
-                    if not os.path.isdir(resultdir):
-                        os.makedirs(resultdir)
-
-                    resultdir.mkdir(exist_ok=True)
-
-                    outfile = resultdir / f"hv_supply_data_{self.log_timestamp}.csv"
-
-                    data = {"OUTPUT": self.output, "VSET": self.vset, "VMON": self.vmon, "ISET": self.iset, "IMON": self.imon, "Status": self.status}
-                    with open(outfile, 'a') as f:
-                        f.write(f"{timestamp}: {data}\n")
+                    self.logger.write(HVPoller.log_data(dict(values, OUTPUT=self.output)), None, poll_stamp(messages))
             else:
                 if self.cmd == "vset":
                     try:
@@ -280,15 +294,24 @@ class HVPanel(Panel):
                     self.set_current_field.clear()
 
                 elif self.cmd == "output":
-                    if self.output:
+                    if self.output is None:
+                        print("Output state unknown, not switching it")
+                    elif self.output:
                         self.hv.set_channel_off()
                     else:
                         self.hv.set_channel_on()
                 
                 
+                # Read back whatever the command changed on the next poll
+                self.plan.invalidate()
                 self.cmd_waiting = False
                 self.cmd = None
-            time.sleep(self.sample_time)
+            time.sleep(self.wait_time())
+
+    def wait_time(self):
+        # Until the next parameter is due, but check for commands every sample_time
+        due = self.plan.until_due() if self.plan.completed else self.plan.fastest
+        return min(due, self.sample_time)
 
     def set_voltage(self):
         self.cmd_waiting = True
@@ -306,6 +329,7 @@ class HVPanel(Panel):
         self.log_status = not self.log_status
         if self.log_status:
             self.lbl_logging.setText("Logging")
-            self.log_timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
+            self.logger.start()
         else:
-            self.lbl_logging.setText("Not Logging")
\ No newline at end of file
+            self.lbl_logging.setText("Not Logging")
+            self.logger.stop()
\ No newline at end of file
@@ -0,0 +1,67 @@
+import sys
+import time
+
+from PyQt5.QtCore import QObject, QTimer, Qt
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+
+from command_stats import LatencyHistogram
+
+class EventLoopLagMonitor(QObject):
+    """Measures how late a timer on the Qt event loop fires.
+
+    Anything that holds the GUI thread (a slow slot, a blocking serial call,
+    a big plot redraw) delays the next tick; the delay is the lag the user
+    feels. blocked() is safe to call from other threads, which is how the
+    sampling profiler tags main thread stacks taken during a stall.
+    """
+    def __init__(self, interval_ms=50, stall_ms=100, parent=None):
+        super().__init__(parent)
+        self.interval = interval_ms / 1000
+        self.stall = stall_ms / 1000
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.reset()
+
+    def reset(self):
+        self.lag = LatencyHistogram()
+        self.stalls = 0
+        self.last_tick = time.monotonic()
+
+    def start(self):
+        self.last_tick = time.monotonic()
+        self.timer.start(int(self.interval * 1000))
+
+    def stop(self):
+        self.timer.stop()
+
+    @property
+    def running(self):
+        return self.timer.isActive()
+
+    def tick(self):
+        now = time.monotonic()
+        lag = max(now - self.last_tick - self.interval, 0.0)
+        self.last_tick = now
+        self.lag.record(lag * 1e6)
+        if lag >= self.stall:
+            self.stalls += 1
+
+    def blocked(self):
+        return self.running and time.monotonic() - self.last_tick > self.interval + self.stall
+
+    def summary(self):
+        summary = self.lag.summary()
+        summary["stalls"] = self.stalls
+        return summary
+
+    def format(self):
+        s = self.summary()
+        if not s["count"]:
+            return "Event loop lag: --"
+        return (f"Event loop lag: p50 {s['p50_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms, "
+                f"max {s['max_ms']:.0f} ms, {s['stalls']} stalls over {self.stall * 1000:.0f} ms")
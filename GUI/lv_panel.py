@@ -2,7 +2,6 @@ import sys
 import threading
 import serial
 import time
-import os
 
 from PyQt5.QtWidgets import QPushButton, QLabel, QLineEdit, QHBoxLayout, QVBoxLayout
 from pathlib import Path
@@ -11,14 +10,24 @@ from PyQt5.QtGui import QFont
 from panel import Panel
 
 MAIN_DIR = Path(__file__).parent.parent
-lv_dir = MAIN_DIR / "drivers" / "LV"
-sys.path.append(str(lv_dir))
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
 
-from lv_driver import LVPowerSupply
+from config import DeviceConfig
+from data_logger import DataLogger
+from pollers import LVPoller, poll_stamp
 
 class LVPanel(Panel):
-    def __init__(self, title="LV Supply"):
+    def __init__(self, title="LV Supply", bus=None, backends=None, interlock=None, config=None):
         super().__init__(title)
+        self.bus = bus
+        self.config = config or DeviceConfig.default("LV")
+        self.interlock = interlock
+        self.logger = DataLogger(self.config.name, "LV Supply Data", "LV_supply_data", backends)
         
         self.setObjectName("LVPanel")
         self.setStyleSheet("""
@@ -71,7 +80,6 @@ class LVPanel(Panel):
         self.lv_stop_evt = None
         self.lv_thread = None
         self.log_status = False
-        self.log_timestamp = None
 
         self.btn_connect = QPushButton("Connect")
         self.btn_connect.setObjectName("greenButton")
@@ -175,7 +183,7 @@ class LVPanel(Panel):
 
 
         self.subgrid.addLayout(main_layout, 1, 0, 5, 5, Qt.AlignTop)
-        self.sample_time = 0.5
+        self.sample_time = self.config.interval
         self.cmd_waiting = False
         self.cmd = None
 
@@ -188,14 +196,16 @@ class LVPanel(Panel):
         
         self.lv_stop_evt = threading.Event()
         try:
-            # TODO: Add more channels
-            self.lv = LVPowerSupply("/dev/lv_supply", channel=1, baud=115200)
+            self.lv = self.config.open()
+            self.plan = LVPoller.make_plan(**self.config.poll_settings)
+            if self.interlock is not None:
+                self.interlock.attach(self.config.name, self.lv, self.config.type, on_command=self.plan.invalidate)
             self.lbl_status.setText("Connected")
         except serial.SerialException as e:
             print(f"Failed to connect: {e}")
         
         self.lv_stop_evt.clear()
-        self.lv_thread = threading.Thread(target=self.lv_run, daemon=True)
+        self.lv_thread = threading.Thread(target=self.lv_run, name="lv_run", daemon=True)
         self.lv_thread.start()
         self.btn_disconnect.setEnabled(True)
         self.btn_connect.setEnabled(False)
@@ -211,6 +221,8 @@ class LVPanel(Panel):
             self.lv_thread.join()
             self.lv_thread = None
         if self.lv:
+            if self.interlock is not None:
+                self.interlock.detach(self.config.name)
             self.lv.close()
             self.lbl_status.setText("Disconnected")
             self.lbl_set_voltage.setText("VSET: --- V")
@@ -225,14 +237,22 @@ class LVPanel(Panel):
     def lv_run(self):
         while not self.lv_stop_evt.is_set():
             if not self.cmd_waiting:
-                self.vset = self.lv.read_vset()
-                self.vmon = self.lv.read_vmon()
-                self.iset = self.lv.read_iset()
-                self.imon = self.lv.read_imon()
-                self.status = self.lv.read_status()
-                self.output = self.status & 2**4
-
-                if self.output:
+                messages = LVPoller.read_plan(self.plan, self.lv)
+                if not messages:
+                    time.sleep(self.wait_time())
+                    continue
+                values = self.plan.values
+                self.vset = values["VSET"]
+                self.vmon = values["VMON"]
+                self.iset = values["ISET"]
+                self.imon = values["IMON"]
+                self.status = values["STAT"]
+                self.output = LVPoller.output(self.status)
+
+                if self.output is None:
+                    # No status yet, or the last reply failed: leave the buttons as they are
+                    self.lbl_channel.setText("OUTPUT: ---")
+                elif self.output:
                     self.lbl_channel.setText("OUTPUT: ON")
                     self.btn_channel_off.setEnabled(True)
                     self.btn_channel_on.setEnabled(False)
@@ -245,21 +265,15 @@ class LVPanel(Panel):
                 self.lbl_set_current.setText(f"ISET: {self.iset} A")
                 self.lbl_mon_voltage.setText(f"VMON: {self.vmon} V")
                 self.lbl_mon_current.setText(f"IMON: {self.imon} A")
+                # Only what was read this time goes out, each under the stamp of its own read;
+                # the text log keeps one full row per poll
+                for reading, stamp in messages:
+                    if self.bus is not None:
+                        self.bus.publish(self.config.name, reading, stamp)
+                    if self.log_status:
+                        self.logger.add_reading(reading, stamp)
                 if self.log_status:
-                    timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
-                    maindir = Path(__file__).parent.parent
-
-                    resultdir = maindir / "Environmental Data" / "LV Supply Data"
-                    if not os.path.isdir(resultdir):
-                        os.makedirs(resultdir)
-
-                    resultdir.mkdir(exist_ok=True)
-
-                    outfile = resultdir / f"LV_supply_data_{self.log_timestamp}.csv"
-
-                    data = {"OUTPUT": self.output, "VSET": self.vset, "VMON": self.vmon, "ISET": self.iset, "IMON": self.imon, "Status": self.status}
-                    with open(outfile, 'a') as f:
-                        f.write(f"{timestamp}: {data}\n")
+                    self.logger.write(LVPoller.log_data(dict(values, OUTPUT=self.output)), None, poll_stamp(messages))
             else:
                 if self.cmd == "vset":
                     try:
@@ -280,15 +294,24 @@ class LVPanel(Panel):
                     self.set_current_field.clear()
 
                 elif self.cmd == "channel":
-                    if self.output:
+                    if self.output is None:
+                        print("Output state unknown, not switching it")
+                    elif self.output:
                         self.lv.set_channel_off()
                     else:
                         self.lv.set_channel_on()
                 
                 
+                # Read back whatever the command changed on the next poll
+                self.plan.invalidate()
                 self.cmd_waiting = False
                 self.cmd = None
-            time.sleep(self.sample_time)
+            time.sleep(self.wait_time())
+
+    def wait_time(self):
+        # Until the next parameter is due, but check for commands every sample_time
+        due = self.plan.until_due() if self.plan.completed else self.plan.fastest
+        return min(due, self.sample_time)
 
     def set_voltage(self):
         self.cmd_waiting = True
@@ -306,6 +329,7 @@ class LVPanel(Panel):
         self.log_status = not self.log_status
         if self.log_status:
             self.lbl_logging.setText("Logging")
-            self.log_timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
+            self.logger.start()
         else:
-            self.lbl_logging.setText("Not Logging")
\ No newline at end of file
+            self.lbl_logging.setText("Not Logging")
+            self.logger.stop()
\ No newline at end of file
@@ -0,0 +1,125 @@
+import sys
+import time
+import numpy as np
+
+from PyQt5.QtWidgets import QComboBox, QLabel, QHBoxLayout, QVBoxLayout
+from PyQt5.QtCore import Qt, QTimer
+from pathlib import Path
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+from panel import Panel
+
+MAIN_DIR = Path(__file__).parent.parent
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+
+
+# Redraws per second, independent of how fast the devices are polled
+FRAME_RATE = 2
+
+# (axis label, [(device, channel, legend, color)], channel on a twin axis or None)
+STRIP_CHARTS = [
+    ("HV VMON (V)", [("HV", "VMON", "VMON", "#60a5fa")], ("HV", "IMON", "IMON (uA)", "#f87171")),
+    ("LV IMON (A)", [("LV", "IMON", "IMON", "#facc15")], None),
+    ("Chiller (°C)", [("Chiller", "TEMP", "Bath", "#34d399"), ("Chiller", "TSET", "Set", "#9ca3af")], None),
+    ("TC (°C)", [("Arduino", "TC1", "TC1", "#fb923c"), ("Arduino", "TC2", "TC2", "#c084fc")], None),
+    ("Dew Point (°C)", [("Arduino", "DEWPOINT", "Dew Point", "#22d3ee")], None),
+]
+
+SPANS = [("10 min", 600), ("1 h", 3600), ("6 h", 6 * 3600), ("24 h", 24 * 3600), ("7 d", 7 * 24 * 3600)]
+# Longer spans are drawn from the 1 min / 1 h rollups of the logged readings,
+# when there are any, instead of binning every sample in the store each frame
+ROLLUP_SPAN = 6 * 3600
+
+class PlotPanel(Panel):
+    def __init__(self, store, rollups=None, title="Live Plots"):
+        super().__init__(title)
+        self.store = store
+        self.rollups = rollups
+
+        self.setObjectName("PlotPanel")
+        self.setStyleSheet("""
+        #PlotPanel QWidget { color: #ffffff; }
+        QLabel { color: #ffffff; }
+        QComboBox {
+            color: #ffffff;
+            border: 1px solid #ffffff;
+            border-radius: 6px;
+            padding: 4px 6px;
+        }
+        """)
+
+        self.span_box = QComboBox()
+        for name, _ in SPANS:
+            self.span_box.addItem(name)
+
+        span_row = QHBoxLayout()
+        span_row.addWidget(QLabel("Window: "))
+        span_row.addWidget(self.span_box)
+        span_row.addStretch(1)
+
+        self.figure = Figure(facecolor="#3b3b3b")
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.lines = []
+        axes = self.figure.subplots(len(STRIP_CHARTS), 1, sharex=True)
+        for ax, (label, traces, twin) in zip(axes, STRIP_CHARTS):
+            self._style_axis(ax, label)
+            for device, channel, legend, color in traces:
+                line, = ax.plot([], [], color=color, lw=1, label=legend)
+                self.lines.append((ax, line, device, channel))
+            if len(traces) > 1:
+                ax.legend(loc="upper left", fontsize=7, facecolor="#3b3b3b", labelcolor="#ffffff", frameon=False)
+            if twin is not None:
+                device, channel, legend, color = twin
+                tax = ax.twinx()
+                self._style_axis(tax, legend)
+                line, = tax.plot([], [], color=color, lw=1)
+                self.lines.append((tax, line, device, channel))
+        axes[-1].set_xlabel("Minutes ago", color="#ffffff", fontsize=8)
+        self.figure.subplots_adjust(left=0.12, right=0.88, top=0.97, bottom=0.07, hspace=0.3)
+
+        layout = QVBoxLayout()
+        layout.addLayout(span_row)
+        layout.addWidget(self.canvas, 1)
+        self.subgrid.addLayout(layout, 1, 0)
+
+        # Drawing happens on the GUI thread off a timer; the acquisition threads
+        # only ever append to the store
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.redraw)
+        self.timer.start(int(1000 / FRAME_RATE))
+
+    def _style_axis(self, ax, label):
+        ax.set_facecolor("#2b2b2b")
+        ax.set_ylabel(label, color="#ffffff", fontsize=8)
+        ax.tick_params(colors="#ffffff", labelsize=7)
+        ax.grid(color="#555555", lw=0.5)
+
+    def series(self, device, channel, span, n_bins):
+        """(seconds ago, value) min/max pairs of at most n_bins bins over `span`."""
+        if self.rollups is not None and span > ROLLUP_SPAN:
+            end = time.time()
+            bins = self.rollups.query(device, channel, end - span, end, max_points=n_bins)
+            if len(bins):
+                v = np.empty(2 * len(bins))
+                v[0::2] = bins["min"]
+                v[1::2] = bins["max"]
+                return np.repeat(bins["t"], 2) - end, v
+        now = time.monotonic()
+        t, v = self.store.minmax(device, channel, span, n_bins, now)
+        return t - now, v
+
+    def redraw(self):
+        if not self.isVisible():
+            return
+        span = SPANS[self.span_box.currentIndex()][1]
+        # One min/max pair per horizontal pixel is all the screen can show
+        n_bins = max(self.canvas.width(), 100)
+        for ax, line, device, channel in self.lines:
+            t, v = self.series(device, channel, span, n_bins)
+            line.set_data(t / 60, v)
+        for ax, _, _, _ in self.lines:
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+        self.lines[0][0].set_xlim(-span / 60, 0)
+        self.canvas.draw_idle()
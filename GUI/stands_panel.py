@@ -0,0 +1,96 @@
+import math
+import sys
+
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QVBoxLayout
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QColor
+from pathlib import Path
+from panel import Panel
+
+MAIN_DIR = Path(__file__).parent.parent
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
+
+from supervisor import StandView
+
+REFRESH_MS = 1000
+
+# (header, device type or None for the worker status, channel, format)
+COLUMNS = [
+    ("State", None, "state", "{}"),
+    ("CPU %", None, "CPU", "{:.1f}"),
+    ("RSS MB", None, "RSS_MB", "{:.0f}"),
+    ("Errors", None, "ERRORS", "{:.0f}"),
+    ("HV VMON (V)", "HV", "VMON", "{:.1f}"),
+    ("HV IMON (uA)", "HV", "IMON", "{:.2f}"),
+    ("LV IMON (A)", "LV", "IMON", "{:.3f}"),
+    ("Bath (°C)", "Chiller", "TEMP", "{:.2f}"),
+    ("TC1 (°C)", "Arduino", "TC1", "{:.2f}"),
+    ("TC2 (°C)", "Arduino", "TC2", "{:.2f}"),
+    ("Dew Point (°C)", "Arduino", "DEWPOINT", "{:.2f}"),
+]
+
+STATE_COLORS = {"running": "#34d399", "starting": "#facc15", "stale": "#fb923c", "down": "#f87171", "no data": "#9ca3af"}
+
+class StandsPanel(Panel):
+    """One row per stand, read from each stand worker's shared memory snapshot."""
+    def __init__(self, config, supervisor=None, title="Stands"):
+        super().__init__(title)
+        self.stands = config.stands
+        self.supervisor = supervisor
+        self.views = {name: StandView(name) for name in self.stands} if supervisor is None else None
+
+        self.setObjectName("StandsPanel")
+        self.setStyleSheet("""
+        #StandsPanel QWidget { color: #ffffff; }
+        QTableWidget { gridline-color: #5b5b5b; border: none; }
+        QHeaderView::section { background-color: #3b3b3b; color: #ffffff; border: 1px solid #5b5b5b; padding: 4px; }
+        """)
+
+        self.table = QTableWidget(len(self.stands), len(COLUMNS))
+        self.table.setHorizontalHeaderLabels([header for header, _, _, _ in COLUMNS])
+        self.table.setVerticalHeaderLabels(list(self.stands))
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        for row in range(len(self.stands)):
+            for col in range(len(COLUMNS)):
+                item = QTableWidgetItem("--")
+                item.setTextAlignment(Qt.AlignCenter)
+                self.table.setItem(row, col, item)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        self.subgrid.addLayout(layout, 1, 0)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REFRESH_MS)
+
+    def view(self, stand):
+        return self.supervisor.workers[stand].view if self.supervisor is not None else self.views[stand]
+
+    def refresh(self):
+        statuses = self.supervisor.status() if self.supervisor is not None else None
+        for row, (name, stand) in enumerate(self.stands.items()):
+            view = self.view(name)
+            status = statuses[name] if statuses is not None else view.status()
+            snapshot = view.snapshot()
+            for col, (_, type, channel, fmt) in enumerate(COLUMNS):
+                if type is None:
+                    value = status.get(channel)
+                else:
+                    value = snapshot.get(stand.first(type).name, {}).get(channel, (None, None))[1]
+                if value is None or (isinstance(value, float) and math.isnan(value)):
+                    text = "--"
+                else:
+                    text = fmt.format(value)
+                item = self.table.item(row, col)
+                item.setText(text)
+                if channel == "state":
+                    item.setForeground(QColor(STATE_COLORS.get(value, "#ffffff")))
+
+    def close_views(self):
+        self.timer.stop()
+        if self.views is not None:
+            for view in self.views.values():
+                view.close()
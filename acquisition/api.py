@@ -0,0 +1,262 @@
+import argparse
+import logging
+import json
+import math
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from flask import Flask, Response, g, jsonify, request
+from werkzeug.serving import make_server
+
+MAIN_DIR = Path(__file__).parent.parent
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+
+from session_clock import SESSION_CLOCK
+import command_stats
+from bus import Bus
+from snapshot import DEFAULT_NAME, SnapshotReader, follow
+
+DEFAULT_PORT = 5050
+KEEPALIVE = 15.0   # s between SSE comments on an idle stream
+
+def _jsonable(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    return str(value)
+
+class SnapshotCache():
+    """Latest reading of every device plus a short history of deltas, fed from a bus.
+
+    Requests are served from here only: the full snapshot is serialized at
+    most once per change and shared by every client, and stream clients wait
+    on a condition for new deltas, so the number of clients never reaches the
+    serial ports.
+    """
+    def __init__(self, history=1024):
+        self.cond = threading.Condition()
+        self.devices = {}
+        self.version = 0
+        self.body = None
+        self.body_version = -1
+        self.deltas = deque(maxlen=history)
+
+    def update(self, message):
+        """Bus handler: merges a reading and records it as a delta."""
+        t = time.time() if message.stamp is None else SESSION_CLOCK.to_wall(message.stamp.midpoint)
+        values = {channel: _jsonable(value) for channel, value in message.values.items()}
+        with self.cond:
+            self.version += 1
+            channels = self.devices.setdefault(message.device, {})
+            for channel, value in values.items():
+                channels[channel] = {"t": t, "value": value}
+            delta = json.dumps({"version": self.version, "device": message.device, "t": t, "values": values})
+            self.deltas.append((self.version, delta))
+            self.cond.notify_all()
+
+    def snapshot(self):
+        """Returns (version, JSON body) of every device's latest channels."""
+        with self.cond:
+            if self.body_version != self.version:
+                self.body = json.dumps({"version": self.version, "devices": self.devices}).encode()
+                self.body_version = self.version
+            return self.version, self.body
+
+    def device(self, name):
+        with self.cond:
+            channels = self.devices.get(name)
+            return self.version, None if channels is None else dict(channels)
+
+    def _resumable(self, after):
+        # Every delta newer than `after` is still held, and `after` is not from
+        # the future (e.g. an ID from before a restart)
+        oldest = self.deltas[0][0] if self.deltas else self.version + 1
+        return oldest - 1 <= after <= self.version
+
+    def wait_deltas(self, after, timeout):
+        """Returns the deltas newer than version `after`, waiting up to `timeout` for one.
+
+        Returns None if they can no longer be replayed, so the client needs a
+        fresh snapshot instead.
+        """
+        with self.cond:
+            if not self._resumable(after):
+                return None
+            if self.version <= after:
+                self.cond.wait(timeout)
+            if not self._resumable(after):
+                return None
+            return [(version, delta) for version, delta in self.deltas if version > after]
+
+class ResponseTimes():
+    """Recent request durations per endpoint."""
+    def __init__(self, size=10000):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.size = size
+
+    def add(self, endpoint, seconds):
+        with self.lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.size)).append(seconds)
+
+    def summary(self):
+        with self.lock:
+            samples = {endpoint: np.array(s) * 1e3 for endpoint, s in self.samples.items()}
+        return {endpoint: {"count": len(ms),
+                           "p50_ms": float(np.percentile(ms, 50)),
+                           "p99_ms": float(np.percentile(ms, 99)),
+                           "max_ms": float(ms.max())}
+                for endpoint, ms in samples.items() if len(ms)}
+
+def create_app(cache):
+    """Read-only monitoring API over a SnapshotCache.
+
+    GET /api/snapshot           latest value of every channel (ETag = version)
+    GET /api/snapshot/<device>  latest values of one device
+    GET /api/stream             Server-Sent Events, one 'delta' event per reading, after a
+                                'snapshot' event when there is nothing to resume from
+    GET /api/stats              response times of the endpoints above
+    GET /api/commands           per-command serial latencies of the drivers, when recorded
+    """
+    app = Flask(__name__)
+    times = ResponseTimes()
+    clients = {"stream": 0}
+    clients_lock = threading.Lock()
+
+    @app.before_request
+    def start_timer():
+        g.t_start = time.perf_counter()
+
+    @app.after_request
+    def stop_timer(response):
+        if request.endpoint is not None and request.endpoint != "stream":
+            times.add(request.endpoint, time.perf_counter() - g.t_start)
+        return response
+
+    @app.get("/api/snapshot")
+    def snapshot():
+        version, body = cache.snapshot()
+        response = Response(body, mimetype="application/json")
+        response.set_etag(str(version))
+        response.headers["Cache-Control"] = "no-cache"
+        return response.make_conditional(request)
+
+    @app.get("/api/snapshot/<device>")
+    def device(device):
+        version, channels = cache.device(device)
+        if channels is None:
+            return jsonify({"error": f"No readings from {device}"}), 404
+        return jsonify({"version": version, "device": device, "channels": channels})
+
+    @app.get("/api/stream")
+    def stream():
+        # Resume after a reconnect from the last delta the client saw
+        last = request.headers.get("Last-Event-ID", request.args.get("since", ""))
+
+        def events():
+            with clients_lock:
+                clients["stream"] += 1
+            try:
+                after = int(last) if last.isdigit() else -1
+                while True:
+                    deltas = cache.wait_deltas(after, KEEPALIVE)
+                    if deltas is None:
+                        # A new client, or one whose missed deltas are gone (too old, or
+                        # an ID past the current version): send the full state instead
+                        after, body = cache.snapshot()
+                        yield f"id: {after}\nevent: snapshot\ndata: {body.decode()}\n\n"
+                        continue
+                    if not deltas:
+                        yield ": keepalive\n\n"
+                        continue
+                    for version, delta in deltas:
+                        yield f"id: {version}\nevent: delta\ndata: {delta}\n\n"
+                    after = deltas[-1][0]
+            finally:
+                with clients_lock:
+                    clients["stream"] -= 1
+
+        return Response(events(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.get("/api/stats")
+    def stats():
+        return jsonify({"version": cache.snapshot()[0], "stream_clients": clients["stream"],
+                        "response_times": times.summary()})
+
+    @app.get("/api/commands")
+    def commands():
+        # Per-command serial latencies of the drivers in this process, if recording
+        return jsonify({"enabled": command_stats.ENABLED, "drivers": command_stats.snapshot()})
+
+    return app
+
+class APIServer():
+    """Serves the API from a background thread, e.g. inside the GUI or the daemon."""
+    def __init__(self, bus, host="127.0.0.1", port=DEFAULT_PORT):
+        self.cache = SnapshotCache()
+        self.subscription = bus.attach("api", self.cache.update, maxsize=256)
+        # Per-request access logging would cost more than serving the cached snapshot
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self.server = make_server(host, port, create_app(self.cache), threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="api", daemon=True)
+        self.thread.start()
+        print(f"Monitoring API on http://{host}:{port}/api/snapshot")
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join(timeout=2)
+
+def bench(url, clients=50, requests=100):
+    """Fetches `url` from many concurrent clients and reports the response times."""
+    def client(_):
+        durations = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            durations.append(time.perf_counter() - t0)
+        return durations
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        durations = np.concatenate([np.array(d) for d in pool.map(client, range(clients))]) * 1e3
+    elapsed = time.perf_counter() - t0
+    print(f"{clients} clients x {requests} requests: {len(durations) / elapsed:.0f} req/s, "
+          f"p50 {np.percentile(durations, 50):.2f} ms, p99 {np.percentile(durations, 99):.2f} ms, "
+          f"max {durations.max():.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only monitoring API over an acquisition daemon's snapshot")
+    parser.add_argument("--shm", default=DEFAULT_NAME, help="name of the daemon's shared memory snapshot")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--bench", metavar="URL", help="measure response times of a running API instead")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, args.clients, args.requests)
+        return
+
+    reader = SnapshotReader(args.shm)
+    bus = Bus()
+    follow(reader, bus)
+    server = APIServer(bus, args.host, args.port)
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.close()
+        reader.close()
+
+if __name__ == "__main__":
+    main()
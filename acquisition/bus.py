@@ -0,0 +1,153 @@
+import threading
+from collections import deque
+
+DEFAULT_MAXSIZE = 1024
+
+# What a full subscription queue does with a new message
+DROP_OLDEST = "drop_oldest"   # keep the most recent messages
+DROP_NEWEST = "drop_newest"   # keep the backlog, discard the new message
+POLICIES = (DROP_OLDEST, DROP_NEWEST)
+
+class Message():
+    """One reading of a device: canonical channel values and the Stamp of the poll."""
+    __slots__ = ("device", "values", "stamp", "seq")
+
+    def __init__(self, device, values, stamp, seq):
+        self.device = device
+        self.values = values
+        self.stamp = stamp
+        self.seq = seq
+
+    def __repr__(self):
+        return f"Message({self.device!r}, {self.values!r}, seq={self.seq})"
+
+class Subscription():
+    """Bounded queue of messages for one subscriber.
+
+    put() never blocks: when the queue is full, the drop policy discards
+    either the oldest queued message or the new one, and the drop is counted.
+    get() returns None once the subscription is closed and drained.
+    """
+    def __init__(self, name, devices=None, maxsize=DEFAULT_MAXSIZE, policy=DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown drop policy {policy!r}, expected one of {POLICIES}")
+        self.name = name
+        self.devices = None if devices is None else set(devices)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue = deque()
+        self.cond = threading.Condition(threading.Lock())
+        self.closed = False
+        self.delivered = 0
+        self.dropped = 0
+
+    def wants(self, device):
+        return self.devices is None or device in self.devices
+
+    def put(self, message):
+        with self.cond:
+            if self.closed:
+                return
+            if self.maxsize and len(self.queue) >= self.maxsize:
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    return
+                self.queue.popleft()
+            self.queue.append(message)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.queue and not self.closed:
+                self.cond.wait(timeout)
+            if not self.queue:
+                return None
+            self.delivered += 1
+            return self.queue.popleft()
+
+    def drain(self):
+        """Returns every queued message without waiting."""
+        with self.cond:
+            messages = list(self.queue)
+            self.queue.clear()
+            self.delivered += len(messages)
+            return messages
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def stats(self):
+        return {"queued": len(self.queue), "delivered": self.delivered, "dropped": self.dropped,
+                "maxsize": self.maxsize, "policy": self.policy}
+
+class Bus():
+    """In-process publish/subscribe bus for device readings.
+
+    Pollers publish each reading once; every subscription interested in the
+    device gets the same Message object. Publishing only appends to bounded
+    queues, so a slow subscriber loses messages under its drop policy instead
+    of stalling acquisition.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = []
+        self.threads = {}
+        self.seq = 0
+        self.published = 0
+
+    def subscribe(self, name, devices=None, maxsize=DEFAULT_MAXSIZE, policy=DROP_OLDEST):
+        sub = Subscription(name, devices, maxsize, policy)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [sub]
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not sub]
+        sub.close()
+        thread = self.threads.pop(sub.name, None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2)
+
+    def attach(self, name, handler, devices=None, maxsize=DEFAULT_MAXSIZE, policy=DROP_OLDEST):
+        """Subscribes `handler(message)` on a delivery thread of its own."""
+        sub = self.subscribe(name, devices, maxsize, policy)
+
+        def run():
+            while True:
+                message = sub.get()
+                if message is None:
+                    return
+                try:
+                    handler(message)
+                except Exception as e:
+                    print(f"Bus subscriber {name} failed on {message}: {e}")
+
+        thread = threading.Thread(target=run, name=f"bus-{name}", daemon=True)
+        self.threads[name] = thread
+        thread.start()
+        return sub
+
+    def publish(self, device, values, stamp=None):
+        with self.lock:
+            self.seq += 1
+            self.published += 1
+            message = Message(device, values, stamp, self.seq)
+            subscriptions = self.subscriptions
+        for sub in subscriptions:
+            if sub.wants(device):
+                sub.put(message)
+        return message
+
+    def close(self):
+        for sub in list(self.subscriptions):
+            self.unsubscribe(sub)
+
+    def stats(self):
+        return {"published": self.published,
+                "subscribers": {sub.name: sub.stats() for sub in self.subscriptions}}
@@ -0,0 +1,312 @@
+import sys
+from pathlib import Path
+
+import yaml
+
+MAIN_DIR = Path(__file__).parent.parent
+for driver in ("Common", "HV", "LV", "Chiller", "Arduino"):
+    sys.path.append(str(MAIN_DIR / "drivers" / driver))
+
+from arduino_driver import Arduino
+from chiller_driver import Chiller
+from hv_driver import HVPowerSupply
+from lv_driver import LVPowerSupply
+
+from pollers import HV_PERIODS, LV_PERIODS, POLLERS
+from stability import DRIFT_LIMIT, NOISE_LIMIT, TOLERANCE, WINDOW
+
+DEFAULT_CONFIG = MAIN_DIR / "configs" / "main.yaml"
+DEFAULT_STAND = "default"
+# Sections of a stand that are not polled devices, passed through unvalidated
+OTHER_SECTIONS = ("KCU",)
+
+class ConfigError(ValueError):
+    pass
+
+def _positive(kind):
+    def check(value):
+        if kind is int and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ValueError(f"expected an integer, got {value!r}")
+        if kind is float and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise ValueError(f"expected a number, got {value!r}")
+        if value <= 0:
+            raise ValueError(f"must be positive, got {value!r}")
+        return kind(value)
+    return check
+
+def _in_range(low, high):
+    def check(value):
+        if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+            raise ValueError(f"expected an integer from {low} to {high}, got {value!r}")
+        return value
+    return check
+
+def _periods(defaults):
+    def check(value):
+        if not isinstance(value, dict):
+            raise ValueError(f"expected a mapping of parameter to seconds, got {value!r}")
+        periods = {}
+        for param, period in value.items():
+            if param not in defaults:
+                raise ValueError(f"unknown parameter {param!r}, expected one of {list(defaults)}")
+            periods[param] = _positive(float)(period)
+        return periods
+    return check
+
+def _port(value):
+    if not isinstance(value, str) or not value:
+        raise ValueError(f"expected a device path, got {value!r}")
+    return value
+
+# Per device type: setting -> (check, default). The defaults are what the
+# panels used before the config file was read; None means left unset.
+# Adaptive polling runs between min_interval (while readings change, a ramp
+# is active or an alarm is near) and max_interval (while they are flat); left
+# unset they follow `interval` by the factors in ADAPTIVE_RANGE.
+SCHEMA = {
+    "Arduino": {
+        "port": (_port, "/dev/arduino"),
+        "baud": (_positive(int), 115200),
+        "timeout": (_positive(float), 1.0),
+        "interval": (_positive(float), 2.5),
+        "min_interval": (_positive(float), None),
+        "max_interval": (_positive(float), None),
+    },
+    "Chiller": {
+        "port": (_port, "/dev/chiller"),
+        "baud": (_positive(int), 4800),
+        "timeout": (_positive(float), 1.0),
+        "interval": (_positive(float), 1.0),
+    },
+    "HV": {
+        "port": (_port, "/dev/hv_supply"),
+        "baud": (_positive(int), 9600),
+        "timeout": (_positive(float), 1.0),
+        "board_addr": (_in_range(0, 31), 0),
+        "channel": (_in_range(0, 3), 0),
+        "volt_tolerance": (_positive(float), 0.5),
+        "current_limit": (_positive(float), None),   # uA
+        "ramp_up": (_positive(float), None),         # V/s
+        "ramp_down": (_positive(float), None),       # V/s
+        "interval": (_positive(float), 0.5),
+        "min_interval": (_positive(float), None),
+        "max_interval": (_positive(float), None),
+        "poll_periods": (_periods(HV_PERIODS), None),  # s per parameter, over pollers.HV_PERIODS
+    },
+    "LV": {
+        "port": (_port, "/dev/lv_supply"),
+        "baud": (_positive(int), 115200),
+        "timeout": (_positive(float), 1.0),
+        "channel": (_in_range(1, 3), 1),
+        "interval": (_positive(float), 0.5),
+        "min_interval": (_positive(float), None),
+        "max_interval": (_positive(float), None),
+        "poll_periods": (_periods(LV_PERIODS), None),  # s per parameter, over pollers.LV_PERIODS
+    },
+}
+
+# (min_interval, max_interval) as multiples of `interval`, for devices that poll adaptively
+ADAPTIVE_RANGE = {"Arduino": (0.4, 4.0), "HV": (0.5, 10.0), "LV": (0.5, 10.0)}
+
+# Limits of the stand's StabilityDetector, from an optional "Stability" section
+STABILITY_SCHEMA = {
+    "window": (_positive(float), WINDOW),             # s
+    "drift_limit": (_positive(float), DRIFT_LIMIT),   # K/min
+    "noise_limit": (_positive(float), NOISE_LIMIT),   # K rms
+    "tolerance": (_positive(float), TOLERANCE),       # K from the chiller setpoint
+}
+
+def open_hv(s):
+    hv = HVPowerSupply(s["port"], baud=s["baud"], bd_addr=s["board_addr"], channel=s["channel"],
+                       timeout=s["timeout"], vtol=s["volt_tolerance"])
+    if s["current_limit"] is not None:
+        hv.set_current_limit(s["current_limit"])
+    if s["ramp_up"] is not None:
+        hv.set_ramp_up(s["ramp_up"])
+    if s["ramp_down"] is not None:
+        hv.set_ramp_down(s["ramp_down"])
+    return hv
+
+def open_lv(s):
+    return LVPowerSupply(s["port"], channel=s["channel"], baud=s["baud"], timeout=s["timeout"])
+
+def open_chiller(s):
+    return Chiller(s["port"], baud=s["baud"], timeout=s["timeout"])
+
+def open_arduino(s):
+    arduino = Arduino(s["port"], baudrate=s["baud"], timeout=s["timeout"])
+    arduino.connect()
+    return arduino
+
+OPENERS = {"HV": open_hv, "LV": open_lv, "Chiller": open_chiller, "Arduino": open_arduino}
+
+class DeviceConfig():
+    """Validated settings of one device on one stand.
+
+    `name` is what readings are published and logged under; `type` selects
+    the driver and poller, so a stand can have several devices of one type.
+    """
+    def __init__(self, stand, name, type, settings):
+        self.stand = stand
+        self.name = name
+        self.type = type
+        self.settings = settings
+
+    @classmethod
+    def default(cls, type, stand=DEFAULT_STAND):
+        return cls(stand, type, type, {key: default for key, (_, default) in SCHEMA[type].items()})
+
+    @property
+    def interval(self):
+        return self.settings["interval"]
+
+    def open(self):
+        """Opens the port and returns the connected driver."""
+        return OPENERS[self.type](self.settings)
+
+    @property
+    def poll_settings(self):
+        """Keyword arguments of the poller's rate control: intervals and, for supplies, periods."""
+        settings = {"interval": self.interval}
+        if self.type in ADAPTIVE_RANGE:
+            low, high = ADAPTIVE_RANGE[self.type]
+            settings["min_interval"] = self.settings.get("min_interval") or low * self.interval
+            settings["max_interval"] = self.settings.get("max_interval") or high * self.interval
+        if self.settings.get("poll_periods") is not None:
+            settings["periods"] = self.settings["poll_periods"]
+        return settings
+
+    def poller(self, driver, bus):
+        return POLLERS[self.type](driver, bus, name=self.name, **self.poll_settings)
+
+    def __getitem__(self, key):
+        return self.settings[key]
+
+    def __repr__(self):
+        return f"DeviceConfig({self.stand}/{self.name}: {self.type} on {self.settings['port']})"
+
+class StandConfig():
+    def __init__(self, name, devices, extras, stability=None):
+        self.name = name
+        self.devices = devices
+        self.extras = extras
+        self.stability = stability or {key: default for key, (_, default) in STABILITY_SCHEMA.items()}
+
+    def of_type(self, type):
+        return [device for device in self.devices.values() if device.type == type]
+
+    def first(self, type):
+        """The stand's first device of `type`, or the built-in default if it has none."""
+        devices = self.of_type(type)
+        return devices[0] if devices else DeviceConfig.default(type, self.name)
+
+    def types(self):
+        """{name: type} of every device, as the snapshot and pollers expect."""
+        return {name: device.type for name, device in self.devices.items()}
+
+class Config():
+    def __init__(self, path, stands):
+        self.path = path
+        self.stands = stands
+
+    def stand(self, name=None):
+        if name is None:
+            return next(iter(self.stands.values()))
+        if name not in self.stands:
+            raise ConfigError(f"{self.path}: no stand {name!r}, expected one of {list(self.stands)}")
+        return self.stands[name]
+
+def _parse_settings(where, what, schema, section, errors):
+    section = dict(section)
+    settings = {}
+    for key, (check, default) in schema.items():
+        value = section.pop(key, None)
+        if value is None:
+            settings[key] = default
+            continue
+        try:
+            settings[key] = check(value)
+        except ValueError as e:
+            errors.append(f"{where}.{key}: {e}")
+    for key in section:
+        errors.append(f"{where}.{key}: unknown setting for {what}, expected one of {list(schema)}")
+    return settings
+
+def _parse_device(where, name, section, errors):
+    section = dict(section or {})
+    type = section.pop("type", name)
+    if type not in SCHEMA:
+        errors.append(f"{where}: unknown device type {type!r}, expected one of {list(SCHEMA)}")
+        return None
+    settings = _parse_settings(where, type, SCHEMA[type], section, errors)
+    # Only what the config sets; unset bounds follow interval
+    low, interval, high = (settings.get(key) for key in ("min_interval", "interval", "max_interval"))
+    if low is not None and interval is not None and low > interval:
+        errors.append(f"{where}: min_interval {low} is above interval {interval}")
+    if high is not None and interval is not None and high < interval:
+        errors.append(f"{where}: max_interval {high} is below interval {interval}")
+    return settings, type
+
+def parse_config(raw, path="<config>"):
+    """Validates a parsed YAML document, reporting every problem at once.
+
+    A document with a `stands` mapping describes several stands; one with
+    device sections at the top level is a single stand named "default".
+    """
+    if not isinstance(raw, dict):
+        raise ConfigError(f"{path}: expected a mapping at the top level")
+    stands_raw = raw["stands"] if "stands" in raw else {DEFAULT_STAND: raw}
+    if not isinstance(stands_raw, dict) or not stands_raw:
+        raise ConfigError(f"{path}: 'stands' must map stand names to their devices")
+
+    errors = []
+    stands = {}
+    for stand_name, sections in stands_raw.items():
+        stand_name = str(stand_name)
+        if not isinstance(sections, dict):
+            errors.append(f"stands.{stand_name}: expected a mapping of devices")
+            continue
+        devices, extras, stability = {}, {}, None
+        for name, section in sections.items():
+            name = str(name)
+            if name in OTHER_SECTIONS:
+                extras[name] = section
+                continue
+            if name == "Stability":
+                if not isinstance(section, dict):
+                    errors.append(f"stands.{stand_name}.Stability: expected a mapping of limits")
+                    continue
+                stability = _parse_settings(f"stands.{stand_name}.Stability", "Stability", STABILITY_SCHEMA,
+                                            section, errors)
+                continue
+            if section is not None and not isinstance(section, dict):
+                errors.append(f"stands.{stand_name}.{name}: expected a mapping of settings")
+                continue
+            parsed = _parse_device(f"stands.{stand_name}.{name}", name, section, errors)
+            if parsed is not None:
+                settings, type = parsed
+                devices[name] = DeviceConfig(stand_name, name, type, settings)
+        stands[stand_name] = StandConfig(stand_name, devices, extras, stability)
+
+    # Two pollers on one port would interleave their commands
+    ports = {}
+    for stand in stands.values():
+        for device in stand.devices.values():
+            owner = ports.setdefault(device["port"], f"{stand.name}.{device.name}")
+            if owner != f"{stand.name}.{device.name}":
+                errors.append(f"stands.{stand.name}.{device.name}.port: {device['port']} is already used by {owner}")
+
+    if errors:
+        raise ConfigError(f"{path}: invalid config\n  " + "\n  ".join(errors))
+    return Config(path, stands)
+
+_loaded = {}
+
+def load_config(path=None, reload=False):
+    """Parses and validates a config file once per process; later calls reuse it."""
+    path = Path(path or DEFAULT_CONFIG).resolve()
+    if reload or path not in _loaded:
+        with open(path) as f:
+            raw = yaml.safe_load(f)
+        _loaded[path] = parse_config(raw, path)
+    return _loaded[path]
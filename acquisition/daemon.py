@@ -0,0 +1,189 @@
+import argparse
+import signal
+import sys
+import threading
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+for driver in ("Common", "HV", "LV", "Chiller", "Arduino"):
+    sys.path.append(str(MAIN_DIR / "drivers" / driver))
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+
+from session_clock import SESSION_CLOCK, Stamp
+from data_logger import DataLogger
+from rollup import RollupEngine
+
+from bus import Bus
+from config import DEFAULT_CONFIG, load_config
+from interlock import InterlockEngine, stand_rules
+from pollers import all_channels
+from resources import ResourceMonitor
+from snapshot import DEFAULT_NAME, SnapshotWriter
+from stability import StabilityDetector, stability_channels, stand_trackers
+from api import DEFAULT_PORT, APIServer
+
+# Text log folder and file prefix, as written by the GUI panels
+LOG_FILES = {
+    "HV": ("HV Supply Data", "hv_supply_data"),
+    "LV": ("LV Supply Data", "LV_supply_data"),
+    "Chiller": ("Chiller Data", "chiller_data"),
+    "Arduino": ("Arduino Data", "sensor_data"),
+}
+
+# Published by the daemon itself every status_interval, so supervisors and
+# GUIs read a worker's health from its snapshot like any other device
+STATUS_DEVICE = "Status"
+STATUS_CHANNELS = ("CPU", "RSS_MB", "THREADS", "DEVICES", "POLLS", "ERRORS", "DROPPED")
+
+class AcquisitionDaemon():
+    """Owns the serial ports outside the GUI process.
+
+    Every device is polled on its own thread and published on a local bus.
+    The interlock engine and the shared memory snapshot subscribe to it, so
+    interlocking keeps running if a GUI or analysis script hangs, and readers
+    never touch the serial ports. With `log`, readings are also written to the
+    same text logs and rollups as the GUI's Log buttons.
+
+    `stand` is a StandConfig; `devices` optionally restricts it to some of its
+    device names. `log_tag` keeps the logs of several daemons on one host
+    apart: it is appended to log file names and names the rollup and
+    interlock log subfolders.
+    """
+    def __init__(self, stand, devices=None, shm_name=DEFAULT_NAME, db_path=None, api_port=None, log=False,
+                 status_interval=5.0, log_tag=None):
+        self.stand = stand
+        configs = [config for name, config in stand.devices.items() if devices is None or name in devices]
+        self.bus = Bus()
+        channels = all_channels({c.name: c.type for c in configs})
+        channels += [(STATUS_DEVICE, channel) for channel in STATUS_CHANNELS]
+        trackers = stand_trackers(stand)
+        channels += stability_channels(trackers)
+        self.snapshot = SnapshotWriter(channels, name=shm_name)
+        self.bus.attach("snapshot", self.snapshot.publish, maxsize=256)
+        self.stability = StabilityDetector(self.bus, trackers)
+        interlock_dir = MAIN_DIR / "Environmental Data" / "Interlock Logs"
+        self.interlock = InterlockEngine(stand_rules(stand), log_dir=interlock_dir / log_tag if log_tag else interlock_dir,
+                                         bus=self.bus)
+        self.db = None
+        if db_path is not None:
+            from sqlite_store import SQLiteStore
+            self.db = SQLiteStore(db_path)
+            self.bus.attach("sqlite", self.add_to_db)
+        self.api = None
+        if api_port is not None:
+            self.api = APIServer(self.bus, port=api_port)
+
+        self.pollers = {}
+        for config in configs:
+            try:
+                driver = config.open()
+            except Exception as e:
+                print(f"Failed to connect {config.name}: {e}")
+                continue
+            poller = self.pollers[config.name] = config.poller(driver, self.bus)
+            self.interlock.attach(config.name, driver, config.type, on_command=poller.notify_command)
+
+        self.rollups = None
+        self.loggers = {}
+        if log:
+            rollup_dir = MAIN_DIR / "Environmental Data" / "Rollups"
+            self.rollups = RollupEngine(rollup_dir / log_tag if log_tag else rollup_dir)
+            for device in self.pollers:
+                type = stand.devices[device].type
+                subdir, prefix = LOG_FILES[type]
+                if device != type:
+                    prefix = f"{prefix}_{device}"
+                if log_tag:
+                    prefix = f"{prefix}_{log_tag}"
+                # Written on the poll thread, where the driver's own data of the
+                # exchange is still at hand
+                self.loggers[device] = self.pollers[device].logger = DataLogger(device, subdir, prefix,
+                                                                                backends=[self.rollups])
+
+        self.monitor = ResourceMonitor()
+        self.status_interval = status_interval
+        self.status_stop_evt = threading.Event()
+        self.status_thread = threading.Thread(target=self.publish_status, name="status", daemon=True)
+
+    def add_to_db(self, message):
+        self.db.add_reading(message.device, message.values, SESSION_CLOCK.to_wall(message.stamp.midpoint))
+
+    def publish_status(self):
+        while not self.status_stop_evt.wait(self.status_interval):
+            usage = self.monitor.sample()
+            status = self.status()
+            now = SESSION_CLOCK.now()
+            self.bus.publish(STATUS_DEVICE, {
+                "CPU": usage["cpu_percent"],
+                "RSS_MB": usage["rss_mb"],
+                "THREADS": usage["threads"],
+                "DEVICES": len(self.pollers),
+                "POLLS": sum(d["polls"] for d in status["devices"].values()),
+                "ERRORS": sum(d["errors"] for d in status["devices"].values()),
+                "DROPPED": sum(sub["dropped"] for sub in status["subscribers"].values()),
+            }, Stamp(now, now))
+
+    def start(self):
+        for logger in self.loggers.values():
+            logger.start()
+        for poller in self.pollers.values():
+            poller.start()
+        self.status_thread.start()
+        print(f"{self.stand.name}: acquiring {', '.join(self.pollers) or 'nothing'}; snapshot in shared memory '{self.snapshot.name}'")
+
+    def status(self):
+        """Poll and error counts per device and delivered/dropped counts per subscriber."""
+        bus = self.bus.stats()
+        return {
+            "devices": {device: {"polls": p.polls, "errors": p.errors} for device, p in self.pollers.items()},
+            "published": bus["published"],
+            "subscribers": bus["subscribers"],
+        }
+
+    def stop(self):
+        self.status_stop_evt.set()
+        if self.status_thread.is_alive():
+            self.status_thread.join(timeout=2)
+        for device, poller in self.pollers.items():
+            poller.stop()
+            self.interlock.detach(device)
+            try:
+                poller.driver.close()
+            except Exception as e:
+                print(f"Failed to close {device}: {e}")
+        self.interlock.stop()
+        self.stability.stop()
+        if self.api is not None:
+            self.api.close()
+        self.bus.close()
+        for logger in self.loggers.values():
+            logger.close()
+        if self.db is not None:
+            self.db.close()
+        self.snapshot.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="ETL test stand acquisition daemon")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--stand", help="stand to acquire, by default the first in the config")
+    parser.add_argument("--devices", nargs="+", metavar="NAME", help="only these devices of the stand")
+    parser.add_argument("--shm", default=DEFAULT_NAME, help="name of the shared memory snapshot")
+    parser.add_argument("--db", help="also log readings to this SQLite database")
+    parser.add_argument("--api", type=int, nargs="?", const=DEFAULT_PORT, metavar="PORT",
+                        help="serve the read-only monitoring API on localhost")
+    args = parser.parse_args()
+
+    stand = load_config(args.config).stand(args.stand)
+    daemon = AcquisitionDaemon(stand, args.devices, args.shm, args.db, args.api)
+    stop_evt = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_evt.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_evt.set())
+    daemon.start()
+    while not stop_evt.wait(1.0):
+        pass
+    print("Stopping acquisition")
+    daemon.stop()
+
+if __name__ == "__main__":
+    main()
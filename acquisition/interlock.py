@@ -0,0 +1,246 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+
+from session_clock import SESSION_CLOCK
+from bus import Message, Subscription
+
+# Default limits, overridable per rule
+DEWPOINT_MARGIN = 3.0   # °C the coldest TC must stay above the dew point
+LATENCY_BUDGET = 0.5    # s from the triggering reply to every action done
+
+logger = logging.getLogger("interlock")
+
+class Action():
+    """A command sent to every attached device of one type when a rule fires.
+
+    `command` is called as command(driver, state), where state maps
+    (device, channel) to the latest value the engine has seen.
+    """
+    def __init__(self, device, command, description):
+        self.device = device
+        self.command = command
+        self.description = description
+
+def hv_off():
+    return Action("HV", lambda hv, state: hv.set_channel_off(), "HV output off")
+
+def lv_off():
+    return Action("LV", lambda lv, state: lv.set_channel_off(), "LV output off")
+
+def chiller_off():
+    return Action("Chiller", lambda chiller, state: chiller.set_power_off(), "chiller off")
+
+def chiller_above_dewpoint(margin=DEWPOINT_MARGIN, arduino="Arduino"):
+    def command(chiller, state):
+        chiller.set_work_temperature(state[(arduino, "DEWPOINT")] + margin)
+    return Action("Chiller", command, f"chiller setpoint to dew point + {margin} °C")
+
+class Rule():
+    """A condition over the latest readings and the actions taken when it becomes true.
+
+    Rules fire on the rising edge only and re-arm once the condition clears,
+    so a persisting fault does not resend commands every poll.
+    """
+    def __init__(self, name, channels, condition, actions, message):
+        self.name = name
+        self.channels = set(channels)
+        self.condition = condition
+        self.actions = actions
+        self.message = message
+        self.active = False
+
+    def evaluate(self, state):
+        values = [state.get(key) for key in self.channels]
+        if any(value is None for value in values):
+            return False
+        return bool(self.condition(state))
+
+def default_rules(arduinos=("Arduino",), hvs=("HV",), dewpoint_margin=DEWPOINT_MARGIN):
+    """Condensation and leak rules for every Arduino, and the door rule for every
+    Arduino and HV supply. Rules on a device not named after its type carry its
+    name, e.g. "leak_Arduino2"."""
+    def suffix(*devices):
+        return "".join(f"_{device}" for device, type in devices if device != type)
+
+    def near_dewpoint(arduino):
+        def condition(s):
+            coldest = min(s[(arduino, "TC1")], s[(arduino, "TC2")])
+            return coldest - s[(arduino, "DEWPOINT")] < dewpoint_margin
+        return condition
+
+    rules = []
+    for arduino in arduinos:
+        rules.append(Rule("condensation" + suffix((arduino, "Arduino")),
+                          [(arduino, "TC1"), (arduino, "TC2"), (arduino, "DEWPOINT")],
+                          near_dewpoint(arduino),
+                          [hv_off(), lv_off(), chiller_above_dewpoint(dewpoint_margin, arduino)],
+                          f"TC temperature within {dewpoint_margin} °C of the dew point"))
+        # The Arduino reports LEAK as 1 while the sensor is dry
+        rules.append(Rule("leak" + suffix((arduino, "Arduino")),
+                          [(arduino, "LEAK")],
+                          lambda s, arduino=arduino: not s[(arduino, "LEAK")],
+                          [hv_off(), lv_off(), chiller_off()],
+                          "Leak detected"))
+        for hv in hvs:
+            rules.append(Rule("door_open_hv_on" + suffix((arduino, "Arduino"), (hv, "HV")),
+                              [(arduino, "DOOR"), (hv, "OUTPUT")],
+                              lambda s, arduino=arduino, hv=hv: s[(arduino, "DOOR")] and s[(hv, "OUTPUT")],
+                              [hv_off()],
+                              "Door opened with HV on"))
+    return rules
+
+def stand_rules(stand, dewpoint_margin=DEWPOINT_MARGIN):
+    """default_rules for every Arduino and HV supply of a StandConfig."""
+    def names(type):
+        return [device.name for device in stand.of_type(type)] or [stand.first(type).name]
+    return default_rules(names("Arduino"), names("HV"), dewpoint_margin)
+
+class InterlockEngine():
+    """Evaluates interlock rules on a thread of its own, independent of the GUI.
+
+    Readings arrive through a bus subscription, or are queued directly with
+    feed(), and only the rules that read a channel in the new reading are
+    re-evaluated. Only the latest state matters, so a backlog drops the
+    oldest readings rather than delaying a decision. When a rule fires, its actions on
+    different devices run in parallel, each holding that driver's lock only
+    for its own command. Reaction time is measured from the reply that carried
+    the triggering value to the last action completing, logged, and checked
+    against `budget`.
+    """
+    def __init__(self, rules=None, budget=LATENCY_BUDGET, log_dir=None, bus=None):
+        self.rules = default_rules() if rules is None else rules
+        self.budget = budget
+        self.state = {}
+        self.devices = {}
+        self.on_command = {}
+        self.events = deque(maxlen=200)
+        self.rules_by_channel = {}
+        for rule in self.rules:
+            for key in rule.channels:
+                self.rules_by_channel.setdefault(key, []).append(rule)
+
+        self.handler = None
+        if log_dir is not None:
+            if not os.path.isdir(log_dir):
+                os.makedirs(log_dir)
+            self.handler = logging.FileHandler(Path(log_dir) / f"interlock_{time.strftime('%Y-%m-%d-%H-%M-%S')}.log")
+            self.handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            logger.addHandler(self.handler)
+        logger.setLevel(logging.INFO)
+
+        if bus is not None:
+            self.queue = bus.subscribe("interlock", maxsize=256)
+        else:
+            self.queue = Subscription("interlock", maxsize=256)
+        self.stop_evt = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="interlock", daemon=True)
+        self.thread.start()
+
+    def attach(self, device, driver, type=None, on_command=None):
+        """Registers a driver; actions on `type` (default: the device name) are sent to it.
+
+        `on_command()` is called after each action on it, e.g. a poller's
+        notify_command, so whoever polls the device reads back the change.
+        """
+        self.devices[device] = (driver, type or device)
+        if on_command is not None:
+            self.on_command[device] = on_command
+        else:
+            self.on_command.pop(device, None)
+
+    def detach(self, device):
+        self.devices.pop(device, None)
+        self.on_command.pop(device, None)
+
+    def feed(self, device, reading, stamp=None):
+        self.queue.put(Message(device, reading, stamp, None))
+
+    def stop(self):
+        self.stop_evt.set()
+        self.queue.close()
+        self.thread.join(timeout=2)
+        if self.handler is not None:
+            logger.removeHandler(self.handler)
+            self.handler.close()
+
+    def _run(self):
+        while not self.stop_evt.is_set():
+            message = self.queue.get()
+            if message is None:
+                return
+            t_reply = SESSION_CLOCK.now() if message.stamp is None else message.stamp.t_reply
+            due = []
+            for channel, value in message.values.items():
+                key = (message.device, channel)
+                self.state[key] = value
+                for rule in self.rules_by_channel.get(key, ()):
+                    if rule not in due:
+                        due.append(rule)
+            for rule in due:
+                try:
+                    tripped = rule.evaluate(self.state)
+                except Exception as e:
+                    logger.error(f"Rule {rule.name} failed to evaluate: {e}")
+                    continue
+                if tripped and not rule.active:
+                    rule.active = True
+                    self._fire(rule, t_reply)
+                elif not tripped and rule.active:
+                    rule.active = False
+                    logger.info(f"Interlock {rule.name} cleared")
+
+    def _fire(self, rule, t_reply):
+        t_decided = SESSION_CLOCK.now()
+        logger.warning(f"Interlock {rule.name} fired: {rule.message}")
+        print(f"INTERLOCK {rule.name}: {rule.message}")
+        results = {}
+
+        def run(action, name, driver):
+            description = action.description if name == action.device else f"{name}: {action.description}"
+            try:
+                action.command(driver, self.state)
+                results[description] = ("done", SESSION_CLOCK.now())
+            except Exception as e:
+                results[description] = (f"failed: {e}", SESSION_CLOCK.now())
+            on_command = self.on_command.get(name)
+            if on_command is not None:
+                on_command()
+
+        # Every attached device of the action's type gets the command
+        threads = []
+        for action in rule.actions:
+            targets = [(name, driver) for name, (driver, type) in list(self.devices.items()) if type == action.device]
+            if not targets:
+                results[action.description] = ("skipped, not connected", None)
+            for name, driver in targets:
+                threads.append(threading.Thread(target=run, args=(action, name, driver), daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        t_done = SESSION_CLOCK.now()
+
+        reaction = (t_done - t_reply) / 1e9
+        for description, (outcome, t_action) in results.items():
+            latency = "" if t_action is None else f" after {(t_action - t_reply) / 1e6:.1f} ms"
+            logger.info(f"  {description}: {outcome}{latency}")
+        level = logging.INFO if reaction <= self.budget else logging.ERROR
+        logger.log(level, f"Interlock {rule.name}: decided in {(t_decided - t_reply) / 1e6:.1f} ms, "
+                          f"reacted in {reaction * 1e3:.1f} ms (budget {self.budget * 1e3:.0f} ms)")
+        self.events.append({
+            "rule": rule.name,
+            "message": rule.message,
+            "time": SESSION_CLOCK.to_wall(t_reply),
+            "reaction": reaction,
+            "within_budget": reaction <= self.budget,
+            "actions": {d: outcome for d, (outcome, _) in results.items()},
+        })
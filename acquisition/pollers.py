@@ -0,0 +1,515 @@
+import math
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+for driver in ("Common", "HV", "LV", "Chiller", "Arduino"):
+    sys.path.append(str(MAIN_DIR / "drivers" / driver))
+
+from session_clock import Stamp
+from interlock import DEWPOINT_MARGIN
+
+def last_stamp(driver):
+    """Stamp of the driver's last serial exchange."""
+    return Stamp(driver.reader.t_request, driver.reader.t_reply)
+
+def poll_stamp(messages):
+    """Stamp spanning every exchange of a poll, for its one text log row."""
+    return Stamp(messages[0][1].t_request, messages[-1][1].t_reply)
+
+class Poller(ABC):
+    """Polls one device on a thread of its own and publishes each reading to a bus.
+
+    Subclasses implement read(), returning a (reading, stamp) pair with
+    canonical channel names for each serial exchange of the poll, stamped at
+    that exchange's request and reply and published under `name` (the device
+    type by default). A reading is None if its exchange failed.
+    Commands from other threads go through submit(), which runs
+    them on the poll thread between two polls so they never interleave with a
+    read sequence.
+
+    Adaptive pollers vary the time between polls through next_interval(),
+    from `min_interval` while readings change to `max_interval` while they
+    are flat.
+
+    If `logger` (a DataLogger) is set, each reading also goes to its
+    backends on the poll thread, and each poll to its text log as one row of
+    log_data() over the device's latest values.
+    """
+    device = None
+    channels = ()
+
+    def __init__(self, driver, bus, interval=1.0, name=None):
+        if name is not None:
+            self.device = name
+        self.driver = driver
+        self.bus = bus
+        self.interval = interval
+        self.commands = []
+        self.commands_lock = threading.Lock()
+        self.stop_evt = threading.Event()
+        self.wake_evt = threading.Event()
+        self.thread = None
+        self.polls = 0
+        self.errors = 0
+        self.last_reading = None
+        self.raw = None
+        self.logger = None
+
+    @abstractmethod
+    def read(self):
+        """[(reading, stamp)] of one poll, see the class docstring."""
+
+    @classmethod
+    def log_data(cls, values, raw=None):
+        """The text log row of a poll, keyed as the GUI panels log it.
+
+        `values` holds the latest value of every channel; `raw` is the
+        driver's own data of the poll, for devices whose log keeps it rather
+        than the canonical channels.
+        """
+        return dict(values)
+
+    def next_interval(self):
+        """Seconds from the start of the last poll to the next one."""
+        return self.interval
+
+    def submit(self, command, *args):
+        """Queues command(driver, *args) for the poll thread and returns a Future."""
+        future = Future()
+        with self.commands_lock:
+            self.commands.append((future, command, args))
+        # Do not leave it waiting out a long period between slow polls
+        self.wake_evt.set()
+        return future
+
+    def notify_command(self):
+        """Tells the poller its device was commanded directly rather than
+        through submit(), e.g. by an interlock action or a long sequence
+        command, so it polls again now. Safe to call from any thread.
+        """
+        self.wake_evt.set()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_evt.clear()
+        self.thread = threading.Thread(target=self.run, name=f"poll-{self.device}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_evt.set()
+        self.wake_evt.set()
+        if self.thread is not None:
+            self.thread.join(timeout=max(2.0, 2 * self.interval))
+            self.thread = None
+
+    def run_commands(self):
+        with self.commands_lock:
+            commands, self.commands = self.commands, []
+        for future, command, args in commands:
+            try:
+                future.set_result(command(self.driver, *args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def poll(self):
+        try:
+            messages = self.read()
+        except Exception as e:
+            self.errors += 1
+            print(f"Error reading {self.device} data: {e}")
+            return None
+        self.polls += 1
+        messages = [(reading, stamp) for reading, stamp in messages if reading is not None]
+        for reading, stamp in messages:
+            self.last_reading = dict(self.last_reading or {}, **reading)
+            self.bus.publish(self.device, reading, stamp)
+            if self.logger is not None:
+                self.logger.add_reading(reading, stamp)
+        if self.logger is not None and messages:
+            self.logger.write(self.log_data(self.last_reading, self.raw), None, poll_stamp(messages))
+        return self.last_reading
+
+    def run(self):
+        next_poll = time.monotonic()
+        while not self.stop_evt.is_set():
+            self.run_commands()
+            self.poll()
+            next_poll += self.next_interval()
+            delay = next_poll - time.monotonic()
+            if delay < 0:
+                # Overran the period; skip missed polls instead of bursting
+                next_poll = time.monotonic()
+                delay = 0
+            if self.wake_evt.wait(delay):
+                self.wake_evt.clear()
+                next_poll = time.monotonic()
+
+# Every parameter of a supply is read at a period of its own: what can change
+# by itself (STAT trips, IMON, VMON) often, the setpoints only change when a
+# command is sent (which makes them due at once) and the polarity is fixed by
+# the hardware. These are the periods at the device's nominal `interval`;
+# adaptive polling scales them by min_interval / interval while a parameter
+# changes and up to max_interval / interval while it is flat.
+HV_PERIODS = {"STAT": 0.5, "IMON": 0.5, "VMON": 1.0, "VSET": 10.0, "ISET": 10.0,
+              "RUP": 60.0, "RDW": 60.0, "POL": 600.0}
+LV_PERIODS = {"STAT": 0.5, "IMON": 0.5, "VMON": 1.0, "VSET": 10.0, "ISET": 10.0}
+
+# Smallest change that counts as a value changing rather than noise; 0 for
+# anything not listed, so any change of a status or setpoint counts
+HV_DEADBANDS = {"VMON": 0.5, "IMON": 0.1}           # V, uA
+LV_DEADBANDS = {"VMON": 0.01, "IMON": 0.005}        # V, A
+ARDUINO_DEADBANDS = {"TC1": 0.25, "TC2": 0.25, "AMBTEMP": 0.2, "RH": 1.0, "DEWPOINT": 0.3,
+                     "DOOR": 0, "LEAK": 0, "DHT": 0}   # °C, %
+
+# Parameters polled at the fastest rate while a ramp is active or an alarm is near
+TRANSIENT = ("STAT", "IMON", "VMON")
+# What trips and interlocks act on: these speed up like the rest but never
+# back off past their nominal period, however flat they are
+PINNED = ("STAT", "IMON", "DOOR", "LEAK")
+NEAR_LIMIT = 0.8        # of ISET, IMON closer to the current limit counts as near a trip
+LV_SETTLED = 0.05       # V, VMON further than this from VSET with the output on is still settling
+BACKOFF = 1.5           # growth of a period per flat reading
+
+def _hv_float(read):
+    return lambda hv: hv.extract_float_value(read(hv))
+
+def _hv_status(hv):
+    # None rather than a value the STAT bits cannot be tested on, for a failed reply
+    reply = hv.read_status()
+    return reply.val if reply.ok and isinstance(reply.val, int) else None
+
+HV_READERS = {
+    "STAT": _hv_status,
+    "IMON": _hv_float(lambda hv: hv.read_imon()),
+    "VMON": _hv_float(lambda hv: hv.read_vmon()),
+    "VSET": _hv_float(lambda hv: hv.read_vset()),
+    "ISET": _hv_float(lambda hv: hv.read_iset()),
+    "RUP": _hv_float(lambda hv: hv.read_ramp_up()),
+    "RDW": _hv_float(lambda hv: hv.read_ramp_down()),
+    "POL": lambda hv: {"+": 1, "-": -1}.get(hv.read_polarity().val),
+}
+
+LV_READERS = {
+    "STAT": lambda lv: lv.read_status(),
+    "IMON": lambda lv: lv.read_imon(),
+    "VMON": lambda lv: lv.read_vmon(),
+    "VSET": lambda lv: lv.read_vset(),
+    "ISET": lambda lv: lv.read_iset(),
+}
+
+def _near_current_limit(v):
+    return v["IMON"] is not None and bool(v["ISET"]) and v["IMON"] >= NEAR_LIMIT * v["ISET"]
+
+def hv_transient(v):
+    """Ramping up or down (STAT bits 1 and 2), or close to tripping on current."""
+    return (v["STAT"] is not None and v["STAT"] & 0b110) or _near_current_limit(v)
+
+def lv_transient(v):
+    """Output on but not yet at VSET, or close to the current limit."""
+    settling = (v["STAT"] is not None and v["STAT"] & 2**4 and None not in (v["VMON"], v["VSET"])
+                and abs(v["VMON"] - v["VSET"]) > LV_SETTLED)
+    return settling or _near_current_limit(v)
+
+def arduino_transient(v):
+    """Within twice the interlock margin of the dew point, door open or leaking."""
+    if v["DOOR"] or not v["LEAK"]:
+        return True
+    if None in (v["TC1"], v["TC2"], v["DEWPOINT"]):
+        return False
+    return min(v["TC1"], v["TC2"]) - v["DEWPOINT"] < 2 * DEWPOINT_MARGIN
+
+class AdaptiveRate():
+    """Period of one polled value, between `fastest` and `slowest` seconds.
+
+    update() returns to the fastest period when the value moved more than
+    `deadband` from where it last settled (or could not be read), and backs
+    off by BACKOFF per flat reading otherwise. hurry() returns to the fastest
+    period at once. With fastest == slowest the period is fixed.
+    """
+    def __init__(self, fastest, slowest, deadband=0.0):
+        self.fastest = fastest
+        self.slowest = max(slowest, fastest)
+        self.deadband = deadband
+        self.period = fastest
+        self.settled = None
+
+    def update(self, value):
+        if value is None or self.settled is None or abs(value - self.settled) > self.deadband:
+            self.settled = value
+            self.period = self.fastest
+        else:
+            self.period = min(self.period * BACKOFF, self.slowest)
+        return self.period
+
+    def hurry(self):
+        self.period = self.fastest
+
+class ChannelRates():
+    """AdaptiveRates of channels that one command reads together; the device
+    is polled at the shortest of their periods, the fastest while
+    `transient(reading)` is true.
+    """
+    def __init__(self, rates, transient=None):
+        self.rates = rates
+        self.transient = transient
+
+    @property
+    def period(self):
+        return min(rate.period for rate in self.rates.values())
+
+    def update(self, reading):
+        for channel, rate in self.rates.items():
+            rate.update(reading.get(channel))
+        if self.transient is not None and self.transient(reading):
+            self.hurry()
+        return self.period
+
+    def hurry(self):
+        for rate in self.rates.values():
+            rate.hurry()
+
+# Lets a period equal to the poll interval come due on every poll despite jitter
+_SLACK = 0.05
+
+class PollingPlan():
+    """Reads each parameter of a device only when its period has passed.
+
+    read() returns a ({param: value}, stamp) pair for each parameter it read,
+    stamped at that parameter's own exchange (none if nothing was due); `values` keeps the latest value of every
+    parameter for displays and the transient check. Each parameter
+    has an AdaptiveRate; while `transient(values)` is true the `transient`
+    parameters are read at their fastest. invalidate() makes parameters due on
+    the next read, e.g. after a command changed them. `clock` is
+    time.monotonic, or the recorded clock of a replayed trace.
+    """
+    def __init__(self, readers, rates, transient=None, transient_params=(), clock=time.monotonic):
+        self.readers = readers
+        self.rates = rates
+        self.transient = transient
+        self.transient_params = [param for param in transient_params if param in readers]
+        self.clock = clock
+        self.next_due = dict.fromkeys(readers, float("-inf"))
+        self.invalidated = set()
+        self.last_read = dict.fromkeys(readers, float("-inf"))
+        self.values = dict.fromkeys(readers)
+        self.started = float("-inf")
+        self.completed = True
+        self.reads = 0
+
+    def invalidate(self, params=None):
+        """Makes parameters due on the next read; safe to call from any thread."""
+        self.invalidated.update(self.readers if params is None else params)
+
+    @property
+    def fastest(self):
+        return min(rate.fastest for rate in self.rates.values())
+
+    def until_due(self):
+        """Seconds from the start of the last read() until a parameter is due."""
+        return max(min(self.next_due.values()) - self.started, 0.0)
+
+    def read(self, driver):
+        now = self.started = self.clock()
+        self.completed = False
+        while self.invalidated:
+            self.next_due[self.invalidated.pop()] = float("-inf")
+        messages = []
+        for param, read in self.readers.items():
+            if now < self.next_due[param]:
+                continue
+            self.values[param] = read(driver)
+            messages.append(({param: self.values[param]}, last_stamp(driver)))
+            self.last_read[param] = now
+            rate = self.rates[param]
+            period = rate.update(self.values[param])
+            # The first point of a grid of the period at least `fastest` away, so
+            # parameters at equal periods share polls, but never over the period
+            grid = math.ceil((now + rate.fastest) / period) * period
+            self.next_due[param] = min(grid, now + period) - _SLACK
+            self.reads += 1
+        self.completed = True
+        if messages and self.transient is not None and self.transient(self.values):
+            for param in self.transient_params:
+                rate = self.rates[param]
+                rate.hurry()
+                self.next_due[param] = min(self.next_due[param], self.last_read[param] + rate.fastest - _SLACK)
+        return messages
+
+class SupplyPoller(Poller):
+    """Polls a power supply through a PollingPlan of `readers` at
+    `default_periods`, overridden per parameter by `periods` and adapted
+    between min_interval and max_interval. OUTPUT is the STAT bit `output_bit`.
+    """
+    readers = {}
+    default_periods = {}
+    deadbands = {}
+    output_bit = 1
+
+    def __init__(self, driver, bus, interval=1.0, name=None, periods=None, min_interval=None, max_interval=None):
+        super().__init__(driver, bus, interval, name)
+        self.plan = self.make_plan(interval, periods, min_interval, max_interval)
+
+    @classmethod
+    def make_plan(cls, interval, periods=None, min_interval=None, max_interval=None):
+        """The PollingPlan of this supply, also used by the GUI panels."""
+        periods = dict(cls.default_periods, **(periods or {}))
+        fast = (interval if min_interval is None else min_interval) / interval
+        slow = (interval if max_interval is None else max_interval) / interval
+        rates = {param: AdaptiveRate(fast * periods[param], (1.0 if param in PINNED else slow) * periods[param],
+                                     cls.deadbands.get(param, 0))
+                 for param in cls.readers}
+        return PollingPlan(cls.readers, rates, cls.transient, TRANSIENT)
+
+    @staticmethod
+    def transient(values):
+        return False
+
+    @classmethod
+    def log_data(cls, values, raw=None):
+        # The panels' row, whatever this poll read
+        return {"OUTPUT": values.get("OUTPUT"), "VSET": values.get("VSET"), "VMON": values.get("VMON"),
+                "ISET": values.get("ISET"), "IMON": values.get("IMON"), "Status": values.get("STAT")}
+
+    def next_interval(self):
+        # After a read failed half way, retry no sooner than the fastest period
+        return self.plan.until_due() if self.plan.completed else self.plan.fastest
+
+    def run_commands(self):
+        if self.commands:
+            # Whatever a command set is read back on the next poll
+            self.plan.invalidate()
+        super().run_commands()
+
+    def notify_command(self):
+        self.plan.invalidate()
+        super().notify_command()
+
+    @classmethod
+    def output(cls, status):
+        """The output bit of a STAT value, None if the status is unknown."""
+        return None if status is None else status & cls.output_bit
+
+    @classmethod
+    def read_plan(cls, plan, driver):
+        """Reads what is due of `plan` from `driver`, with OUTPUT in the STAT
+        reading; also used by the GUI panels."""
+        messages = plan.read(driver)
+        for reading, stamp in messages:
+            if "STAT" in reading:
+                reading["OUTPUT"] = cls.output(reading["STAT"])
+        return messages
+
+    def read(self):
+        return self.read_plan(self.plan, self.driver)
+
+class HVPoller(SupplyPoller):
+    device = "HV"
+    readers = HV_READERS
+    default_periods = HV_PERIODS
+    deadbands = HV_DEADBANDS
+    transient = staticmethod(hv_transient)
+    channels = ("OUTPUT",) + tuple(HV_READERS)
+
+class LVPoller(SupplyPoller):
+    device = "LV"
+    readers = LV_READERS
+    default_periods = LV_PERIODS
+    deadbands = LV_DEADBANDS
+    transient = staticmethod(lv_transient)
+    output_bit = 2**4
+    channels = ("OUTPUT",) + tuple(LV_READERS)
+
+class ChillerPoller(Poller):
+    device = "Chiller"
+    channels = ("TEMP", "TSET", "POWER")
+    # In the order the panel has always logged them
+    log_names = {"POWER": "Power", "TSET": "Set Temp (°C)", "TEMP": "Curr Temp (°C)"}
+
+    @classmethod
+    def log_data(cls, values, raw=None):
+        data = {cls.log_names[key]: values.get(key) for key in cls.log_names}
+        if data["Power"] is not None:
+            # Logged as the chiller's own reply, "1" or "0"
+            data["Power"] = str(data["Power"])
+        return data
+
+    @staticmethod
+    def read_chiller(chiller):
+        """TEMP, TSET and POWER, each stamped at its own command; also used by the GUI panel."""
+        messages = [({"TEMP": chiller.get_temperature()}, last_stamp(chiller))]
+        messages.append(({"TSET": chiller.get_work_temperature()}, last_stamp(chiller)))
+        power = chiller.get_power().strip()
+        messages.append(({"POWER": int(power == '1')}, last_stamp(chiller)))
+        return messages
+
+    def read(self):
+        return self.read_chiller(self.driver)
+
+class ArduinoPoller(Poller):
+    device = "Arduino"
+    channels = ("TC1", "TC2", "AMBTEMP", "RH", "DEWPOINT", "DOOR", "LEAK", "DHT")
+
+    def __init__(self, driver, bus, interval=1.0, name=None, min_interval=None, max_interval=None):
+        super().__init__(driver, bus, interval, name)
+        self.rates = self.make_rates(interval, min_interval, max_interval)
+
+    @classmethod
+    def make_rates(cls, interval, min_interval=None, max_interval=None):
+        """The ChannelRates of the Arduino, also used by the GUI panel.
+
+        One command reads every channel, so the pinned DOOR and LEAK keep
+        the Arduino at `interval` or faster.
+        """
+        fastest = interval if min_interval is None else min_interval
+        slowest = interval if max_interval is None else max_interval
+        return ChannelRates({channel: AdaptiveRate(fastest, interval if channel in PINNED else slowest,
+                                                   ARDUINO_DEADBANDS[channel])
+                             for channel in cls.channels}, arduino_transient)
+
+    def next_interval(self):
+        return self.rates.period
+
+    @classmethod
+    def log_data(cls, values, raw=None):
+        # The panel has always logged the whole get_data() dict
+        return dict(values) if raw is None else raw
+
+    @staticmethod
+    def reading(arduino):
+        """Canonical channels of the driver's last get_data(); also used by the GUI panel."""
+        return {
+            "TC1": arduino.TCtemps[0],
+            "TC2": arduino.TCtemps[1],
+            "AMBTEMP": arduino.ambtemp,
+            "RH": arduino.rH,
+            "DEWPOINT": arduino.dewpoint,
+            "DOOR": arduino.door,
+            "LEAK": arduino.leak,
+            "DHT": arduino.dhtstatus,
+        }
+
+    def read(self):
+        arduino = self.driver
+        data = self.raw = arduino.get_data()
+        stamp = last_stamp(arduino)
+        if data is None:
+            # Try again soon rather than after a long flat period
+            self.rates.hurry()
+            return [(None, stamp)]
+        reading = self.reading(arduino)
+        self.rates.update(reading)
+        return [(reading, stamp)]
+
+POLLERS = {cls.device: cls for cls in (HVPoller, LVPoller, ChillerPoller, ArduinoPoller)}
+
+def all_channels(devices=None):
+    """(device, channel) of every canonical channel published by `devices`, a {name: type} mapping."""
+    if devices is None:
+        devices = {device: device for device in POLLERS}
+    return [(name, channel) for name, type in devices.items() for channel in POLLERS[type].channels]
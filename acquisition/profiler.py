@@ -0,0 +1,133 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+PROFILE_DIR = MAIN_DIR / "Profiles"
+
+# Sampling every 10 ms costs well under 1 % of a core with the usual dozen threads
+DEFAULT_INTERVAL = 0.01
+
+class SamplingProfiler():
+    """Wall-clock sampling profiler for every thread of the process.
+
+    A background thread takes the stack of each thread every `interval`
+    seconds and counts identical stacks, rooted at the thread's name (hv_run,
+    lv_run, chiller_run, record, poll-HV, bus-... and MainThread). Blocked
+    and sleeping threads are sampled too, so serial waits show up. dump()
+    writes the counts in the folded format of flamegraph.pl, inferno and
+    speedscope. `include` restricts it to threads whose names contain one of
+    the given strings.
+
+    With a `lag_monitor` (GUI/lag_monitor.py), main thread samples taken
+    while the Qt event loop is late are rooted at "MainThread [event loop
+    blocked]", which attributes GUI stalls to the code that caused them.
+    """
+    def __init__(self, interval=DEFAULT_INTERVAL, include=None, lag_monitor=None):
+        self.interval = interval
+        self.include = include
+        self.lag_monitor = lag_monitor
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.labels = {}
+        self.samples = 0
+        self.sampling_s = 0.0
+        self.started = None
+        self.elapsed = 0.0
+        self.stop_evt = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_evt.clear()
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_evt.set()
+        self.thread.join()
+        self.thread = None
+        self.elapsed += time.monotonic() - self.started
+
+    def toggle(self):
+        """Starts profiling, or stops it and returns the path of the dump."""
+        if self.running:
+            self.stop()
+            return self.dump()
+        self.start()
+        return None
+
+    def run(self):
+        while not self.stop_evt.wait(self.interval):
+            t0 = time.perf_counter()
+            self.sample()
+            self.sampling_s += time.perf_counter() - t0
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = self.labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def sample(self):
+        frames = sys._current_frames()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        blocked = self.lag_monitor is not None and self.lag_monitor.blocked()
+        stacks = []
+        for ident, frame in frames.items():
+            if ident == own:
+                continue
+            name = names.get(ident, f"thread-{ident}")
+            if self.include is not None and not any(part in name for part in self.include):
+                continue
+            if blocked and name == "MainThread":
+                name = "MainThread [event loop blocked]"
+            stack = []
+            while frame is not None:
+                stack.append(self.label(frame.f_code))
+                frame = frame.f_back
+            stack.append(name)
+            stacks.append(";".join(reversed(stack)))
+        with self.lock:
+            self.counts.update(stacks)
+            self.samples += 1
+
+    def stats(self):
+        elapsed = self.elapsed + (time.monotonic() - self.started if self.running else 0.0)
+        return {"samples": self.samples, "seconds": elapsed,
+                "overhead_percent": 100.0 * self.sampling_s / elapsed if elapsed else 0.0}
+
+    def dump(self, path=None):
+        """Writes "frame;frame;... count" lines and returns the path."""
+        if path is None:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            path = PROFILE_DIR / f"profile_{time.strftime('%Y-%m-%d-%H-%M-%S')}.folded"
+        with self.lock:
+            lines = [f"{stack} {count}\n" for stack, count in self.counts.most_common()]
+        with open(path, "w") as f:
+            f.writelines(lines)
+        stats = self.stats()
+        print(f"Profile of {stats['samples']} samples over {stats['seconds']:.0f} s "
+              f"({stats['overhead_percent']:.2f} % spent sampling) written to {path}")
+        return path
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+            self.samples = 0
+        self.sampling_s = 0.0
+        self.elapsed = 0.0
+        if self.running:
+            self.started = time.monotonic()
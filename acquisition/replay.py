@@ -0,0 +1,133 @@
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+for driver in ("Common", "HV", "LV", "Chiller", "Arduino"):
+    sys.path.append(str(MAIN_DIR / "drivers" / driver))
+telemetry_dir = MAIN_DIR / "telemetry"
+sys.path.append(str(telemetry_dir))
+
+from serial_trace import REPLAY_PREFIX, ReplayFinished, read_trace, summarize
+
+from bus import Bus
+from config import DEFAULT_CONFIG, OPENERS, DeviceConfig, load_config
+
+# Port name fragments of the default udev links, for traces of ports not in the config
+PORT_TYPES = {"hv": "HV", "lv": "LV", "chiller": "Chiller", "arduino": "Arduino"}
+
+def device_for(path, stand):
+    """The stand's DeviceConfig whose port a trace was recorded from."""
+    header, _ = read_trace(path)
+    port = header.get("port", "")
+    for device in stand.devices.values():
+        if device["port"] == port:
+            return device
+    name = Path(port).name.lower()
+    for fragment, type in PORT_TYPES.items():
+        if name.startswith(fragment):
+            return DeviceConfig(stand.name, type, type, dict(DeviceConfig.default(type).settings, port=port))
+    raise ValueError(f"{path}: no device on {port!r} in stand {stand.name}, and its type is not clear from the name")
+
+class Replay():
+    """Feeds one trace to the real driver and poller, as fast as possible or paced.
+
+    Readings are published on `bus` and, with `db`, stored under the wall
+    time they were originally taken.
+    """
+    def __init__(self, path, device, bus, speed=0.0, db=None):
+        self.path = path
+        self.device = device
+        self.bus = bus
+        self.db = db
+        settings = dict(device.settings, port=f"{REPLAY_PREFIX}{path}?speed={speed}")
+        self.driver = OPENERS[device.type](settings)
+        self.poller = device.poller(self.driver, bus)
+        if hasattr(self.poller, "plan"):
+            # Parameters come due as they did when recorded, not by the replay's pace
+            self.poller.plan.clock = self.port.clock
+        self.readings = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.driver.ser
+
+    def run(self):
+        start = time.perf_counter()
+        while True:
+            try:
+                messages = self.poller.read()
+            except ReplayFinished:
+                break
+            except Exception as e:
+                self.errors += 1
+                print(f"{self.device.name}: error in recorded exchange: {e}")
+                continue
+            if not messages:
+                # Nothing was due at this point of the trace: the recording
+                # polled with other periods, so move on to its next exchange
+                try:
+                    self.port.skip()
+                except ReplayFinished:
+                    break
+                continue
+            for reading, stamp in messages:
+                if reading is None:
+                    self.errors += 1
+                    continue
+                self.readings += 1
+                self.bus.publish(self.device.name, reading, stamp)
+                if self.db is not None:
+                    self.db.add_reading(self.device.name, reading, self.port.wall_ns(stamp.t_request) / 1e9)
+        self.elapsed = time.perf_counter() - start
+        self.driver.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"replay-{self.device.name}", daemon=True)
+        self.thread.start()
+
+    def result(self):
+        info = summarize(self.path)
+        return (f"{self.device.name:<10}{self.readings:>9} readings{self.errors:>6} errors"
+                f"{self.port.mismatches:>6} mismatched writes  {info['duration_s']:>9.0f} s recorded"
+                f" in {self.elapsed:.2f} s ({self.readings / self.elapsed if self.elapsed else 0:.0f} readings/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay serial traces through the drivers and pollers")
+    parser.add_argument("traces", nargs="+", help=".etltrace files, e.g. from ETL_SERIAL_TRACE=<dir> or main.py --record")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--stand", help="stand the traces were recorded on, by default the first in the config")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="multiple of real time, 0 (the default) for as fast as possible")
+    parser.add_argument("--db", help="store the replayed readings in this SQLite database")
+    parser.add_argument("--info", action="store_true", help="only summarize the traces")
+    args = parser.parse_args()
+
+    if args.info:
+        for path in args.traces:
+            print(path, summarize(path))
+        return
+
+    stand = load_config(args.config).stand(args.stand)
+    db = None
+    if args.db is not None:
+        from sqlite_store import SQLiteStore
+        db = SQLiteStore(args.db)
+    bus = Bus()
+    replays = [Replay(path, device_for(path, stand), bus, args.speed, db) for path in args.traces]
+    for replay in replays:
+        replay.start()
+    for replay in replays:
+        replay.thread.join()
+        print(replay.result())
+    bus.close()
+    if db is not None:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+import resource
+import threading
+import time
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_bytes():
+    """Current resident set size, or the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # ru_maxrss is in kB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+class ResourceMonitor():
+    """CPU and memory use of this process since the previous sample."""
+    def __init__(self):
+        self.t_last = time.monotonic()
+        self.cpu_last = time.process_time()
+
+    def sample(self):
+        now, cpu = time.monotonic(), time.process_time()
+        elapsed = max(now - self.t_last, 1e-9)
+        usage = {
+            "cpu_percent": 100.0 * (cpu - self.cpu_last) / elapsed,
+            "rss_mb": rss_bytes() / 2**20,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "threads": threading.active_count(),
+        }
+        self.t_last, self.cpu_last = now, cpu
+        return usage
+
+    @staticmethod
+    def format(usage):
+        return (f"CPU {usage['cpu_percent']:.1f}%  RSS {usage['rss_mb']:.1f} MB "
+                f"(peak {usage['peak_rss_mb']:.1f} MB)  threads {usage['threads']}")
@@ -0,0 +1,460 @@
+import argparse
+import ast
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import yaml
+
+MAIN_DIR = Path(__file__).parent.parent
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
+
+from config import DEFAULT_CONFIG, load_config
+from pollers import all_channels
+from stability import stability_channels
+from trajectory import DEW_MARGIN, TRAJECTORY_CHANNELS, TRAJECTORY_DEVICE, SetpointScheduler
+
+class SequenceError(RuntimeError):
+    pass
+
+class Cancelled(SequenceError):
+    pass
+
+class Readings():
+    """Attribute access to one device's latest channels inside a wait condition."""
+    def __init__(self, channels):
+        self.__dict__.update(channels)
+
+    def __getattr__(self, channel):
+        # Channel names are checked when the condition is parsed; channels not
+        # read yet make the condition false rather than fail
+        return None
+
+class Context():
+    """What steps act on: the stand's drivers and its latest readings.
+
+    Readings arrive through a bus subscription; waits block on a condition
+    variable notified by each new message, so a wait ends on the first
+    reading that satisfies it instead of at the next poll of a timer.
+    With `pollers`, commands are announced to the device's poller so it
+    reads back what they changed, and ramp setpoints go through its submit().
+    """
+    def __init__(self, drivers, bus, pollers=None):
+        self.drivers = drivers
+        self.pollers = pollers or {}
+        self.state = {}
+        self.vars = {}
+        self.cond = threading.Condition()
+        self.cancel_evt = threading.Event()
+        self.records = []
+        self.records_lock = threading.Lock()
+        self.subscription = bus.attach("sequence", self.update, maxsize=256)
+        self.bus = bus
+
+    def update(self, message):
+        with self.cond:
+            self.state.setdefault(message.device, {}).update(message.values)
+            self.cond.notify_all()
+
+    def namespace(self):
+        with self.cond:
+            devices = {device: Readings(self.state.get(device, {})) for device in set(self.drivers) | set(self.state)}
+        devices.update({"abs": abs, "min": min, "max": max, "vars": self.vars, **self.vars})
+        return devices
+
+    def driver(self, device):
+        if device not in self.drivers:
+            raise SequenceError(f"No connected device {device!r}, expected one of {list(self.drivers)}")
+        return self.drivers[device]
+
+    def call(self, device, method, *args, **kwargs):
+        """Calls a driver method directly, as commands such as an IV scan can take
+        minutes that the poll thread must not be blocked for, then lets the
+        device's poller know."""
+        try:
+            return getattr(self.driver(device), method)(*args, **kwargs)
+        finally:
+            if device in self.pollers:
+                self.pollers[device].notify_command()
+
+    def sender(self, device, method):
+        """A send(value) for short commands: through the device's poller when it has one."""
+        if device in self.pollers:
+            return lambda value: self.pollers[device].submit(lambda driver: getattr(driver, method)(value))
+        return getattr(self.driver(device), method)
+
+    def sleep(self, seconds):
+        if self.cancel_evt.wait(seconds):
+            raise Cancelled("Sequence cancelled")
+
+    def check(self):
+        if self.cancel_evt.is_set():
+            raise Cancelled("Sequence cancelled")
+
+    def record(self, path, kind, name, start, end, status, detail=""):
+        with self.records_lock:
+            self.records.append({"step": path, "kind": kind, "name": name, "start": start, "end": end,
+                                 "duration": end - start, "status": status, "detail": detail})
+
+    def close(self):
+        self.bus.unsubscribe(self.subscription)
+
+def _substitute(value, vars):
+    """Replaces "{name}" with a foreach variable; a bare "{name}" keeps the variable's type."""
+    if isinstance(value, str):
+        if value.startswith("{") and value.endswith("}") and value[1:-1] in vars:
+            return vars[value[1:-1]]
+        return value.format(**vars) if "{" in value else value
+    if isinstance(value, list):
+        return [_substitute(v, vars) for v in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, vars) for k, v in value.items()}
+    return value
+
+class Step(ABC):
+    kind = "step"
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def describe(self):
+        return self.name or self.kind
+
+    @abstractmethod
+    def execute(self, ctx, path):
+        """Does the step's work; run() wraps it with timing and cancellation."""
+
+    def run(self, ctx, path):
+        """Runs the step and records its timing, whatever the outcome."""
+        ctx.check()
+        start = time.monotonic()
+        status, detail = "ok", ""
+        try:
+            return self.execute(ctx, path)
+        except Cancelled:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            status, detail = "failed", str(e)
+            raise
+        finally:
+            name = self.describe()
+            if self.name:
+                name = str(_substitute(name, ctx.vars))
+            ctx.record(path, self.kind, name, start, time.monotonic(), status, detail)
+
+class Command(Step):
+    """Calls a driver method, e.g. Command("HV", "set_voltage", 200)."""
+    kind = "command"
+
+    def __init__(self, device, method, *args, name=None, **kwargs):
+        super().__init__(name)
+        self.device = device
+        self.method = method
+        self.args = list(args)
+        self.kwargs = kwargs
+
+    def describe(self):
+        return self.name or f"{self.device}.{self.method}"
+
+    def execute(self, ctx, path):
+        return ctx.call(self.device, self.method, *_substitute(self.args, ctx.vars), **_substitute(self.kwargs, ctx.vars))
+
+class Call(Step):
+    """Calls fn(ctx) for anything a driver method does not cover."""
+    kind = "call"
+
+    def __init__(self, fn, name=None):
+        super().__init__(name or getattr(fn, "__name__", None))
+        self.fn = fn
+
+    def execute(self, ctx, path):
+        return self.fn(ctx)
+
+class Sleep(Step):
+    kind = "sleep"
+
+    def __init__(self, seconds, name=None):
+        super().__init__(name)
+        self.seconds = seconds
+
+    def describe(self):
+        return self.name or f"sleep {self.seconds} s"
+
+    def execute(self, ctx, path):
+        ctx.sleep(_substitute(self.seconds, ctx.vars))
+
+class Ramp(Step):
+    """Ramps the chiller setpoint to `target` above the dew point (see SetpointScheduler).
+
+    Finishes once the target is set; the bath is then still on its way, so
+    follow it with a wait on Stability.BATH_STABLE.
+    """
+    kind = "ramp"
+
+    def __init__(self, target, rate=None, dew_margin=DEW_MARGIN, timeout=None, device="Chiller",
+                 arduino="Arduino", name=None):
+        super().__init__(name)
+        self.target = target
+        self.rate = rate
+        self.dew_margin = dew_margin
+        self.timeout = timeout
+        self.device = device
+        self.arduino = arduino
+
+    def describe(self):
+        return self.name or f"ramp {self.device} to {self.target} °C"
+
+    def execute(self, ctx, path):
+        scheduler = SetpointScheduler(ctx.bus, ctx.sender(self.device, "set_work_temperature"), _substitute(self.target, ctx.vars),
+                                      self.rate, self.dew_margin, chiller=self.device, arduino=self.arduino)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        scheduler.start()
+        try:
+            while not scheduler.wait(1.0):
+                ctx.check()
+                if deadline is not None and time.monotonic() > deadline:
+                    raise SequenceError(f"Timed out after {self.timeout} s at {scheduler.setpoint} °C "
+                                        f"(floor {scheduler.floor} °C) ramping to {scheduler.target} °C")
+        finally:
+            scheduler.stop()
+
+class WaitUntil(Step):
+    """Waits until a condition over the latest readings holds.
+
+    The condition is a Python expression such as
+    "abs(Chiller.TEMP - Chiller.TSET) < 0.2 and Arduino.TC1 - Arduino.DEWPOINT > 3",
+    or a callable taking the namespace of devices. `hold` requires it to stay
+    true for that many seconds. Every Device.CHANNEL in an expression must be
+    a channel the device publishes, checked against `devices` (a {name: type}
+    mapping, by default one device of each type) and the Stability and
+    Trajectory channels.
+    """
+    kind = "wait"
+
+    def __init__(self, condition, timeout=None, hold=0.0, name=None, devices=None):
+        super().__init__(name)
+        self.condition = condition
+        self.timeout = timeout
+        self.hold = hold
+        self.code = None
+        if isinstance(condition, str):
+            self.code = compile(condition, "<wait>", "eval")
+            self.check_channels(devices)
+
+    def check_channels(self, devices=None):
+        # A misspelt channel would read as None forever and only show as a timeout
+        known = {}
+        channels = all_channels(devices) + stability_channels()
+        channels += [(TRAJECTORY_DEVICE, channel) for channel in TRAJECTORY_CHANNELS]
+        for device, channel in channels:
+            known.setdefault(device, set()).add(channel)
+        for node in ast.walk(ast.parse(self.condition, mode="eval")):
+            if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+                    and node.value.id in known and node.attr not in known[node.value.id]):
+                raise SequenceError(f"{node.value.id} has no channel {node.attr!r} in {self.condition!r}, "
+                                    f"expected one of {', '.join(sorted(known[node.value.id]))}")
+
+    def describe(self):
+        return self.name or f"wait {self.condition if self.code is not None else self.condition.__name__}"
+
+    def holds(self, ctx):
+        namespace = ctx.namespace()
+        try:
+            if self.code is not None:
+                return bool(eval(self.code, {"__builtins__": {}}, namespace))
+            return bool(self.condition(namespace))
+        except TypeError:
+            # A channel is still None
+            return False
+
+    def execute(self, ctx, path):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        since = None
+        while True:
+            ctx.check()
+            if self.holds(ctx):
+                since = time.monotonic() if since is None else since
+                if time.monotonic() - since >= self.hold:
+                    return True
+            else:
+                since = None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise SequenceError(f"Timed out after {self.timeout} s waiting for {self.describe()}")
+            # Wake on the next reading, or to re-check a hold time or the cancel flag
+            wait = 1.0 if remaining is None else min(1.0, remaining)
+            if since is not None:
+                wait = min(wait, max(0.0, self.hold - (time.monotonic() - since)))
+            with ctx.cond:
+                ctx.cond.wait(wait)
+
+class Sequence(Step):
+    kind = "sequence"
+
+    def __init__(self, steps, name=None):
+        super().__init__(name)
+        self.steps = steps
+
+    def execute(self, ctx, path):
+        for i, step in enumerate(self.steps):
+            step.run(ctx, f"{path}/{i}" if path else str(i))
+
+class Parallel(Step):
+    """Runs branches concurrently and waits for all of them.
+
+    A failing branch cancels the whole sequence, since later steps usually
+    assume every branch completed.
+    """
+    kind = "parallel"
+
+    def __init__(self, branches, name=None):
+        super().__init__(name)
+        self.branches = branches
+
+    def execute(self, ctx, path):
+        errors = []
+
+        def run(i, branch):
+            try:
+                branch.run(ctx, f"{path}/{i}" if path else str(i))
+            except Exception as e:
+                errors.append(e)
+                ctx.cancel_evt.set()
+
+        threads = [threading.Thread(target=run, args=(i, branch), name=f"seq-{path}/{i}", daemon=True)
+                   for i, branch in enumerate(self.branches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        failures = [e for e in errors if not isinstance(e, Cancelled)]
+        if failures or errors:
+            raise (failures or errors)[0]
+
+class ForEach(Step):
+    """Runs `steps` once per value with ctx.vars[var] bound, e.g. once per temperature."""
+    kind = "foreach"
+
+    def __init__(self, var, values, steps, name=None):
+        super().__init__(name)
+        self.var = var
+        self.values = values
+        self.body = Sequence(steps)
+
+    def describe(self):
+        return self.name or f"foreach {self.var}"
+
+    def execute(self, ctx, path):
+        for value in self.values:
+            ctx.vars[self.var] = value
+            self.body.run(ctx, f"{path}/{self.var}={value}")
+
+def parse_step(spec, devices=None):
+    """Builds a Step from its YAML form; `devices` as for WaitUntil."""
+    if isinstance(spec, list):
+        return Sequence([parse_step(s, devices) for s in spec])
+    if not isinstance(spec, dict):
+        raise SequenceError(f"Expected a step mapping, got {spec!r}")
+    name = spec.get("name")
+    if "command" in spec:
+        device, _, method = spec["command"].partition(".")
+        if not method:
+            raise SequenceError(f"command must be Device.method, got {spec['command']!r}")
+        return Command(device, method, *spec.get("args", []), name=name, **spec.get("kwargs", {}))
+    if "wait" in spec:
+        return WaitUntil(spec["wait"], timeout=spec.get("timeout"), hold=spec.get("hold", 0.0), name=name,
+                         devices=devices)
+    if "sleep" in spec:
+        return Sleep(spec["sleep"], name=name)
+    if "ramp" in spec:
+        return Ramp(spec["ramp"], rate=spec.get("rate"), dew_margin=spec.get("margin", DEW_MARGIN),
+                    timeout=spec.get("timeout"), device=spec.get("device", "Chiller"), name=name)
+    if "parallel" in spec:
+        return Parallel([parse_step(branch, devices) for branch in spec["parallel"]], name=name)
+    if "sequence" in spec:
+        return Sequence([parse_step(s, devices) for s in spec["sequence"]], name=name)
+    if "foreach" in spec:
+        loop = spec["foreach"]
+        return ForEach(loop["var"], loop["values"], [parse_step(s, devices) for s in spec.get("steps", [])],
+                       name=name)
+    raise SequenceError(f"Unknown step {spec!r}, expected command, wait, sleep, ramp, parallel, sequence or foreach")
+
+def load_sequence(path, devices=None):
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+    return spec.get("name", Path(path).stem), Sequence([parse_step(s, devices) for s in spec["steps"]])
+
+def run_sequence(sequence, ctx, name="sequence", log_dir=MAIN_DIR / "Sequence Logs"):
+    """Runs a sequence and writes every step's timing to `log_dir` as JSON.
+
+    Returns the summary, including how much overlapping steps saved against
+    running the leaf steps one after another.
+    """
+    t0 = time.monotonic()
+    status, error = "ok", None
+    try:
+        sequence.run(ctx, "")
+    except Cancelled as e:
+        status, error = "cancelled", str(e)
+    except Exception as e:
+        status, error = "failed", str(e)
+    total = time.monotonic() - t0
+
+    leaves = [r for r in ctx.records if r["kind"] not in ("sequence", "parallel", "foreach")]
+    serial = sum(r["duration"] for r in leaves)
+    for r in ctx.records:
+        r["start"] -= t0
+        r["end"] -= t0
+    summary = {"name": name, "status": status, "error": error, "total": total, "serial": serial,
+               "saved": max(0.0, serial - total), "steps": sorted(ctx.records, key=lambda r: r["start"])}
+    if log_dir is not None:
+        if not os.path.isdir(log_dir):
+            os.makedirs(log_dir)
+        with open(Path(log_dir) / f"{name}_{time.strftime('%Y-%m-%d-%H-%M-%S')}.json", "w") as f:
+            json.dump(summary, f, indent=1)
+    return summary
+
+def format_summary(summary):
+    lines = [f"{'start':>9}{'duration':>10}  {'status':<10}step"]
+    for r in summary["steps"]:
+        if r["kind"] == "sequence" and r["name"] == "sequence":
+            continue
+        lines.append(f"{r['start']:>9.1f}{r['duration']:>10.1f}  {r['status']:<10}{r['step'] or '-'} {r['name']}"
+                     + (f": {r['detail']}" if r["detail"] else ""))
+    lines.append(f"{summary['name']} {summary['status']} in {summary['total']:.1f} s "
+                 f"({summary['serial']:.1f} s of steps, {summary['saved']:.1f} s saved by running them in parallel)")
+    if summary["error"]:
+        lines.append(f"Error: {summary['error']}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a test sequence on a stand")
+    parser.add_argument("sequence", help="YAML sequence file")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--stand", help="stand to run on, by default the first in the config")
+    args = parser.parse_args()
+
+    from daemon import AcquisitionDaemon
+    stand = load_config(args.config).stand(args.stand)
+    name, sequence = load_sequence(args.sequence, stand.types())
+    daemon = AcquisitionDaemon(stand, log=True)
+    ctx = Context({device: poller.driver for device, poller in daemon.pollers.items()}, daemon.bus, daemon.pollers)
+    signal.signal(signal.SIGINT, lambda *_: ctx.cancel_evt.set())
+    signal.signal(signal.SIGTERM, lambda *_: ctx.cancel_evt.set())
+    daemon.start()
+    try:
+        summary = run_sequence(sequence, ctx, name)
+        print(format_summary(summary))
+    finally:
+        ctx.close()
+        daemon.stop()
+
+if __name__ == "__main__":
+    main()
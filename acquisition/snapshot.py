@@ -0,0 +1,202 @@
+import json
+import math
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+MAIN_DIR = Path(__file__).parent.parent
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+
+from session_clock import SESSION_CLOCK, Stamp
+
+DEFAULT_NAME = "etl_snapshot"
+MAGIC = b"ETLSNAP1"
+# magic, seqlock counter, channel count, directory length
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("seq", "<u8"), ("n", "<u4"), ("dir_len", "<u4")])
+# Wall time (epoch s) of the reading and its value, NaN when missing
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("value", "<f8")])
+
+def _layout(n, dir_len):
+    records_offset = HEADER_DTYPE.itemsize + (dir_len + 7) // 8 * 8
+    return records_offset, records_offset + n * RECORD_DTYPE.itemsize
+
+class SnapshotWriter():
+    """Latest value of every channel in a shared memory block, for other processes.
+
+    The block holds a header, a JSON directory of (device, channel) pairs and
+    one fixed-size record per channel. Writes are guarded by a seqlock: the
+    counter is odd while an update is in progress, so readers never block the
+    writer and retry only when they raced it.
+    """
+    def __init__(self, channels, name=DEFAULT_NAME):
+        self.channels = [tuple(key) for key in channels]
+        self.index = {key: i for i, key in enumerate(self.channels)}
+        directory = json.dumps(self.channels).encode()
+        records_offset, size = _layout(len(self.channels), len(directory))
+
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a daemon that did not exit cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = name
+
+        buf = self.shm.buf
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=buf)
+        buf[HEADER_DTYPE.itemsize:HEADER_DTYPE.itemsize + len(directory)] = directory
+        self.records = np.ndarray((len(self.channels),), RECORD_DTYPE, buffer=buf, offset=records_offset)
+        self.records["t"] = np.nan
+        self.records["value"] = np.nan
+        self.seq = np.ndarray((1,), "<u8", buffer=buf, offset=HEADER_DTYPE.fields["seq"][1])
+        self.count = 0
+        self.header["n"] = len(self.channels)
+        self.header["dir_len"] = len(directory)
+        # Written last so readers only attach to a complete block
+        self.header["magic"] = MAGIC
+        self.lock = threading.Lock()
+
+    def update(self, device, values, t=None):
+        """Writes the channels of one reading under a single seqlock increment."""
+        t = time.time() if t is None else t
+        slots, numbers = [], []
+        for channel, value in values.items():
+            i = self.index.get((device, channel))
+            if i is None:
+                continue
+            if value is None:
+                value = math.nan
+            elif not isinstance(value, (int, float)):
+                continue
+            slots.append(i)
+            numbers.append(value)
+        numbers = np.array(numbers, dtype=np.float64)
+        with self.lock:
+            self.count += 1
+            self.seq[0] = self.count
+            self.records["t"][slots] = t
+            self.records["value"][slots] = numbers
+            self.count += 1
+            self.seq[0] = self.count
+
+    def publish(self, message):
+        """Bus handler: stores a Message at the wall time of its stamp."""
+        t = None if message.stamp is None else SESSION_CLOCK.to_wall(message.stamp.midpoint)
+        self.update(message.device, message.values, t)
+
+    def close(self):
+        del self.header, self.records, self.seq
+        self.shm.close()
+        # A reader sharing our resource tracker (e.g. a supervisor that spawned
+        # us) has unregistered the block; register it again so unlink() balances
+        from multiprocessing import resource_tracker
+        resource_tracker.register(self.shm._name, "shared_memory")
+        self.shm.unlink()
+
+class SnapshotReader():
+    """Lock-free reader of a SnapshotWriter block in another process."""
+    def __init__(self, name=DEFAULT_NAME):
+        self.shm = shared_memory.SharedMemory(name=name)
+        try:
+            # Python < 3.13 would otherwise unlink the writer's block when this process exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+        buf = self.shm.buf
+        self.header = np.ndarray((), HEADER_DTYPE, buffer=buf)
+        if bytes(self.header["magic"]) != MAGIC:
+            self.shm.close()
+            raise RuntimeError(f"Shared memory block {name} is not an acquisition snapshot")
+        n, dir_len = int(self.header["n"]), int(self.header["dir_len"])
+        directory = bytes(buf[HEADER_DTYPE.itemsize:HEADER_DTYPE.itemsize + dir_len])
+        self.channels = [tuple(key) for key in json.loads(directory)]
+        self.index = {key: i for i, key in enumerate(self.channels)}
+        records_offset, _ = _layout(n, dir_len)
+        self.records = np.ndarray((n,), RECORD_DTYPE, buffer=buf, offset=records_offset)
+        self.seq = np.ndarray((1,), "<u8", buffer=buf, offset=HEADER_DTYPE.fields["seq"][1])
+
+    @classmethod
+    def wait(cls, name=DEFAULT_NAME, timeout=10.0):
+        """Attaches to a block that a just-started writer may not have created yet."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return cls(name)
+            except (FileNotFoundError, RuntimeError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def read(self, timeout=0.1):
+        """Returns (seq, copy of every record), consistent with a single point in time."""
+        deadline = None
+        while True:
+            before = int(self.seq[0])
+            if not before & 1:
+                records = self.records.copy()
+                if int(self.seq[0]) == before:
+                    return before, records
+            if deadline is None:
+                deadline = time.monotonic() + timeout
+            elif time.monotonic() > deadline:
+                raise TimeoutError("Snapshot writer held the seqlock for too long")
+
+    def snapshot(self):
+        """Returns {device: {channel: (t, value)}} of every channel read so far."""
+        _, records = self.read()
+        result = {}
+        for (device, channel), (t, value) in zip(self.channels, records.tolist()):
+            if not math.isnan(t):
+                result.setdefault(device, {})[channel] = (t, value)
+        return result
+
+    def latest(self, device, channel):
+        _, records = self.read()
+        t, value = records[self.index[(device, channel)]].tolist()
+        return None if math.isnan(t) else (t, value)
+
+    def close(self):
+        del self.header, self.records, self.seq
+        self.shm.close()
+
+def follow(reader, bus, interval=0.1, stop_evt=None):
+    """Republishes snapshot updates on a local bus, one message per updated device.
+
+    Lets an in-process consumer such as the GUI's plots run off a daemon's
+    snapshot instead of the serial ports. Returns the thread and its stop event.
+    """
+    stop_evt = threading.Event() if stop_evt is None else stop_evt
+
+    def run():
+        last_seq = None
+        last_t = np.full(len(reader.channels), np.nan)
+        while not stop_evt.is_set():
+            seq, records = reader.read()
+            if seq != last_seq:
+                last_seq = seq
+                changed = np.flatnonzero(records["t"] != last_t)
+                last_t = records["t"].copy()
+                by_device = {}
+                for i in changed.tolist():
+                    if math.isnan(records["t"][i]):
+                        continue
+                    device, channel = reader.channels[i]
+                    values, t = by_device.setdefault(device, ({}, records["t"][i]))
+                    value = records["value"][i]
+                    values[channel] = None if math.isnan(value) else float(value)
+                for device, (values, t) in by_device.items():
+                    mono = SESSION_CLOCK.from_wall_ns(int(t * 1e9))
+                    bus.publish(device, values, Stamp(mono, mono))
+            stop_evt.wait(interval)
+
+    thread = threading.Thread(target=run, name="snapshot-follow", daemon=True)
+    thread.start()
+    return thread, stop_evt
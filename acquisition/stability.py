@@ -0,0 +1,215 @@
+import math
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+sys.path.append(str(MAIN_DIR / "drivers" / "Common"))
+
+from session_clock import SESSION_CLOCK, Stamp
+
+# Results are published on the bus under this device, e.g. Stability.BATH_STABLE
+STABILITY_DEVICE = "Stability"
+FIELDS = ("STABLE", "ETA", "DRIFT", "NOISE", "FINAL")
+
+# Defaults for the "Stability" section of a stand
+WINDOW = 300.0          # s of readings each fit looks at
+DRIFT_LIMIT = 0.05      # K/min
+NOISE_LIMIT = 0.05      # K rms
+TOLERANCE = 0.2         # K from the setpoint
+
+class Tracker():
+    """Streaming estimate of how one temperature approaches its final value.
+
+    The window is split into thirds in time. Their means m1, m2, m3 fix an
+    exponential approach T(t) = T_final + A exp(-t/tau): the ratio
+    (m3 - m2) / (m2 - m1) is exp(-window/3/tau) and T_final follows from
+    Aitken's formula. With `target` (a (device, channel) such as the chiller
+    setpoint) T_final is taken from there instead. Drift is the slope of a
+    straight line over the window, noise the spread of successive differences
+    divided by sqrt(2), which ignores the trend.
+    """
+    def __init__(self, name, device, channel, target=None, window=WINDOW, drift_limit=DRIFT_LIMIT,
+                 noise_limit=NOISE_LIMIT, tolerance=TOLERANCE):
+        self.name = name
+        self.device = device
+        self.channel = channel
+        self.target = target
+        self.window = window
+        self.drift_limit = drift_limit
+        self.noise_limit = noise_limit
+        self.tolerance = tolerance
+        self.points = deque()
+        self.setpoint = None
+        self.stable = False
+        self.since = None
+
+    def add(self, t, value):
+        if value is None or isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+            return
+        self.points.append((t, float(value)))
+        while self.points and t - self.points[0][0] > self.window:
+            self.points.popleft()
+
+    def estimate(self):
+        """{"STABLE", "ETA" (s, None if unknown), "DRIFT" (K/min), "NOISE" (K), "FINAL"}."""
+        n = len(self.points)
+        result = dict.fromkeys(FIELDS)
+        result["STABLE"] = False
+        if n < 6:
+            return result
+        ts = [p[0] for p in self.points]
+        vs = [p[1] for p in self.points]
+        t0 = ts[0]
+        span = ts[-1] - t0
+        mean_t = sum(ts) / n - t0
+        mean_v = sum(vs) / n
+        stt = sum((t - t0 - mean_t) ** 2 for t in ts)
+        slope = sum((t - t0 - mean_t) * (v - mean_v) for t, v in zip(ts, vs)) / stt if stt > 0 else 0.0
+        diffs = [b - a for a, b in zip(vs, vs[1:])]
+        mean_d = sum(diffs) / len(diffs)
+        noise = math.sqrt(sum((d - mean_d) ** 2 for d in diffs) / len(diffs) / 2)
+        drift = slope * 60
+        result["DRIFT"] = drift
+        result["NOISE"] = noise
+
+        current = vs[-1]
+        final, tau = self.fit(ts, vs)
+        if self.setpoint is not None:
+            final = self.setpoint
+        result["FINAL"] = final
+
+        full = span >= 0.8 * self.window
+        on_target = self.setpoint is None or abs(current - self.setpoint) <= self.tolerance
+        result["STABLE"] = full and on_target and abs(drift) <= self.drift_limit and noise <= self.noise_limit
+        if result["STABLE"]:
+            result["ETA"] = 0.0
+        elif tau is not None and final is not None:
+            # Until the predicted drift is within the limit and, with a
+            # setpoint, the temperature is within tolerance of it
+            eta = tau * math.log(max(abs(current - final) / tau * 60 / self.drift_limit, 1.0))
+            if self.setpoint is not None:
+                eta = max(eta, tau * math.log(max(abs(current - self.setpoint) / self.tolerance, 1.0)))
+            # The window must also span the settled part
+            result["ETA"] = max(eta, 0.8 * self.window - span)
+        elif self.setpoint is not None and slope != 0 and (self.setpoint - current) / slope > 0:
+            # Too little curvature to fit; assume it keeps moving as it does now
+            result["ETA"] = (abs(self.setpoint - current) - self.tolerance) / abs(slope)
+        return result
+
+    def fit(self, ts, vs):
+        """(T_final, tau) from the means of the window's thirds, or (None, None)."""
+        t0, t3 = ts[0], ts[-1]
+        third = (t3 - t0) / 3
+        if third <= 0:
+            return None, None
+        sums = [[0.0, 0] for _ in range(3)]
+        for t, v in zip(ts, vs):
+            i = min(int((t - t0) / third), 2)
+            sums[i][0] += v
+            sums[i][1] += 1
+        if any(count == 0 for _, count in sums):
+            return None, None
+        m1, m2, m3 = (total / count for total, count in sums)
+        d1, d2 = m2 - m1, m3 - m2
+        # Changes smaller than the noise say nothing about the shape
+        if abs(d1) < 1e-6 or d1 * d2 <= 0 or abs(d2) >= abs(d1):
+            return None, None
+        ratio = d2 / d1
+        tau = -third / math.log(ratio)
+        final = m3 + d2 * ratio / (1 - ratio)
+        return final, tau
+
+class StabilityDetector():
+    """Watches chiller and TC temperatures on the bus and says when they have settled.
+
+    Each tracker's estimate is published as Stability.<NAME>_STABLE, _ETA,
+    _DRIFT, _NOISE and _FINAL, so sequences can wait on
+    "Stability.BATH_STABLE" and the snapshot and API carry them. When a
+    tracker becomes stable an event is added to `events` and `callbacks` are
+    called with it.
+    """
+    def __init__(self, bus, trackers=None, publish_interval=1.0):
+        self.bus = bus
+        self.trackers = trackers if trackers is not None else default_trackers()
+        self.publish_interval = publish_interval
+        self.lock = threading.Lock()
+        self.last_publish = 0.0
+        self.events = deque(maxlen=200)
+        self.callbacks = []
+        self.estimates = {}
+        devices = set()
+        for tracker in self.trackers:
+            devices.add(tracker.device)
+            if tracker.target is not None:
+                devices.add(tracker.target[0])
+        self.subscription = bus.attach("stability", self.update, devices=sorted(devices))
+
+    def update(self, message):
+        t = SESSION_CLOCK.to_wall(message.stamp.midpoint)
+        with self.lock:
+            for tracker in self.trackers:
+                if tracker.target is not None and tracker.target[0] == message.device:
+                    setpoint = message.values.get(tracker.target[1])
+                    if setpoint is not None and setpoint != tracker.setpoint:
+                        # A new setpoint starts a new approach
+                        if tracker.setpoint is not None:
+                            tracker.points.clear()
+                        tracker.setpoint = setpoint
+                if tracker.device == message.device:
+                    tracker.add(t, message.values.get(tracker.channel))
+            if time.monotonic() - self.last_publish < self.publish_interval:
+                return
+            self.last_publish = time.monotonic()
+            values = {}
+            for tracker in self.trackers:
+                estimate = tracker.estimate()
+                self.estimates[tracker.name] = estimate
+                if estimate["STABLE"] and not tracker.stable:
+                    tracker.since = t
+                    self.raise_event(tracker, estimate, t)
+                tracker.stable = estimate["STABLE"]
+                for field in FIELDS:
+                    value = estimate[field]
+                    values[f"{tracker.name}_{field}"] = float(value) if value is not None else None
+        now = SESSION_CLOCK.now()
+        self.bus.publish(STABILITY_DEVICE, values, Stamp(now, now))
+
+    def raise_event(self, tracker, estimate, t):
+        event = {"time": t, "tracker": tracker.name, "value": tracker.points[-1][1],
+                 "drift": estimate["DRIFT"], "noise": estimate["NOISE"]}
+        self.events.append(event)
+        print(f"{time.strftime('%H:%M:%S')} {tracker.name} stable at {event['value']:.2f} °C "
+              f"(drift {event['drift']:+.3f} K/min, noise {event['noise']:.3f} K)")
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Stability callback failed: {e}")
+
+    def estimate(self, name):
+        with self.lock:
+            return self.estimates.get(name)
+
+    def stop(self):
+        self.bus.unsubscribe(self.subscription)
+
+def default_trackers(chiller="Chiller", arduino="Arduino", window=WINDOW, drift_limit=DRIFT_LIMIT,
+                     noise_limit=NOISE_LIMIT, tolerance=TOLERANCE):
+    """The bath against its setpoint, and the two thermocouples on the module."""
+    limits = dict(window=window, drift_limit=drift_limit, noise_limit=noise_limit, tolerance=tolerance)
+    return [
+        Tracker("BATH", chiller, "TEMP", target=(chiller, "TSET"), **limits),
+        Tracker("TC1", arduino, "TC1", **limits),
+        Tracker("TC2", arduino, "TC2", **limits),
+    ]
+
+def stand_trackers(stand):
+    """default_trackers for a StandConfig's chiller, Arduino and Stability limits."""
+    return default_trackers(stand.first("Chiller").name, stand.first("Arduino").name, **stand.stability)
+
+def stability_channels(trackers=None):
+    trackers = trackers if trackers is not None else default_trackers()
+    return [(STABILITY_DEVICE, f"{tracker.name}_{field}") for tracker in trackers for field in FIELDS]
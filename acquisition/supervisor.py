@@ -0,0 +1,209 @@
+import argparse
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
+
+from config import DEFAULT_CONFIG, load_config
+from daemon import STATUS_DEVICE
+from snapshot import DEFAULT_NAME, SnapshotReader
+
+# Processes are spawned, not forked, so workers do not inherit the
+# supervisor's (or the GUI's) threads and open ports
+_spawn = multiprocessing.get_context("spawn")
+
+STALE_AFTER = 20.0   # s without a status update before a worker counts as hung
+STARTUP_GRACE = 60.0 # s a (re)started worker has to connect and publish its first status
+MAX_BACKOFF = 60.0   # s between restarts of a worker that keeps failing
+
+def snapshot_name(stand):
+    """Shared memory name of a stand's snapshot."""
+    return f"{DEFAULT_NAME}_{stand}"
+
+def run_stand(config_path, stand_name, log, api_port, status_interval):
+    """Worker process: acquires one stand until SIGTERM."""
+    sys.path.append(str(acquisition_dir))
+    from daemon import AcquisitionDaemon
+
+    stop_evt = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_evt.set())
+    # Ctrl-C reaches the whole process group; let the supervisor decide
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stand = load_config(config_path).stand(stand_name)
+    daemon = AcquisitionDaemon(stand, shm_name=snapshot_name(stand_name), api_port=api_port, log=log,
+                               status_interval=status_interval, log_tag=stand_name)
+    daemon.start()
+    while not stop_evt.wait(1.0):
+        pass
+    daemon.stop()
+
+class StandView():
+    """Read-only view of a stand's snapshot, attaching once its worker has created it.
+
+    Both the watch thread and the GUI read it, and a restart closes it, so a
+    lock keeps the reader from being closed mid-read or attached twice.
+    """
+    def __init__(self, stand):
+        self.stand = stand
+        self.reader = None
+        self.lock = threading.Lock()
+
+    def snapshot(self):
+        with self.lock:
+            if self.reader is None:
+                try:
+                    self.reader = SnapshotReader(snapshot_name(self.stand))
+                except (FileNotFoundError, RuntimeError):
+                    return {}
+            try:
+                return self.reader.snapshot()
+            except TimeoutError:
+                return {}
+
+    def status(self, alive=None):
+        """State and Status channels; `alive` is whether the worker process runs, if known."""
+        status = self.snapshot().get(STATUS_DEVICE, {})
+        age = time.time() - max((t for t, _ in status.values()), default=float("nan"))
+        if alive is False:
+            state = "down"
+        elif not status:
+            state = "starting" if alive else "no data"
+        else:
+            state = "running" if age < STALE_AFTER else "stale"
+        return {"state": state, "age": age, **{channel: value for channel, (_, value) in status.items()}}
+
+    def close(self):
+        with self.lock:
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+
+class Worker():
+    def __init__(self, stand, args):
+        self.stand = stand
+        self.args = args
+        self.process = None
+        self.view = StandView(stand)
+        self.restarts = 0
+        self.next_start = 0.0
+        self.started = 0.0
+
+    def start(self):
+        # A restarted worker recreates its shared memory block
+        self.view.close()
+        self.process = _spawn.Process(target=run_stand, args=self.args, name=f"stand-{self.stand}", daemon=True)
+        self.process.start()
+        self.started = time.monotonic()
+
+    def hung(self, now):
+        """Whether the worker, past its startup, has not published a status for STALE_AFTER."""
+        return now - self.started > STARTUP_GRACE and self.view.status(True)["state"] != "running"
+
+    def kill(self, timeout=10):
+        self.process.terminate()
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+class Supervisor():
+    """Runs every stand's acquisition in a worker process of its own and watches them.
+
+    Stands share nothing but the host, so throughput scales with stands and
+    cores instead of contending for one GIL. Health comes from the Status
+    device each worker publishes into its snapshot; a worker that exits, or
+    hangs without publishing it for STALE_AFTER, is restarted with
+    exponential backoff.
+    """
+    def __init__(self, config_path=DEFAULT_CONFIG, stands=None, log=True, api_base=None, status_interval=5.0):
+        config = load_config(config_path)
+        names = stands or list(config.stands)
+        for name in names:
+            config.stand(name)
+        self.workers = {}
+        for i, name in enumerate(names):
+            api_port = None if api_base is None else api_base + i
+            self.workers[name] = Worker(name, (str(config_path), name, log, api_port, status_interval))
+        self.stop_evt = threading.Event()
+        self.thread = None
+
+    def start(self):
+        for worker in self.workers.values():
+            worker.start()
+        self.thread = threading.Thread(target=self.watch, name="supervisor", daemon=True)
+        self.thread.start()
+
+    def watch(self):
+        while not self.stop_evt.wait(1.0):
+            now = time.monotonic()
+            for worker in self.workers.values():
+                if worker.process.is_alive():
+                    if not worker.hung(now):
+                        continue
+                    print(f"Stand {worker.stand} published no status for {STALE_AFTER:.0f} s, terminating it")
+                    worker.kill()
+                if now < worker.next_start:
+                    continue
+                if worker.next_start == 0.0:
+                    backoff = min(MAX_BACKOFF, 2.0 ** worker.restarts)
+                    print(f"Stand {worker.stand} exited with code {worker.process.exitcode}, restarting in {backoff:.0f} s")
+                    worker.next_start = now + backoff
+                    continue
+                worker.restarts += 1
+                worker.next_start = 0.0
+                worker.start()
+
+    def status(self):
+        """{stand: {state, pid, restarts, age, and the Status channels}} of every worker."""
+        return {name: {"pid": worker.process.pid, "restarts": worker.restarts,
+                       **worker.view.status(worker.process.is_alive())}
+                for name, worker in self.workers.items()}
+
+    def stop(self):
+        self.stop_evt.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        for worker in self.workers.values():
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers.values():
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.view.close()
+
+def format_status(status):
+    lines = [f"{'stand':<12}{'state':<10}{'pid':>8}{'CPU %':>8}{'RSS MB':>9}{'polls':>9}{'errors':>8}{'dropped':>9}{'restarts':>10}"]
+    for name, s in status.items():
+        lines.append(f"{name:<12}{s['state']:<10}{s.get('pid') or '-':>8}{s.get('CPU', float('nan')):>8.1f}"
+                     f"{s.get('RSS_MB', float('nan')):>9.1f}{s.get('POLLS', 0):>9.0f}{s.get('ERRORS', 0):>8.0f}"
+                     f"{s.get('DROPPED', 0):>9.0f}{s.get('restarts', 0):>10}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Acquire several stands in parallel, one worker process each")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--stands", nargs="+", metavar="STAND", help="only these stands of the config")
+    parser.add_argument("--no-log", action="store_true", help="do not write the text logs and rollups")
+    parser.add_argument("--api-base", type=int, metavar="PORT", help="serve each stand's API on PORT, PORT+1, ...")
+    parser.add_argument("--report", type=float, default=60.0, metavar="SECONDS")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.config, args.stands, not args.no_log, args.api_base)
+    stop_evt = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_evt.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_evt.set())
+    supervisor.start()
+    while not stop_evt.wait(args.report):
+        print(format_status(supervisor.status()), flush=True)
+    print("Stopping stands")
+    supervisor.stop()
+
+if __name__ == "__main__":
+    main()
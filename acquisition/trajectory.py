@@ -0,0 +1,120 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+for driver in ("Common", "Chiller"):
+    sys.path.append(str(MAIN_DIR / "drivers" / driver))
+
+from chiller_driver import SAFE_TIME_INTERVAL
+from session_clock import SESSION_CLOCK, Stamp
+
+# Published on the bus while a ramp runs, e.g. Trajectory.FLOOR
+TRAJECTORY_DEVICE = "Trajectory"
+TRAJECTORY_CHANNELS = ("SETPOINT", "TARGET", "FLOOR", "LIMITED")
+
+DEW_MARGIN = 5.0        # K above the dew point; the interlock trips at 3
+TC_LEAD = 10.0          # K the setpoint may lead the coldest TC by
+RESOLUTION = 0.1        # K; smaller changes are not sent
+STALE_AFTER = 30.0      # s without a dew point before the ramp holds
+
+class SetpointScheduler():
+    """Ramps the chiller setpoint to a target as fast as the humidity allows.
+
+    On every chiller or Arduino reading the next setpoint is moved towards
+    the target by at most `rate` K/min (None for no limit) and then held at
+    or above the floor max(DEWPOINT + dew_margin, min(TC1, TC2) - tc_lead),
+    so the module never gets close to the dew point and the bath does not run
+    far ahead of it; a rising dew point raises it again. Without a recent dew
+    point the setpoint is not lowered.
+
+    `send(setpoint)` changes the setpoint, e.g. Chiller.set_work_temperature
+    or a poller's submit; it is called at most every `min_interval` s and
+    only for changes of at least RESOLUTION, with the driver keeping its own
+    250 ms command spacing.
+    """
+    def __init__(self, bus, send, target, rate=None, dew_margin=DEW_MARGIN, tc_lead=TC_LEAD,
+                 chiller="Chiller", arduino="Arduino", min_interval=1.0):
+        self.bus = bus
+        self.send = send
+        self.target = float(target)
+        self.rate = rate
+        self.dew_margin = dew_margin
+        self.tc_lead = tc_lead
+        self.chiller = chiller
+        self.arduino = arduino
+        self.min_interval = max(min_interval, SAFE_TIME_INTERVAL)
+        self.lock = threading.Lock()
+        self.setpoint = None
+        self.ideal = None
+        self.floor = None
+        self.dewpoint_at = None
+        self.last_update = None
+        self.last_send = 0.0
+        self.pending = None
+        self.done = threading.Event()
+        self.subscription = None
+
+    def start(self):
+        self.subscription = self.bus.attach(f"trajectory-{self.chiller}", self.update,
+                                            devices=[self.chiller, self.arduino])
+        return self
+
+    def stop(self):
+        if self.subscription is not None:
+            self.bus.unsubscribe(self.subscription)
+            self.subscription = None
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def update(self, message):
+        now = time.monotonic()
+        values = message.values
+        with self.lock:
+            if message.device == self.arduino:
+                tcs = [values.get(key) for key in ("TC1", "TC2") if values.get(key) is not None]
+                dewpoint = values.get("DEWPOINT")
+                if dewpoint is not None:
+                    self.dewpoint_at = now
+                    floor = dewpoint + self.dew_margin
+                    if tcs:
+                        floor = max(floor, min(tcs) - self.tc_lead)
+                    self.floor = floor
+            elif self.setpoint is None and values.get("TSET") is not None:
+                # Ramp from wherever the chiller is set now
+                self.setpoint = self.ideal = values["TSET"]
+                self.last_update = now
+            if self.setpoint is None:
+                return
+            # The ideal setpoint moves every update; the chiller follows it in
+            # RESOLUTION steps
+            self.ideal, limited = self.next_setpoint(now)
+            self.last_update = now
+            change = abs(self.ideal - self.setpoint) >= RESOLUTION or self.ideal == self.target != self.setpoint
+            ready = now - self.last_send >= self.min_interval and (self.pending is None or self.pending.done())
+            if change and ready:
+                self.last_send = now
+                self.setpoint = self.ideal
+                result = self.send(round(self.setpoint, 2))
+                # A poller's submit returns a Future; wait for it before sending again
+                self.pending = result if hasattr(result, "done") else None
+            if self.setpoint == self.target:
+                self.done.set()
+            reading = {"SETPOINT": self.setpoint, "TARGET": self.target, "FLOOR": self.floor, "LIMITED": int(limited)}
+        stamp = SESSION_CLOCK.now()
+        self.bus.publish(TRAJECTORY_DEVICE, reading, Stamp(stamp, stamp))
+
+    def next_setpoint(self, now):
+        """(setpoint, whether the floor or a stale dew point held it back)."""
+        setpoint = self.target
+        if self.rate is not None:
+            step = self.rate / 60 * (now - self.last_update)
+            setpoint = min(max(self.target, self.ideal - step), self.ideal + step)
+        if self.floor is None or self.dewpoint_at is None or now - self.dewpoint_at > STALE_AFTER:
+            return max(setpoint, self.ideal), setpoint < self.ideal
+        if setpoint < self.floor:
+            # Also raises the setpoint if the dew point climbs
+            return self.floor, True
+        return setpoint, False
@@ -1,6 +1,16 @@
 import serial
 import time
 import numpy as np
+import sys
+import threading
+from pathlib import Path
+
+common_dir = Path(__file__).parent.parent / "Common"
+sys.path.append(str(common_dir))
+
+from command_stats import driver_stats
+from line_reader import LineReader
+from serial_trace import open_port
 
 class Arduino:
     def __init__(self, port, baudrate, timeout):
@@ -8,6 +18,9 @@ class Arduino:
         self.baud = baudrate
         self.timeout = timeout
         self.ser = None
+        self.reader = None
+        self.lock = threading.RLock()
+        self.stats = driver_stats(f"Arduino {port}")
 
         self.ambtemp = None
         self.rH = None
@@ -32,7 +45,8 @@ class Arduino:
         self.is_connected = False
 
     def connect(self):
-        self.ser = serial.Serial(self.port, self.baud, timeout=self.timeout)
+        self.ser = open_port(self.port, baudrate=self.baud, timeout=self.timeout)
+        self.reader = LineReader(self.ser, terminator=b'\n')
         return self.ser.is_open
     
     def close(self):
@@ -51,10 +65,10 @@ class Arduino:
     
     def send(self, cmd):
         if self.ser and self.ser.is_open:
-            self.ser.reset_input_buffer()
-            self.ser.write((cmd + "\n").encode())
-            self.ser.flush()
-            line = self.ser.readline().decode().strip()
+            with self.lock, self.stats.measure(cmd, self.reader):
+                self.reader.reset()
+                self.reader.write((cmd + "\n").encode())
+                line = self.reader.read_line('utf-8').strip()
             return line
         else:
             raise RuntimeError("Serial not open, call connect() first")
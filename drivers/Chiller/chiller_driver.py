@@ -11,7 +11,17 @@ __copyright__ = "2018 Joonas Konki"
 
 import logging
 import serial
+import sys
+import threading
 import time
+from pathlib import Path
+
+common_dir = Path(__file__).parent.parent / "Common"
+sys.path.append(str(common_dir))
+
+from command_stats import driver_stats
+from line_reader import LineReader
+from serial_trace import open_port
 
 # Set the minimum safe time interval between sent commands that is required according to the user manual
 SAFE_TIME_INTERVAL = 0.25
@@ -19,22 +29,28 @@ SAFE_TIME_INTERVAL = 0.25
 END_CHAR = '\x0D'
 
 class Chiller():
-	def __init__(self,port,baud):
+	def __init__(self,port,baud,timeout=1):
 		self.port = port
-		self.ser = serial.Serial( port=self.port,
+		# Serializes commands (and their spacing) from the poller and the interlock thread
+		self.lock = threading.RLock()
+		self.ser = open_port( self.port,
 					  bytesize=serial.SEVENBITS,
 					  parity=serial.PARITY_EVEN,
 					  stopbits=serial.STOPBITS_ONE,
 					  baudrate=baud,
 					  xonxoff=False,
 					  rtscts=True,
-					  timeout=1 )
+					  timeout=timeout )
+		self.reader = LineReader(self.ser, terminator=bytes(END_CHAR, 'ascii'))
+		# A replayed port skips the unit's command spacing
+		self.sleep = getattr(self.ser, 'sleep', time.sleep)
+		self.stats = driver_stats('Chiller ' + port)
 
 		logging.basicConfig(format='julabolib: %(asctime)s - %(message)s', datefmt='%y-%m-%d %H:%M:%S', level=logging.WARNING)
 		#logging.basicConfig(format='julabolib: %(asctime)s - %(message)s', datefmt='%y-%m-%d %H:%M:%S', level=logging.DEBUG)
 		logging.debug('Serial port ' + self.port + ' opened at speed ' + str(baud))
 
-		time.sleep(0.1) # Wait 100 ms after opening the port before sending commands
+		self.sleep(0.1) # Wait 100 ms after opening the port before sending commands
 		self.ser.flushOutput() # Flush the output buffer of the serial port before sending any new commands
 		self.ser.flushInput() # Flush the input buffer of the serial port before sending any new commands
 
@@ -50,18 +66,21 @@ class Chiller():
 
 		"""
 		if command == '': return ''
-		time.sleep(SAFE_TIME_INTERVAL)
-		self.ser.write( bytes( command+END_CHAR , 'ascii') )
-		time.sleep(0.1)
-		logging.debug('Command sent to the unit: ' + command)
-		response = self.ser.readline()
-		logging.debug('Response from unit: ' + response.decode('ascii'))
-		return response.decode('ascii') # return response from the unit
+		# Counted by name, e.g. "out_sp_00" for "out_sp_00 20.00"
+		with self.lock, self.stats.measure(command.split(' ')[0], self.reader):
+			self.sleep(SAFE_TIME_INTERVAL)
+			self.reader.reset() # Drop the LF left over from the previous CR LF reply
+			self.reader.write( bytes( command+END_CHAR , 'ascii') )
+			self.sleep(0.1)
+			logging.debug('Command sent to the unit: ' + command)
+			response = self.reader.read_line()
+		logging.debug('Response from unit: ' + response)
+		return response # return response from the unit
 
 	def flush_input_buffer(self):
 		""" Flush the input buffer of the serial port.
 		"""
-		self.ser.flushInput()
+		self.reader.reset()
 
 	def set_power_on(self):
 		""" The function turns the power ON.
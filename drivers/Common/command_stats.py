@@ -0,0 +1,198 @@
+import os
+import threading
+import time
+from array import array
+from contextlib import nullcontext
+
+# Off unless enabled here, with enable() or by ETL_COMMAND_STATS=1
+ENABLED = os.environ.get("ETL_COMMAND_STATS", "") not in ("", "0")
+
+# Histogram buckets: exact below 64 us, then 32 per power of two (about 3 %
+# resolution) up to MAX_US, in a fixed array of counts
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+MAX_US = 1 << 27   # about 134 s
+N_BUCKETS = (MAX_US.bit_length() - SUB_BITS) * SUB_COUNT + SUB_COUNT
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+def _bucket(us):
+    shift = max(0, us.bit_length() - SUB_BITS - 1)
+    return (shift << SUB_BITS) + (us >> shift)
+
+def _lowest(index):
+    shift = max(0, (index >> SUB_BITS) - 1)
+    return (index - (shift << SUB_BITS)) << shift
+
+class LatencyHistogram():
+    """HDR-style latency histogram in microseconds with fixed memory."""
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * N_BUCKETS))
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def record(self, us):
+        us = min(max(int(us), 0), MAX_US - 1)
+        self.counts[_bucket(us)] += 1
+        self.count += 1
+        self.total_us += us
+        if self.min_us is None or us < self.min_us:
+            self.min_us = us
+        if us > self.max_us:
+            self.max_us = us
+
+    def percentile(self, q):
+        """The q-th percentile (0-100) in microseconds, None when empty."""
+        if self.count == 0:
+            return None
+        rank = max(1, int(round(q / 100 * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                # The middle of the bucket, within the recorded range
+                mid = (_lowest(index) + _lowest(index + 1)) / 2
+                return min(max(mid, self.min_us), self.max_us)
+        return self.max_us
+
+    def summary(self):
+        """Count and min/mean/p50/p90/p99/max in milliseconds."""
+        ms = lambda us: None if us is None else us / 1000
+        return {
+            "count": self.count,
+            "min_ms": ms(self.min_us),
+            "mean_ms": ms(self.total_us / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max_us) if self.count else None,
+        }
+
+class CommandStats():
+    """Round trip histogram, time spent, timeouts, errors and bytes of one command."""
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.busy_ns = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+    def summary(self):
+        summary = self.latency.summary()
+        summary.update({
+            "busy_s": self.busy_ns / 1e9,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+        })
+        return summary
+
+class _Measurement():
+    __slots__ = ("stats", "command", "reader", "start")
+
+    def __init__(self, stats, command, reader):
+        self.stats = stats
+        self.command = command
+        self.reader = reader
+
+    def __enter__(self):
+        self.start = time.monotonic_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.record(self.command, self.reader, self.start, time.monotonic_ns(), exc_type is not None)
+        return False
+
+class DriverStats():
+    """Per-command statistics of one driver, see driver_stats().
+
+    Drivers wrap each exchange in measure(), which does nothing while
+    recording is disabled. The latency is the reader's write-to-reply time;
+    busy_s is the time a command held the port, including its spacing
+    sleeps. Drivers enter measure() after taking their lock, so time spent
+    waiting for another thread's command is not counted against this one.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.commands = {}
+
+    def measure(self, command, reader):
+        if not ENABLED:
+            return nullcontext()
+        return _Measurement(self, command, reader)
+
+    def record(self, command, reader, start, end, failed=False):
+        with self.lock:
+            stats = self.commands.get(command)
+            if stats is None:
+                stats = self.commands[command] = CommandStats()
+            stats.busy_ns += end - start
+            # The reader's counters are from an earlier command if this one failed before writing
+            wrote = reader is not None and reader.t_request is not None and reader.t_request >= start
+            if wrote:
+                stats.bytes_out += reader.bytes_out
+            if failed or not wrote:
+                stats.errors += 1
+                return
+            stats.bytes_in += reader.bytes_in
+            if reader.timed_out:
+                stats.timeouts += 1
+            elif reader.t_request is not None and reader.t_reply is not None:
+                stats.latency.record((reader.t_reply - reader.t_request) // 1000)
+
+    def summary(self):
+        with self.lock:
+            return {command: stats.summary() for command, stats in self.commands.items()}
+
+    def reset(self):
+        with self.lock:
+            self.commands = {}
+
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+def driver_stats(name):
+    """The DriverStats named e.g. "HV /dev/hv_supply", kept across reconnects."""
+    with _registry_lock:
+        stats = REGISTRY.get(name)
+        if stats is None:
+            stats = REGISTRY[name] = DriverStats(name)
+        return stats
+
+def snapshot():
+    """{driver name: {command: summary}} of every driver that has recorded something."""
+    with _registry_lock:
+        drivers = list(REGISTRY.values())
+    result = {}
+    for driver in drivers:
+        summary = driver.summary()
+        if summary:
+            result[driver.name] = summary
+    return result
+
+def reset():
+    with _registry_lock:
+        drivers = list(REGISTRY.values())
+    for driver in drivers:
+        driver.reset()
+
+def format_table(stats=None):
+    """The snapshot as a plain text table, slowest total time first."""
+    stats = snapshot() if stats is None else stats
+    rows = [(driver, command, s) for driver, commands in stats.items() for command, s in commands.items()]
+    rows.sort(key=lambda row: -row[2]["busy_s"])
+    fmt = lambda v: "-" if v is None else f"{v:.1f}"
+    lines = [f"{'driver':<24}{'command':<20}{'count':>7}{'p50 ms':>8}{'p99 ms':>8}{'max ms':>8}"
+             f"{'busy s':>8}{'t/o':>5}{'err':>5}{'out B':>9}{'in B':>9}"]
+    for driver, command, s in rows:
+        lines.append(f"{driver:<24}{command:<20}{s['count']:>7}{fmt(s['p50_ms']):>8}{fmt(s['p99_ms']):>8}"
+                     f"{fmt(s['max_ms']):>8}{s['busy_s']:>8.1f}{s['timeouts']:>5}{s['errors']:>5}"
+                     f"{s['bytes_out']:>9}{s['bytes_in']:>9}")
+    return "\n".join(lines)
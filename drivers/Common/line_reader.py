@@ -0,0 +1,98 @@
+import time
+
+class LineReader():
+    """Splits replies from a serial port into frames on a fixed terminator.
+
+    Serial.readline() pulls one byte per call until it sees a newline. Here
+    everything waiting on the port is read in one go into a reusable buffer and
+    frames are cut out of it incrementally. Frames are handed out as memoryview
+    slices of that buffer, so they are only valid until the next read.
+
+    `t_request` and `t_reply` hold time.monotonic_ns() stamps of the last
+    write() and of the last completed frame. `bytes_out`, `bytes_in` and
+    `timed_out` describe the exchange since the last write().
+    """
+    def __init__(self, ser, terminator=b'\n', size=256):
+        self.ser = ser
+        self.terminator = terminator
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # first unconsumed byte
+        self._end = 0    # end of valid data
+        self._scan = 0   # where the next terminator search resumes
+        self.t_request = None
+        self.t_reply = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.timed_out = False
+
+    def reset(self):
+        """Drops buffered bytes here and in the port's input buffer."""
+        self._start = self._end = self._scan = 0
+        self.ser.reset_input_buffer()
+
+    def write(self, data):
+        """Writes a request to the port and stamps the time it went out."""
+        self.t_request = time.monotonic_ns()
+        self.bytes_out = len(data)
+        self.bytes_in = 0
+        self.timed_out = False
+        self.ser.write(data)
+        self.ser.flush()
+
+    def read_frame(self):
+        """Returns the next frame without its terminator as a memoryview.
+
+        Like readline(), whatever arrived before the port timeout is returned
+        if the terminator never shows up (an empty view if nothing did).
+        """
+        term = self.terminator
+        while True:
+            idx = self._buf.find(term, self._scan, self._end)
+            if idx >= 0:
+                frame = self._view[self._start:idx]
+                self.bytes_in += idx + len(term) - self._start
+                self._start = self._scan = idx + len(term)
+                if self._start == self._end:
+                    self._start = self._end = self._scan = 0
+                self.t_reply = time.monotonic_ns()
+                return frame
+            # A multi-byte terminator may straddle the next chunk
+            self._scan = max(self._start, self._end - len(term) + 1)
+            if not self._fill():
+                frame = self._view[self._start:self._end]
+                self.bytes_in += self._end - self._start
+                self.timed_out = True
+                self._start = self._end = self._scan = 0
+                self.t_reply = time.monotonic_ns()
+                return frame
+
+    def read_line(self, encoding='ascii'):
+        """Returns the next frame decoded to a string."""
+        return str(self.read_frame(), encoding)
+
+    def _fill(self):
+        # Block for the first byte, then take everything that is already waiting
+        want = self.ser.in_waiting or 1
+        if self._end + want > len(self._buf):
+            self._make_room(want)
+        data = self.ser.read(want)
+        if not data:
+            return False
+        n = len(data)
+        self._view[self._end:self._end + n] = data
+        self._end += n
+        return True
+
+    def _make_room(self, want):
+        pending = self._end - self._start
+        if pending + want > len(self._buf):
+            buf = bytearray(max(2 * len(self._buf), pending + want))
+            buf[:pending] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        else:
+            self._view[:pending] = self._view[self._start:self._end]
+        self._scan -= self._start
+        self._start = 0
+        self._end = pending
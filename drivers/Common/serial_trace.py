@@ -0,0 +1,245 @@
+"""Records serial traffic to compact binary traces and replays them to the drivers.
+
+Drivers open their ports with open_port(). With recording enabled (start_recording()
+or ETL_SERIAL_TRACE=<dir>) every write and every read of a real port is
+appended to <dir>/<port>_<time>.etltrace. A port named "replay://<trace>"
+(optionally "?speed=1" for real time) is a ReplaySerial that plays a trace
+back, so the unchanged drivers and pollers parse a night's traffic offline.
+
+A trace is the magic b"ETLTRACE", a u32 length and a JSON header (port,
+serial settings, wall and monotonic start times in ns), then one record per
+event: kind (b"W" written, b"R" read; an empty read is a timeout), u64 ns
+since the start, u32 length, and the bytes.
+"""
+import json
+import os
+import re
+import struct
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import serial
+
+MAGIC = b"ETLTRACE"
+SUFFIX = ".etltrace"
+REPLAY_PREFIX = "replay://"
+_RECORD = struct.Struct("<cQI")
+WRITE, READ = b"W", b"R"
+
+RECORD_DIR = os.environ.get("ETL_SERIAL_TRACE") or None
+
+def start_recording(directory):
+    """Records every port opened from now on to a trace in `directory`."""
+    global RECORD_DIR
+    RECORD_DIR = str(directory)
+
+def stop_recording():
+    global RECORD_DIR
+    RECORD_DIR = None
+
+def open_port(port, **settings):
+    """serial.Serial(port, **settings), recorded if enabled, or a replay of a trace."""
+    if port.startswith(REPLAY_PREFIX):
+        path, _, query = port[len(REPLAY_PREFIX):].partition("?")
+        speed = float(parse_qs(query).get("speed", ["0"])[0])
+        return ReplaySerial(path, speed)
+    ser = serial.Serial(port, **settings)
+    if RECORD_DIR is None:
+        return ser
+    name = re.sub(r"[^\w.-]+", "_", port.strip("/"))
+    path = Path(RECORD_DIR) / f"{name}_{time.strftime('%Y%m%d-%H%M%S')}{SUFFIX}"
+    return RecordingSerial(ser, TraceWriter(path, {"port": port, "settings": settings}))
+
+class TraceWriter():
+    def __init__(self, path, header, flush_every=256):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic_ns()
+        header = dict(header, wall_ns=time.time_ns(), monotonic_ns=self.t0)
+        data = json.dumps(header).encode()
+        self.f = open(path, "wb")
+        self.f.write(MAGIC + struct.pack("<I", len(data)) + data)
+        self.flush_every = flush_every
+        self.pending = 0
+
+    def add(self, kind, data, t_ns=None):
+        t_ns = time.monotonic_ns() if t_ns is None else t_ns
+        with self.lock:
+            if self.f is None:
+                return
+            self.f.write(_RECORD.pack(kind, t_ns - self.t0, len(data)))
+            self.f.write(data)
+            self.pending += 1
+            # Keep the file useful if the process dies overnight
+            if self.pending >= self.flush_every:
+                self.f.flush()
+                self.pending = 0
+
+    def close(self):
+        with self.lock:
+            if self.f is not None:
+                self.f.close()
+                self.f = None
+
+def read_trace(path):
+    """(header, [(kind, t_ns since start, bytes), ...]) of a trace file."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a serial trace")
+    offset = len(MAGIC)
+    (n,) = struct.unpack_from("<I", raw, offset)
+    offset += 4
+    header = json.loads(raw[offset:offset + n])
+    offset += n
+    events = []
+    while offset + _RECORD.size <= len(raw):
+        kind, t_ns, length = _RECORD.unpack_from(raw, offset)
+        offset += _RECORD.size
+        if offset + length > len(raw):
+            break   # cut off mid-record when the recorder died
+        events.append((kind, t_ns, raw[offset:offset + length]))
+        offset += length
+    return header, events
+
+class RecordingSerial():
+    """Wraps an open serial.Serial and appends its traffic to a TraceWriter."""
+    def __init__(self, ser, writer):
+        self.ser = ser
+        self.writer = writer
+
+    def write(self, data):
+        self.writer.add(WRITE, bytes(data))
+        return self.ser.write(data)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        self.writer.add(READ, data)
+        return data
+
+    def close(self):
+        self.ser.close()
+        self.writer.close()
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+class ReplayFinished(serial.SerialException):
+    pass
+
+class ReplaySerial():
+    """Plays a trace back through the subset of serial.Serial the drivers use.
+
+    Each write() moves on to the next recorded write (counting `mismatches`
+    if the bytes differ); reads then return the recorded chunks that followed
+    it, an empty read where the port timed out. With `speed` > 0 events are
+    paced at that multiple of real time, otherwise they are returned as fast
+    as possible. `t_request` and `t_reply` give the recorded monotonic times
+    of the last write and read, and `wall_ns(t)` maps them to wall time;
+    clock() stands in for time.monotonic() of the recorded process.
+    """
+    def __init__(self, path, speed=0.0):
+        self.path = path
+        self.header, self.events = read_trace(path)
+        self.port = self.header.get("port", path)
+        self.speed = speed
+        self.i = 0
+        self.chunk = b""
+        self.mismatches = 0
+        self.is_open = True
+        self.t_request = None
+        self.t_reply = None
+        self.start = time.monotonic()
+
+    def wall_ns(self, t_ns):
+        return self.header["wall_ns"] + (t_ns - self.header["monotonic_ns"])
+
+    def _pace(self, t_ns):
+        if self.speed > 0:
+            delay = self.start + t_ns / 1e9 / self.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def skip(self):
+        """Moves past the next recorded exchange without replaying it."""
+        self.write(b"")
+        self.mismatches -= 1
+
+    def write(self, data):
+        # Skip whatever the recorded driver read that this one did not
+        while self.i < len(self.events) and self.events[self.i][0] != WRITE:
+            self.i += 1
+        self.chunk = b""
+        if self.i >= len(self.events):
+            raise ReplayFinished(f"End of trace {self.path}")
+        _, t_ns, recorded = self.events[self.i]
+        self.i += 1
+        self._pace(t_ns)
+        if bytes(data) != recorded:
+            self.mismatches += 1
+        self.t_request = self.header["monotonic_ns"] + t_ns
+        return len(data)
+
+    def _next_chunk(self):
+        if not self.chunk and self.i < len(self.events) and self.events[self.i][0] == READ:
+            _, t_ns, self.chunk = self.events[self.i]
+            self.i += 1
+            self._pace(t_ns)
+            self.t_reply = self.header["monotonic_ns"] + t_ns
+            return True
+        return bool(self.chunk)
+
+    @property
+    def in_waiting(self):
+        if not self.chunk and self.i < len(self.events) and self.events[self.i][0] == READ:
+            return len(self.events[self.i][2])
+        return len(self.chunk)
+
+    def read(self, size=1):
+        self._next_chunk()
+        data, self.chunk = self.chunk[:size], self.chunk[size:]
+        return data
+
+    def clock(self):
+        """Recorded monotonic time in seconds of the next event, the replay's "now"."""
+        i = min(self.i, len(self.events) - 1)
+        t_ns = self.events[i][1] if i >= 0 else 0
+        return (self.header["monotonic_ns"] + t_ns) / 1e9
+
+    def sleep(self, seconds):
+        """Command spacing of the real device; pacing comes from the trace instead."""
+        pass
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        pass
+
+    def flushInput(self):
+        pass
+
+    def flushOutput(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+def summarize(path):
+    """Event counts, bytes, duration and exchange count of a trace."""
+    header, events = read_trace(path)
+    writes = [e for e in events if e[0] == WRITE]
+    reads = [e for e in events if e[0] == READ]
+    return {
+        "port": header.get("port"),
+        "start": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(header["wall_ns"] / 1e9)),
+        "duration_s": events[-1][1] / 1e9 if events else 0.0,
+        "writes": len(writes),
+        "reads": len(reads),
+        "timeouts": sum(1 for e in reads if not e[2]),
+        "bytes_out": sum(len(e[2]) for e in writes),
+        "bytes_in": sum(len(e[2]) for e in reads),
+    }
@@ -0,0 +1,62 @@
+import time
+
+class SessionClock():
+    """Maps time.monotonic_ns() stamps to wall time from one anchor per session.
+
+    Readings are stamped with the monotonic clock, which never jumps, and only
+    converted to wall time for logs and storage. Taking the anchor once keeps
+    every device's stamps on the same time base even if NTP steps the system
+    clock mid-session.
+    """
+    def __init__(self):
+        before = time.monotonic_ns()
+        wall = time.time_ns()
+        after = time.monotonic_ns()
+        self.mono_anchor = (before + after) // 2
+        self.wall_anchor = wall
+
+    def now(self):
+        return time.monotonic_ns()
+
+    def to_wall_ns(self, mono_ns):
+        return self.wall_anchor + (mono_ns - self.mono_anchor)
+
+    def from_wall_ns(self, wall_ns):
+        """Maps a wall time, e.g. from another process, onto this session's monotonic clock."""
+        return self.mono_anchor + (wall_ns - self.wall_anchor)
+
+    def to_wall(self, mono_ns):
+        """Returns the wall time of a monotonic stamp in epoch seconds."""
+        return self.to_wall_ns(mono_ns) / 1e9
+
+    def format(self, mono_ns):
+        """Formats a stamp like the logs do, with microseconds appended."""
+        wall_ns = self.to_wall_ns(mono_ns)
+        seconds, ns = divmod(wall_ns, 1_000_000_000)
+        return time.strftime("%Y-%m-%d-%H-%M-%S", time.localtime(seconds)) + f".{ns // 1000:06d}"
+
+class Stamp():
+    """Monotonic ns stamps of when a reading was requested and when it arrived."""
+    __slots__ = ('t_request', 't_reply')
+
+    def __init__(self, t_request, t_reply):
+        self.t_request = t_request
+        self.t_reply = t_reply
+
+    @property
+    def midpoint(self):
+        return (self.t_request + self.t_reply) // 2
+
+    @property
+    def latency(self):
+        return self.t_reply - self.t_request
+
+    def monotonic(self):
+        """Midpoint in time.monotonic() seconds, the time base of TimeSeriesStore."""
+        return self.midpoint / 1e9
+
+    def __repr__(self):
+        return f"Stamp(t_request={self.t_request}, t_reply={self.t_reply})"
+
+# Shared by every driver and logger in the process
+SESSION_CLOCK = SessionClock()
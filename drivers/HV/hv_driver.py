@@ -4,22 +4,65 @@ import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
 import os
+import re
+import sys
+import threading
+
+common_dir = Path(__file__).parent.parent / "Common"
+sys.path.append(str(common_dir))
+
+from command_stats import driver_stats
+from line_reader import LineReader
+from serial_trace import open_port
 #from etlup.module.ModuleIV import ModuleIVV0
 #from etlup import prod_session
 
+# Replies look like "#BD:00,CMD:OK,VAL:1.50". Errors come back as CMD:ERR or as
+# <field>:ERR when a channel, parameter, value or local/remote check fails.
+_REPLY_RE = re.compile(r'[#$]?BD:(\d+),(?:CMD:OK(?:,VAL:(.*))?|(CMD|CH|PAR|VAL|LOC):ERR)')
+_INT_PARAMS = frozenset(('STAT',))
+_STR_PARAMS = frozenset(('POL', 'PDWN', 'IMRANGE', 'BDNAME', 'BDFREL', 'BDSNUM'))
+
+# Seconds a channel of an IV scan may take to reach each step's VSET
+RAMP_TIMEOUT = 120.0
+
+class CAENReply():
+    """A parsed CAEN reply: board address, OK/ERR flag and typed value.
+
+    ``val`` is an int for STAT, a string for text parameters such as POL and a
+    float otherwise (None when the reply carries no value). ``error`` names the
+    field the unit rejected, or 'NOREPLY' if the reply could not be parsed.
+    """
+    __slots__ = ('bd', 'ok', 'val', 'error')
+
+    def __init__(self, bd, ok, val=None, error=None):
+        self.bd = bd
+        self.ok = ok
+        self.val = val
+        self.error = error
+
+    def __repr__(self):
+        if self.ok:
+            return f"CAENReply(bd={self.bd}, OK, val={self.val!r})"
+        return f"CAENReply(bd={self.bd}, ERR, error={self.error})"
+
 class HVPowerSupply():
-    def __init__(self, port, baud=9600, bd_addr=0, channel=0):
+    def __init__(self, port, baud=9600, bd_addr=0, channel=0, timeout=1, vtol=.5):
         self.port = port
         self.baud = baud
         self.bd_addr = bd_addr
         self.channel = channel
-        self.vtol = .5
-        self.ser = serial.Serial(self.port, 
-                                self.baud,
+        self.vtol = vtol
+        # Serializes commands from the poller and the interlock thread
+        self.lock = threading.RLock()
+        self.ser = open_port(self.port,
+                                baudrate=self.baud,
                                 parity=serial.PARITY_NONE,
                                 stopbits=serial.STOPBITS_ONE,
                                 bytesize=serial.EIGHTBITS,
-                                timeout=1)
+                                timeout=timeout)
+        self.reader = LineReader(self.ser, terminator=b'\r\n')
+        self.stats = driver_stats(f"HV {port}")
         self.flush_input_buffer()
 
     def close(self):
@@ -31,99 +74,108 @@ class HVPowerSupply():
         if value is not None:
             cmd += f",VAL:{value}"
         cmd += "\r\n"
-        self.ser.reset_input_buffer()
-        self.ser.write(bytes(cmd, 'ascii'))
-        self.ser.flush()
-        response = self.ser.readline()
-
-        return response.decode('ascii')
-    
-    def parse_response(self, response):
-        # Example response: $BD:*,CMD:OK,VAL:*
-        parts = response.strip().split(',')
-        resp_dict = {}
-        for part in parts:
-            key, value = part.split(':')
-            resp_dict[key] = value
-        return resp_dict
+        with self.lock, self.stats.measure(f"{type} {parameter}", self.reader):
+            self.reader.reset()
+            self.reader.write(bytes(cmd, 'ascii'))
+            return self.reader.read_line()
+    
+    def parse_response(self, response, parameter=None):
+        # Example response: #BD:00,CMD:OK,VAL:0001.5
+        m = _REPLY_RE.fullmatch(response.strip())
+        if m is None:
+            return CAENReply(None, False, error='NOREPLY')
+        bd, val, err = m.groups()
+        if err is not None:
+            return CAENReply(int(bd), False, error=err)
+        if val is not None and parameter not in _STR_PARAMS:
+            try:
+                val = int(val) if parameter in _INT_PARAMS else float(val)
+            except ValueError:
+                pass
+        return CAENReply(int(bd), True, val)
     
     def flush_input_buffer(self):
-        self.ser.flushInput()
+        self.reader.reset()
 
     def set_voltage(self, voltage):
         response = self.send_command('SET', self.channel, "VSET", voltage)
-        return self.parse_response(response)
+        return self.parse_response(response, "VSET")
     
     def set_current_limit(self, current):
         response = self.send_command('SET', self.channel, "ISET", current)
-        return self.parse_response(response)
+        return self.parse_response(response, "ISET")
     
     def set_channel_on(self):
         response = self.send_command('SET', self.channel, "ON")
-        return self.parse_response(response)
+        return self.parse_response(response, "ON")
     
     def set_channel_off(self):
         response = self.send_command('SET', self.channel, "OFF")
-        return self.parse_response(response)
+        return self.parse_response(response, "OFF")
     
     def read_vset(self):
         response = self.send_command('MON', self.channel, "VSET")
-        return self.parse_response(response)
+        return self.parse_response(response, "VSET")
     
     def read_vmon(self):
         response = self.send_command('MON', self.channel, "VMON")
-        return self.parse_response(response)
+        return self.parse_response(response, "VMON")
         
     def read_iset(self):
         response = self.send_command('MON', self.channel, "ISET")
-        return self.parse_response(response)
+        return self.parse_response(response, "ISET")
     
     def read_imon(self):
         response = self.send_command('MON', self.channel, "IMON")
-        return self.parse_response(response)
+        return self.parse_response(response, "IMON")
     
     def set_ramp_up(self, ramp_up):
         response = self.send_command('SET', self.channel, "RUP", ramp_up)
-        return self.parse_response(response)
+        return self.parse_response(response, "RUP")
     
     def set_ramp_down(self, ramp_down):
         response = self.send_command('SET', self.channel, "RDW", ramp_down)
-        return self.parse_response(response)
+        return self.parse_response(response, "RDW")
     
     def read_ramp_up(self):
         response = self.send_command('MON', self.channel, "RUP")
-        return self.parse_response(response)
+        return self.parse_response(response, "RUP")
     
     def read_ramp_down(self):
         response = self.send_command('MON', self.channel, "RDW")
-        return self.parse_response(response)
+        return self.parse_response(response, "RDW")
     
     def read_status(self):
         response = self.send_command('MON', self.channel, "STAT")
-        return self.parse_response(response)
+        return self.parse_response(response, "STAT")
     
     def read_polarity(self):
         response = self.send_command('MON', self.channel, "POL")
-        return self.parse_response(response)
+        return self.parse_response(response, "POL")
     
+    def is_tripped(self):
+        # STAT bit 3: OVC, bit 7: tripped
+        status = self.read_status().val
+        return status is not None and bool(status & (128 | 8))
+
     def wait_ramp(self, delay):
         while True:
-            if abs(float(self.read_vmon()['VAL'])-float(self.read_vset()['VAL']))<= self.vtol:
+            # A failed reply has no value; read again rather than compare it
+            vmon = self.extract_float_value(self.read_vmon())
+            vset = self.extract_float_value(self.read_vset())
+            if vmon is not None and vset is not None and abs(vmon - vset) <= self.vtol:
                 break
-            if int(self.read_status()['VAL']) & 128 or int(self.read_status()['VAL']) & 8:
+            if self.is_tripped():
                 raise ValueError("Compliance reached, supply tripped")
             time.sleep(.1)
         time.sleep(delay)
-        if int(self.read_status()['VAL']) & 128 or int(self.read_status()['VAL']) & 8:
+        if self.is_tripped():
                 raise ValueError("Compliance reached, supply tripped")
     
     
-    def extract_float_value(self, response_dict):
-        if 'VAL' in response_dict:
-            try:
-                return float(response_dict['VAL'])
-            except ValueError:
-                return None
+    def extract_float_value(self, reply):
+        if reply.ok and isinstance(reply.val, float):
+            return reply.val
         return None
     
     def IV_curve(self, start_v, stop_v, step_v, curr_limit, leave_on, delay):
@@ -131,7 +183,7 @@ class HVPowerSupply():
         voltages = []
         currents = []
         kfactors = []
-        if self.read_polarity()['VAL'] == '-':
+        if self.read_polarity().val == '-':
             pol = -1
         else:
             pol = 1
@@ -176,60 +228,171 @@ class HVPowerSupply():
             self.set_channel_off()
         return voltages, currents, kfactors
     
-    def plot_IV_curve(self, start_v, stop_v, step_v, curr_limit, moduleid, leave_on=False, delay=10):
+    def read_channel(self, channel, parameter):
+        response = self.send_command('MON', channel, parameter)
+        return self.parse_response(response, parameter)
+
+    def set_channel(self, channel, parameter, value=None):
+        response = self.send_command('SET', channel, parameter, value)
+        return self.parse_response(response, parameter)
+
+    def IV_curves(self, channels, start_v, stop_v, step_v, curr_limit, leave_on, delay, ramp_timeout=RAMP_TIMEOUT):
+        """Scans several channels of the board in lockstep.
+
+        Every step sets all channels, then polls them in turn (the board shares
+        one serial line) until each has ramped, so N sensors take about as long
+        as one. A channel that trips, has not ramped within `ramp_timeout`
+        seconds or gives no reading is switched off and drops out of the scan
+        while the others carry on. Returns {channel: (voltages, currents,
+        kfactors, dropped)}. Channels are switched off at the end unless
+        `leave_on`, and always if the scan is interrupted.
+        """
+        n = int(abs((stop_v - start_v) // step_v) + 1)
+        pol = {ch: -1 if self.read_channel(ch, "POL").val == '-' else 1 for ch in channels}
+        results = {ch: ([], [], [], False) for ch in channels}
+        active = list(channels)
+        finished = False
+        try:
+            for ch in channels:
+                self.set_channel(ch, "ISET", curr_limit)
+                self.set_channel(ch, "VSET", start_v)
+                self.set_channel(ch, "ON")
+
+            for v in range(n):
+                if v > 0:
+                    for ch in active:
+                        self.set_channel(ch, "VSET", start_v + v * step_v)
+                vset = {ch: self.read_channel(ch, "VSET").val for ch in active}
+                ramping = list(active)
+                deadline = time.monotonic() + ramp_timeout
+                while ramping:
+                    for ch in list(ramping):
+                        if self._tripped(ch):
+                            self._isolate(ch, results, active, v, "compliance reached, supply tripped")
+                            ramping.remove(ch)
+                            continue
+                        vmon = self.read_channel(ch, "VMON").val
+                        if vmon is not None and vset[ch] is not None and abs(vmon - vset[ch]) <= self.vtol:
+                            ramping.remove(ch)
+                    if ramping and time.monotonic() > deadline:
+                        for ch in ramping:
+                            self._isolate(ch, results, active, v, f"not at VSET after {ramp_timeout:.0f} s")
+                        ramping = []
+                    if ramping:
+                        time.sleep(.1)
+                if not active:
+                    break
+                time.sleep(delay)
+                for ch in list(active):
+                    if self._tripped(ch):
+                        self._isolate(ch, results, active, v, "compliance reached, supply tripped")
+                        continue
+                    voltages, currents, kfactors, _ = results[ch]
+                    vmon = self.extract_float_value(self.read_channel(ch, "VMON"))
+                    imon = self.extract_float_value(self.read_channel(ch, "IMON"))
+                    if vmon is None or imon is None:
+                        self._isolate(ch, results, active, v, "no VMON/IMON reading")
+                        continue
+                    if v > 0 and imon > 0 and vmon != pol[ch]*voltages[-1]:
+                        kfactor = ((imon-currents[-1])/(vmon-pol[ch]*voltages[-1]))*(vmon/imon)
+                    else:
+                        kfactor = np.nan
+                    print(f"CH{ch} Vmon: {vmon*pol[ch]}, Imon: {imon}, K-Factor: {kfactor}")
+                    voltages.append(vmon*pol[ch])
+                    currents.append(imon)
+                    kfactors.append(kfactor)
+            finished = True
+        finally:
+            if not leave_on or not finished:
+                for ch in active:
+                    self.set_channel(ch, "OFF")
+        return results
+
+    def _tripped(self, channel):
+        status = self.read_channel(channel, "STAT").val
+        return status is not None and bool(status & (128 | 8))
+
+    def _isolate(self, channel, results, active, step, reason):
+        print(f"CH{channel}: {reason} at step {step}, switching off")
+        self.set_channel(channel, "OFF")
+        active.remove(channel)
+        results[channel] = results[channel][:3] + (True,)
+
+    def plot_IV_curve(self, start_v, stop_v, step_v, curr_limit, moduleid, leave_on=False, delay=10, interactive=True):
         voltages, currents, kfactors = self.IV_curve(start_v, stop_v, step_v, curr_limit, leave_on, delay)
+        save_IV_curve(voltages, currents, kfactors, moduleid, self.read_polarity().val == '-', interactive)
+
+    def plot_IV_curves(self, channels, start_v, stop_v, step_v, curr_limit, moduleids, leave_on=False, delay=10,
+                       interactive=False):
+        """IV_curves with one result directory per module; moduleids maps channel to module."""
+        results = self.IV_curves(channels, start_v, stop_v, step_v, curr_limit, leave_on, delay)
+        for ch, (voltages, currents, kfactors, tripped) in results.items():
+            if voltages:
+                save_IV_curve(voltages, currents, kfactors, moduleids[ch],
+                              self.read_channel(ch, "POL").val == '-', interactive)
+        return results
+
+def save_IV_curve(voltages, currents, kfactors, moduleid, inverted=False, interactive=False):
+    """Writes the curve and its plot under IV_Curves/<moduleid>/<timestamp>.
+
+    With `interactive` the plot is shown and the user asked whether to upload
+    the results to the production database; otherwise the figure is closed so
+    unattended scans never block.
+    """
+    timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
+    maindir = Path(__file__).parent.parent.parent
+
+    resultdir = maindir / "IV_Curves" / str(moduleid) / timestamp
+    if not os.path.isdir(resultdir):
+        os.makedirs(resultdir)
+
+    resultdir.mkdir(exist_ok=True)
+
+    outfile = resultdir / f"IV_Curve_{moduleid}_{timestamp}.csv"
+    with open(outfile, 'w') as f:
+        f.write(f"Voltage (V): {voltages}\n")
+        f.write(f"Current (uA): {currents}\n")
+        f.write(f"K-Factor: {kfactors}\n")
+
+    fig, ax1 = plt.subplots()
+
+    ax1.set_xlabel('Voltage (V)')
+    ax1.set_ylabel('Current ($\mu$A)')
+    p1 = ax1.plot(voltages, currents, color = 'red', label="Current", marker='.')
+    ax1.tick_params(axis = 'y', labelcolor = 'red', color = 'red')
+
+    ax2 = ax1.twinx()
+    ax2.set_ylabel('K-Factor')
+    p2 = ax2.plot(voltages, kfactors, color = 'blue', label="K-Factor", marker='.')
+    ax2.tick_params(axis = 'y', labelcolor = 'blue', color = 'blue')
+
+    if inverted:
+        ax1.invert_xaxis()
+
+    ps = p1+p2
+    labs = [l.get_label() for l in ps]
+    ax1.legend(ps, labs, loc=0)
+    ax1.grid()
+    plt.title('IV Curve')
+    plt.savefig(resultdir / f"IV_Curve_{moduleid}_{timestamp}.png")
+    if not interactive:
+        plt.close(fig)
+        return
+    plt.show()
 
-        timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
-        maindir = Path(__file__).parent.parent.parent
-
-        resultdir = maindir / "IV_Curves" / str(moduleid) / timestamp
-        if not os.path.isdir(resultdir):
-            os.makedirs(resultdir)
-
-        resultdir.mkdir(exist_ok=True)
-
-        outfile = resultdir / f"IV_Curve_{moduleid}_{timestamp}.csv"
-        with open(outfile, 'w') as f:
-            f.write(f"Voltage (V): {voltages}\n")
-            f.write(f"Current (uA): {currents}\n")
-            f.write(f"K-Factor: {kfactors}\n")
-
-        fig, ax1 = plt.subplots()
-
-        ax1.set_xlabel('Voltage (V)')
-        ax1.set_ylabel('Current ($\mu$A)')
-        p1 = ax1.plot(voltages, currents, color = 'red', label="Current", marker='.')
-        ax1.tick_params(axis = 'y', labelcolor = 'red', color = 'red')
-
-        ax2 = ax1.twinx()
-        ax2.set_ylabel('K-Factor')
-        p2 = ax2.plot(voltages, kfactors, color = 'blue', label="K-Factor", marker='.')
-        ax2.tick_params(axis = 'y', labelcolor = 'blue', color = 'blue')
-
-        if self.read_polarity()['VAL'] == '-':
-            plt.gca().invert_xaxis()
-
-        ps = p1+p2
-        labs = [l.get_label() for l in ps]
-        ax1.legend(ps, labs, loc=0)
-        ax1.grid()
-        plt.title('IV Curve')
-        plt.savefig(resultdir / f"IV_Curve_{moduleid}_{timestamp}.png")
-        plt.show()
-
-        upload_bool = input("Upload results to database? (y/n): ")
-        if upload_bool.strip().lower() == 'y' or upload_bool.strip().lower() == 'yes':
-            user = str(input("CERN Username: "))
-            iv = ModuleIVV0(
-                module=moduleid,
-                measurement_date=timestamp,
-                location="BU",
-                user_created=user,
-                current = currents,
-                voltage = voltages,
-                k_factor = kfactors,
-            )
-            print(iv)
-            tests = [iv]
-            prod_session.add_all(tests)
-            prod_session.upload()
+    upload_bool = input("Upload results to database? (y/n): ")
+    if upload_bool.strip().lower() == 'y' or upload_bool.strip().lower() == 'yes':
+        user = str(input("CERN Username: "))
+        iv = ModuleIVV0(
+            module=moduleid,
+            measurement_date=timestamp,
+            location="BU",
+            user_created=user,
+            current = currents,
+            voltage = voltages,
+            k_factor = kfactors,
+        )
+        print(iv)
+        tests = [iv]
+        prod_session.add_all(tests)
+        prod_session.upload()
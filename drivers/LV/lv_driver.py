@@ -1,11 +1,29 @@
+import re
 import serial
+import sys
+import threading
+from pathlib import Path
+
+common_dir = Path(__file__).parent.parent / "Common"
+sys.path.append(str(common_dir))
+
+from command_stats import driver_stats
+from line_reader import LineReader
+from serial_trace import open_port
+
+# "CH1: VOLT 5.0" is counted as "CH1: VOLT"
+_VALUE_RE = re.compile(r' [-+]?[\d.]+$')
 
 class LVPowerSupply():
-    def __init__(self, port, channel, baud=115200):
+    def __init__(self, port, channel, baud=115200, timeout=1):
         self.port = port
         self.baud = baud
         self.channel = channel
-        self.ser = serial.Serial(self.port, self.baud, timeout=1)
+        # Serializes commands from the poller and the interlock thread
+        self.lock = threading.RLock()
+        self.ser = open_port(self.port, baudrate=self.baud, timeout=timeout)
+        self.reader = LineReader(self.ser, terminator=b'\n')
+        self.stats = driver_stats(f"LV {port}")
         self.flush_input_buffer()
 
     def close(self):
@@ -14,16 +32,15 @@ class LVPowerSupply():
 
     def send_command(self, cmd):
         if self.ser and self.ser.is_open:
-            self.ser.reset_input_buffer()
-            self.ser.write((f"{cmd}\n").encode())
-            self.ser.flush()
-            line = self.ser.readline().decode()
-            return line
+            with self.lock, self.stats.measure(_VALUE_RE.sub('', cmd), self.reader):
+                self.reader.reset()
+                self.reader.write((f"{cmd}\n").encode())
+                return self.reader.read_line()
         else:
             raise RuntimeError("Serial not open, call connect() first")
     
     def flush_input_buffer(self):
-        self.ser.flushInput()
+        self.reader.reset()
 
     def set_voltage(self, voltage):
         response = self.send_command(f"CH{self.channel}: VOLT {voltage}").strip()
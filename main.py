@@ -1,6 +1,71 @@
+import argparse
+import signal
+import sys
+import threading
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent
+acquisition_dir = MAIN_DIR / "acquisition"
+sys.path.append(str(acquisition_dir))
+sys.path.append(str(MAIN_DIR / "drivers" / "Common"))
+
+import command_stats
+import serial_trace
+
+from config import DEFAULT_CONFIG, load_config
+from daemon import AcquisitionDaemon
+from profiler import SamplingProfiler
+from resources import ResourceMonitor
+from snapshot import DEFAULT_NAME
+from api import DEFAULT_PORT
+
 def main():
-    print("Hello from etl-testing-gui!")
+    parser = argparse.ArgumentParser(description="Run the ETL test stand headless: acquisition, logging and interlocks without Qt")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG))
+    parser.add_argument("--stand", help="stand to run, by default the first in the config")
+    parser.add_argument("--devices", nargs="+", metavar="NAME", help="only these devices of the stand")
+    parser.add_argument("--no-log", action="store_true", help="do not write the text logs and rollups")
+    parser.add_argument("--db", help="also log readings to this SQLite database")
+    parser.add_argument("--api", type=int, nargs="?", const=DEFAULT_PORT, metavar="PORT",
+                        help="serve the read-only monitoring API on localhost")
+    parser.add_argument("--shm", default=DEFAULT_NAME, help="name of the shared memory snapshot")
+    parser.add_argument("--report", type=float, default=60.0, metavar="SECONDS",
+                        help="interval between status reports, 0 to disable")
+    parser.add_argument("--command-stats", action="store_true",
+                        help="record per-command serial latencies and add them to each report")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record all serial traffic to traces in DIR, see acquisition/replay.py")
+    args = parser.parse_args()
+    if args.command_stats:
+        command_stats.enable()
+    if args.record:
+        serial_trace.start_recording(args.record)
+
+    stand = load_config(args.config).stand(args.stand)
+    daemon = AcquisitionDaemon(stand, args.devices, args.shm, args.db, args.api, log=not args.no_log)
+
+    # systemd stops services with SIGTERM
+    stop_evt = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_evt.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_evt.set())
+    # `kill -USR1 <pid>` starts profiling; the next one writes a flamegraph input to Profiles/
+    profiler = SamplingProfiler()
+    signal.signal(signal.SIGUSR1, lambda *_: threading.Thread(target=profiler.toggle, name="profiler-toggle").start())
+
+    monitor = ResourceMonitor()
+    daemon.start()
+    while not stop_evt.wait(args.report or None):
+        status = daemon.status()
+        devices = "  ".join(f"{d} {s['polls']} polls/{s['errors']} errors" for d, s in status["devices"].items())
+        dropped = sum(sub["dropped"] for sub in status["subscribers"].values())
+        print(f"{ResourceMonitor.format(monitor.sample())}  |  {devices}  |  {dropped} dropped", flush=True)
+        if command_stats.ENABLED:
+            print(command_stats.format_table(), flush=True)
 
+    print("Stopping acquisition")
+    if profiler.running:
+        profiler.toggle()
+    daemon.stop()
 
 if __name__ == "__main__":
     main()
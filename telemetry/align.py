@@ -0,0 +1,73 @@
+import numpy as np
+
+def asof(base_t, t, v, tolerance=None):
+    """Value of the latest sample at or before each base time (an as-of join).
+
+    base_t and t are sorted times on the same clock. Base times with no sample
+    before them, or whose latest sample is older than `tolerance`, get NaN.
+    """
+    base_t = np.asarray(base_t, dtype=np.float64)
+    out = np.full(len(base_t), np.nan)
+    if len(t) == 0:
+        return out
+    i = np.searchsorted(t, base_t, side="right") - 1
+    ok = i >= 0
+    if tolerance is not None:
+        ok &= (base_t - t[np.maximum(i, 0)]) <= tolerance
+    out[ok] = v[i[ok]]
+    return out
+
+def interpolate(base_t, t, v, max_gap=None):
+    """Linear interpolation of (t, v) at each base time.
+
+    Base times outside the samples, or between two samples more than `max_gap`
+    apart, get NaN rather than a value bridged across missing data.
+    """
+    base_t = np.asarray(base_t, dtype=np.float64)
+    out = np.full(len(base_t), np.nan)
+    keep = ~np.isnan(v)
+    t = t[keep]
+    v = v[keep]
+    if len(t) < 2:
+        return out
+    inside = (base_t >= t[0]) & (base_t <= t[-1])
+    out[inside] = np.interp(base_t[inside], t, v)
+    if max_gap is not None:
+        i = np.clip(np.searchsorted(t, base_t, side="right"), 1, len(t) - 1)
+        out[(t[i] - t[i - 1]) > max_gap] = np.nan
+    return out
+
+def timebase(streams, step):
+    """Evenly spaced times covering the overlap of every stream."""
+    starts = [t[0] for t, _ in streams.values() if len(t)]
+    ends = [t[-1] for t, _ in streams.values() if len(t)]
+    if not starts:
+        return np.empty(0)
+    start, end = max(starts), min(ends)
+    if end < start:
+        return np.empty(0)
+    return np.arange(start, end + step / 2, step)
+
+def align(streams, step=None, base_t=None, method="asof", tolerance=None):
+    """Aligns several (t, v) streams onto one time base for correlation.
+
+    streams maps a name (e.g. ("HV", "IMON")) to sorted (t, v) arrays on the
+    same clock. The base is `base_t` if given, else a `step`-spaced grid over
+    the streams' overlap. method is "asof" (last value, held for at most
+    `tolerance`) or "linear" (interpolated, not across gaps over `tolerance`).
+    Returns (base_t, {name: aligned values}).
+    """
+    if base_t is None:
+        if step is None:
+            raise ValueError("Either step or base_t is required")
+        base_t = timebase(streams, step)
+    if method == "asof":
+        return base_t, {name: asof(base_t, t, v, tolerance) for name, (t, v) in streams.items()}
+    if method == "linear":
+        return base_t, {name: interpolate(base_t, t, v, tolerance) for name, (t, v) in streams.items()}
+    raise ValueError(f"Unknown alignment method: {method}")
+
+def align_store(store, channels, seconds, step, method="asof", tolerance=None):
+    """Aligns the last `seconds` of the given (device, channel)s in a TimeSeriesStore."""
+    streams = {key: store.window(key[0], key[1], seconds) for key in channels}
+    return align(streams, step=step, method=method, tolerance=tolerance)
@@ -0,0 +1,256 @@
+"""Bulk converter from the legacy text logs to partitioned Parquet.
+
+Walks "Environmental Data" (lines like "2025-01-01-12-00-00: {'VSET': 1.2, ...}")
+and "IV_Curves" (three "Name: [..]" lines per scan), parses the files in a
+process pool and writes two hive-partitioned datasets:
+
+    <out>/telemetry/device=<device>/date=<YYYY-MM-DD>/<source>.parquet
+    <out>/iv_curves/module=<module>/<source>.parquet
+
+Finished files are recorded in <out>/_manifest.jsonl, so an interrupted run
+picks up where it left off. Usage:
+
+    python telemetry/convert_logs.py [--root DIR] [--out DIR] [--workers N]
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MAIN_DIR = Path(__file__).parent.parent
+
+# Log subdirectory -> device name used everywhere else
+LOG_DEVICES = {
+    "HV Supply Data": "HV",
+    "LV Supply Data": "LV",
+    "Chiller Data": "Chiller",
+    "Arduino Data": "Arduino",
+}
+
+TELEMETRY_SCHEMA = pa.schema([
+    ("time", pa.timestamp("us")),
+    ("device", pa.string()),
+    ("channel", pa.string()),
+    ("value", pa.float64()),
+    ("text", pa.string()),
+    ("source", pa.string()),
+])
+
+IV_SCHEMA = pa.schema([
+    ("module", pa.string()),
+    ("measured_at", pa.timestamp("s")),
+    ("point", pa.int32()),
+    ("voltage", pa.float64()),
+    ("current", pa.float64()),
+    ("kfactor", pa.float64()),
+    ("source", pa.string()),
+])
+
+MANIFEST = "_manifest.jsonl"
+
+def parse_timestamp(stamp):
+    """Converts a log timestamp (%Y-%m-%d-%H-%M-%S, optionally with .ffffff) to ISO 8601."""
+    date, clock = stamp[:10], stamp[11:]
+    return f"{date}T{clock[:2]}:{clock[3:5]}:{clock[6:]}"
+
+def flatten(prefix, value, out):
+    if isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            flatten(f"{prefix}[{i}]", item, out)
+    else:
+        out.append((prefix, value))
+
+def parse_env_log(path):
+    """Returns column lists for every (time, channel, value) in a legacy device log."""
+    times, channels, values, texts = [], [], [], []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            stamp, sep, rest = line.partition(": ")
+            if not sep:
+                continue
+            try:
+                data = ast.literal_eval(rest.strip())
+            except (ValueError, SyntaxError):
+                continue
+            if not isinstance(data, dict):
+                continue
+            iso = parse_timestamp(stamp)
+            items = []
+            for key, value in data.items():
+                flatten(key, value, items)
+            for channel, value in items:
+                number = None
+                text = None
+                if isinstance(value, (bool, int, float)):
+                    number = float(value)
+                elif isinstance(value, str):
+                    try:
+                        number = float(value)
+                    except ValueError:
+                        text = value
+                times.append(iso)
+                channels.append(channel)
+                values.append(number)
+                texts.append(text)
+    return times, channels, values, texts
+
+def parse_iv_curve(path):
+    columns = {}
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            name, sep, rest = line.partition(": ")
+            if sep:
+                columns[name.strip()] = ast.literal_eval(rest.strip().replace("nan", "None"))
+    return (columns.get("Voltage (V)", []), columns.get("Current (uA)", []), columns.get("K-Factor", []))
+
+def write_table(table, path):
+    # Write then rename, so an interrupted run never leaves a truncated file behind
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+def convert_env_log(path, device, out):
+    times, channels, values, texts = parse_env_log(path)
+    if not times:
+        return 0
+    time_col = np.array(times, dtype="datetime64[us]")
+    dates = time_col.astype("datetime64[D]")
+    channels = np.array(channels, dtype=object)
+    values = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    texts = np.array(texts, dtype=object)
+    for date in np.unique(dates):
+        mask = dates == date
+        table = pa.table({
+            "time": pa.array(time_col[mask], type=pa.timestamp("us")),
+            "device": pa.array([device] * int(mask.sum()), type=pa.string()),
+            "channel": pa.array(channels[mask], type=pa.string()),
+            "value": pa.array(values[mask], type=pa.float64(), from_pandas=True),
+            "text": pa.array(texts[mask], type=pa.string()),
+            "source": pa.array([path.name] * int(mask.sum()), type=pa.string()),
+        }, schema=TELEMETRY_SCHEMA)
+        write_table(table, out / "telemetry" / f"device={device}" / f"date={date}" / f"{path.stem}.parquet")
+    return len(times)
+
+def convert_iv_curve(path, module, out):
+    voltages, currents, kfactors = parse_iv_curve(path)
+    n = len(voltages)
+    if n == 0:
+        return 0
+    stamp = path.parent.name
+    measured_at = np.datetime64(parse_timestamp(stamp), "s")
+    table = pa.table({
+        "module": pa.array([module] * n, type=pa.string()),
+        "measured_at": pa.array([measured_at] * n, type=pa.timestamp("s")),
+        "point": pa.array(range(n), type=pa.int32()),
+        "voltage": pa.array(voltages, type=pa.float64()),
+        "current": pa.array(currents, type=pa.float64()),
+        "kfactor": pa.array(kfactors, type=pa.float64()),
+        "source": pa.array([path.name] * n, type=pa.string()),
+    }, schema=IV_SCHEMA)
+    write_table(table, out / "iv_curves" / f"module={module}" / f"{path.stem}.parquet")
+    return n
+
+def convert_file(job):
+    """Worker entry point: converts one source file, returns (key, rows, bytes)."""
+    kind, path, label, out, size, mtime = job
+    path = Path(path)
+    if kind == "env":
+        rows = convert_env_log(path, label, Path(out))
+    else:
+        rows = convert_iv_curve(path, label, Path(out))
+    return str(path), rows, size
+
+def find_jobs(root, out):
+    jobs = []
+    env_dir = root / "Environmental Data"
+    if env_dir.is_dir():
+        for subdir in sorted(env_dir.iterdir()):
+            if subdir.is_dir() and subdir.name in LOG_DEVICES:
+                for path in sorted(subdir.glob("*.csv")):
+                    jobs.append(("env", str(path), LOG_DEVICES[subdir.name], str(out)))
+    iv_dir = root / "IV_Curves"
+    if iv_dir.is_dir():
+        # IV_Curves/<module>/<timestamp>/IV_Curve_<module>_<timestamp>.csv
+        for path in sorted(iv_dir.glob("*/*/IV_Curve_*.csv")):
+            jobs.append(("iv", str(path), path.parent.parent.name, str(out)))
+    return jobs
+
+def load_manifest(out):
+    done = {}
+    manifest = out / MANIFEST
+    if manifest.is_file():
+        with open(manifest) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted run
+                done[entry["path"]] = (entry["size"], entry["mtime"])
+    return done
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert legacy text logs to partitioned Parquet")
+    parser.add_argument("--root", default=str(MAIN_DIR), help="directory holding 'Environmental Data' and 'IV_Curves'")
+    parser.add_argument("--out", default=str(MAIN_DIR / "parquet"), help="output dataset directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and convert everything again")
+    args = parser.parse_args(argv)
+
+    root = Path(args.root)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    done = {} if args.force else load_manifest(out)
+    found = find_jobs(root, out)
+    jobs = []
+    for job in found:
+        stat = os.stat(job[1])
+        # Logs that grew since the last run are converted again. The manifest
+        # records the file as it was scanned, so lines appended while it is
+        # converted make it due again on the next run
+        if done.get(job[1]) != (stat.st_size, stat.st_mtime):
+            jobs.append(job + (stat.st_size, stat.st_mtime))
+    skipped = len(found) - len(jobs)
+    print(f"{len(jobs)} files to convert, {skipped} already done")
+    if not jobs:
+        return 0
+
+    start = time.perf_counter()
+    total_rows = 0
+    total_bytes = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool, open(out / MANIFEST, "a") as manifest:
+        futures = {pool.submit(convert_file, job): job for job in jobs}
+        for i, future in enumerate(as_completed(futures), 1):
+            job = futures[future]
+            try:
+                path, rows, size = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Failed to convert {job[1]}: {e}", file=sys.stderr)
+                continue
+            manifest.write(json.dumps({"path": path, "size": job[4], "mtime": job[5], "rows": rows}) + "\n")
+            manifest.flush()
+            total_rows += rows
+            total_bytes += size
+            elapsed = time.perf_counter() - start
+            print(f"[{i}/{len(jobs)}] {Path(path).name}: {rows} rows "
+                  f"({total_bytes / 1e6 / elapsed:.1f} MB/s, {total_rows / elapsed:.0f} rows/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Converted {len(jobs) - failed} files, {total_rows} rows, {total_bytes / 1e6:.1f} MB "
+          f"in {elapsed:.1f} s ({(len(jobs) - failed) / elapsed:.1f} files/s, "
+          f"{total_bytes / 1e6 / elapsed:.1f} MB/s, {total_rows / elapsed:.0f} rows/s)")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
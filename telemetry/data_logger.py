@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+MAIN_DIR = Path(__file__).parent.parent
+common_dir = MAIN_DIR / "drivers" / "Common"
+sys.path.append(str(common_dir))
+
+from session_clock import SESSION_CLOCK
+
+class DataLogger():
+    """Logs one device's readings to its text log and any storage backends.
+
+    The text log keeps the "<timestamp>: {data}" lines under
+    "Environmental Data/<subdir>", with microseconds appended to the timestamp.
+    Backends (RollupEngine, SQLiteStore) are handed the numeric reading through
+    add_reading(device, reading, t). A poll of several exchanges writes one
+    text row for the whole poll, so every line of a log has the same fields,
+    and hands each exchange to the backends under its own stamp. Times come
+    from the reading's Stamp midpoint on the session clock, or from now if
+    there is no stamp.
+    """
+    def __init__(self, device, subdir, prefix, backends=None):
+        self.device = device
+        self.resultdir = MAIN_DIR / "Environmental Data" / subdir
+        self.prefix = prefix
+        self.backends = list(backends) if backends else []
+        self.log_timestamp = None
+        self.outfile = None
+
+    def start(self):
+        self.log_timestamp = time.strftime("%Y-%m-%d-%H-%M-%S")
+        if not os.path.isdir(self.resultdir):
+            os.makedirs(self.resultdir)
+        self.outfile = self.resultdir / f"{self.prefix}_{self.log_timestamp}.csv"
+
+    def stop(self):
+        # Called from the GUI thread when logging is toggled off. The backends
+        # flush on their own schedule, so waiting on them here would only stall
+        # the GUI; close() flushes them at shutdown.
+        self.outfile = None
+
+    def close(self):
+        """Stops logging and flushes the backends, e.g. when the process exits."""
+        self.stop()
+        for backend in self.backends:
+            backend.flush()
+
+    def write(self, data, reading=None, stamp=None):
+        if self.outfile is None:
+            return
+        t_mono = SESSION_CLOCK.now() if stamp is None else stamp.midpoint
+        with open(self.outfile, 'a') as f:
+            f.write(f"{SESSION_CLOCK.format(t_mono)}: {data}\n")
+        if reading is not None:
+            self.add_reading(reading, stamp)
+
+    def add_reading(self, reading, stamp=None):
+        """Hands a reading to the backends only, e.g. each exchange of a poll
+        whose text line write() covers as one row."""
+        if self.outfile is None:
+            return
+        t_mono = SESSION_CLOCK.now() if stamp is None else stamp.midpoint
+        t = SESSION_CLOCK.to_wall(t_mono)
+        for backend in self.backends:
+            backend.add_reading(self.device, reading, t)
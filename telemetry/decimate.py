@@ -0,0 +1,48 @@
+import numpy as np
+
+def minmax_decimate(t, v, n_bins):
+    """Reduces (t, v) to the min and max of each of n_bins equal time bins.
+
+    Returns at most 2*n_bins points in time order, so a line drawn through them
+    covers exactly the pixels the full series would at n_bins pixels wide.
+    Empty bins are dropped and NaNs ignored.
+    """
+    return minmax_decimate_pieces([(t, v)], n_bins)
+
+def minmax_decimate_pieces(pieces, n_bins):
+    """minmax_decimate of consecutive (t, v) pieces, e.g. the two halves of a
+    wrapped ring buffer, without concatenating them.
+
+    Beyond 2*n_bins samples only the output is allocated, so memory per call is
+    bounded by the number of bins rather than the length of the series.
+    """
+    pieces = [(t, v) for t, v in pieces if len(t)]
+    if sum(len(t) for t, _ in pieces) <= 2 * n_bins:
+        if not pieces:
+            return np.empty(0), np.empty(0)
+        t = np.concatenate([t for t, _ in pieces])
+        v = np.concatenate([v for _, v in pieces])
+        keep = ~np.isnan(v)
+        return t[keep], v[keep]
+    edges = np.linspace(pieces[0][0][0], pieces[-1][0][-1], n_bins + 1)
+    vmin = np.full(n_bins, np.nan)
+    vmax = np.full(n_bins, np.nan)
+    tfirst = np.full(n_bins, np.nan)
+    tlast = np.full(n_bins, np.nan)
+    for t, v in pieces:
+        starts = np.searchsorted(t, edges[:-1], side='left')
+        bins = np.flatnonzero(np.diff(np.append(starts, len(t))) > 0)
+        starts = starts[bins]
+        ends = np.append(starts[1:], len(t))
+        # fmin/fmax ignore NaNs; a bin split across two pieces is merged the same way
+        vmin[bins] = np.fmin(vmin[bins], np.fmin.reduceat(v, starts))
+        vmax[bins] = np.fmax(vmax[bins], np.fmax.reduceat(v, starts))
+        tfirst[bins] = np.fmin(tfirst[bins], t[starts])
+        tlast[bins] = np.fmax(tlast[bins], t[ends - 1])
+    keep = ~np.isnan(vmin)
+    tb = (tfirst[keep] + tlast[keep]) / 2
+    out_t = np.repeat(tb, 2)
+    out_v = np.empty(2 * len(tb))
+    out_v[0::2] = vmin[keep]
+    out_v[1::2] = vmax[keep]
+    return out_t, out_v
@@ -0,0 +1,252 @@
+"""Time-indexed, memory-mapped loader for the "<timestamp>: {data}" device logs.
+
+A sidecar "<log>.idx" file holds the byte offset of every `stride`-th line and
+its timestamp, so a time range maps straight to a byte range of the mapped
+file. Only that slice is parsed, with whole-buffer regex passes instead of
+literal_eval per line. Times are the naive local wall times written in the log,
+including the microseconds newer logs append to the timestamp.
+
+    python telemetry/log_index.py LOG [--start "2025-01-01 20:00"] [--end ...] [--plot]
+"""
+import argparse
+import ast
+import mmap
+import os
+import re
+import sys
+import numpy as np
+from pathlib import Path
+
+IDX_SUFFIX = ".idx"
+STAMP_LEN = 19  # %Y-%m-%d-%H-%M-%S
+LINE_MIN = STAMP_LEN + 7  # shortest line line_times() can read
+
+_STR_RE = re.compile(r"'[^'\n]*'")
+_KEY_RE = re.compile(r"'([^'\n]*)': ")
+_BRACKETS = str.maketrans("", "", "{}[]")
+
+def _digits(buf, starts, offset, width):
+    value = np.zeros(len(starts), dtype=np.int64)
+    for i in range(width):
+        value = value * 10 + (buf[starts + offset + i].astype(np.int64) - 48)
+    return value
+
+def line_times(buf, starts):
+    """Vectorized timestamp parse of the lines starting at `starts`, in epoch seconds.
+
+    Each line must be long enough to hold a timestamp with microseconds, which
+    any "<timestamp>: {...}" line is.
+    """
+    years = _digits(buf, starts, 0, 4)
+    months = _digits(buf, starts, 5, 2)
+    days = _digits(buf, starts, 8, 2)
+    seconds = _digits(buf, starts, 11, 2) * 3600 + _digits(buf, starts, 14, 2) * 60 + _digits(buf, starts, 17, 2)
+    dates = (years - 1970).astype("datetime64[Y]") + (months - 1).astype("timedelta64[M]")
+    dates = dates.astype("datetime64[D]") + (days - 1).astype("timedelta64[D]")
+    times = (dates.astype(np.int64) * 86400 + seconds).astype(np.float64)
+    # "%Y-%m-%d-%H-%M-%S.ffffff" since the loggers moved to the session clock
+    frac = buf[starts + STAMP_LEN] == ord(".")
+    if frac.any():
+        times[frac] += _digits(buf, starts[frac], STAMP_LEN + 1, 6) / 1e6
+    return times
+
+def to_epoch(when):
+    """Accepts epoch seconds, a datetime or a string like '2025-01-01 20:00'."""
+    if when is None or isinstance(when, (int, float, np.integer, np.floating)):
+        return when
+    return int(np.datetime64(when, "s").astype(np.int64))
+
+def flatten(prefix, value, out):
+    if isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            flatten(f"{prefix}[{i}]", item, out)
+    else:
+        out.append(prefix)
+
+class LogIndex():
+    """Sparse time index of one log file, kept in a sidecar next to it."""
+    def __init__(self, path, stride=256):
+        self.path = Path(path)
+        self.idx_path = self.path.with_name(self.path.name + IDX_SUFFIX)
+        self.stride = stride
+        self.times = np.empty(0, dtype=np.int64)
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.indexed_size = 0   # bytes covered by the index
+        self.lines = 0          # complete lines covered by the index
+        self.refresh()
+
+    def refresh(self):
+        """Loads the sidecar and indexes whatever was appended since it was written."""
+        size = os.path.getsize(self.path)
+        if self.indexed_size == 0 and self.idx_path.is_file():
+            with np.load(self.idx_path) as idx:
+                if int(idx["stride"]) == self.stride and int(idx["size"]) <= size:
+                    self.times = idx["times"]
+                    self.offsets = idx["offsets"]
+                    self.indexed_size = int(idx["size"])
+                    self.lines = int(idx["lines"])
+        if size == self.indexed_size:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            tail = buf[self.indexed_size:]
+            ends = np.flatnonzero(tail == 10)
+            if len(ends) == 0:
+                del buf, tail
+                return
+            starts = np.concatenate(([0], ends[:-1] + 1)) + self.indexed_size
+            complete = ends[-1] + 1 + self.indexed_size
+            # Lines too short for a timestamp (blank or torn) are skipped
+            valid = (ends + self.indexed_size) - starts >= LINE_MIN
+            starts = starts[valid]
+            # Keep the stride phase across incremental updates
+            first = -self.lines % self.stride
+            picked = starts[first::self.stride]
+            times = line_times(buf, picked)
+            self.lines += len(starts)
+            del buf, tail
+        self.times = np.concatenate((self.times, times))
+        self.offsets = np.concatenate((self.offsets, picked))
+        self.indexed_size = int(complete)
+        np.savez(self.idx_path.with_suffix(".tmp.npz"), times=self.times, offsets=self.offsets,
+                 size=self.indexed_size, stride=self.stride, lines=self.lines)
+        os.replace(self.idx_path.with_suffix(".tmp.npz"), self.idx_path)
+
+    def byte_range(self, start=None, end=None):
+        """Returns the [lo, hi) byte range that covers every line in [start, end]."""
+        lo = 0
+        hi = self.indexed_size
+        if start is not None and len(self.times):
+            i = np.searchsorted(self.times, start, side="left")
+            lo = int(self.offsets[i - 1]) if i > 0 else 0
+        if end is not None and len(self.times):
+            i = np.searchsorted(self.times, end, side="right")
+            hi = int(self.offsets[i]) if i < len(self.offsets) else self.indexed_size
+        return lo, hi
+
+    def load(self, start=None, end=None):
+        """Returns (times, {column: values}) for the lines between start and end.
+
+        `times` are epoch seconds of the naive log timestamps. Numeric, boolean
+        and None values become float columns; text values become NaN.
+        """
+        start = to_epoch(start)
+        end = to_epoch(end)
+        self.refresh()
+        lo, hi = self.byte_range(start, end)
+        if hi <= lo:
+            return np.empty(0), {}
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)[lo:hi]
+            ends = np.flatnonzero(buf == 10)
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            valid = ends - starts >= LINE_MIN
+            times = line_times(buf, starts[valid])
+            text = mm[lo:hi].decode("utf-8", errors="replace")
+            del buf
+        lines = text.split("\n")[:-1]
+        lines = [line for line, ok in zip(lines, valid) if ok]
+        names, values = parse_lines(lines)
+        keep = np.ones(len(times), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times <= end
+        return times[keep], {name: values[keep, i] for i, name in enumerate(names)}
+
+def parse_lines(lines):
+    """Parses "<timestamp>: {dict}" lines into (column names, 2D float array).
+
+    Columns are the union of every line's keys, in the order they first
+    appear; a line leaves the columns it lacks NaN. Lines with the keys of a
+    parsable line but a different number of fields (e.g. "None" readings)
+    become rows of NaN.
+    """
+    signatures = [tuple(_KEY_RE.findall(line.partition(": ")[2])) for line in lines]
+    if len(set(signatures)) <= 1:
+        return _parse_same_keys(lines)
+    groups = {}
+    for i, signature in enumerate(signatures):
+        groups.setdefault(signature, []).append(i)
+    parsed = [(rows, _parse_same_keys([lines[i] for i in rows])) for rows in groups.values()]
+    names = []
+    for _, (group_names, _) in parsed:
+        names.extend(name for name in group_names if name not in names)
+    column = {name: i for i, name in enumerate(names)}
+    values = np.full((len(lines), len(names)), np.nan)
+    for rows, (group_names, group_values) in parsed:
+        if group_names:
+            values[np.ix_(rows, [column[name] for name in group_names])] = group_values
+    return names, values
+
+def _parse_same_keys(lines):
+    """parse_lines() of lines that share one set of keys, taken from the first line that parses."""
+    names = None
+    keys = None
+    for line in lines:
+        try:
+            data = ast.literal_eval(line.partition(": ")[2])
+        except (ValueError, SyntaxError):
+            continue
+        if isinstance(data, dict):
+            keys = list(data)
+            names = []
+            for key, value in data.items():
+                flatten(key, value, names)
+            break
+    if names is None:
+        return [], np.full((len(lines), 0), np.nan)
+
+    # Every line here comes from the same dict literal, so stripping the
+    # known keys with str.replace is much cheaper than a regex over the slice
+    body = "\n".join([line.partition(": ")[2] for line in lines])
+    for key in keys:
+        body = body.replace(f"{key!r}: ", "")
+    body = _STR_RE.sub("nan", body).translate(_BRACKETS)
+    body = body.replace("True", "1").replace("False", "0").replace("None", "nan")
+    rows = body.split("\n")
+    ncols = len(names)
+    good = np.array([row.count(",") == ncols - 1 for row in rows], dtype=bool)
+    values = np.full((len(rows), ncols), np.nan)
+    if good.any():
+        fields = ",".join(row for row, ok in zip(rows, good) if ok).split(",")
+        try:
+            values[good] = np.array(fields, dtype=np.float64).reshape(-1, ncols)
+        except ValueError:
+            # Some value is not a number; fall back to row by row
+            for i in np.flatnonzero(good):
+                try:
+                    values[i] = np.array(rows[i].split(","), dtype=np.float64)
+                except ValueError:
+                    pass
+    return names, values
+
+def load_log(path, start=None, end=None):
+    return LogIndex(path).load(start, end)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a time range from a device log")
+    parser.add_argument("log")
+    parser.add_argument("--start", help="e.g. '2025-01-01 20:00'")
+    parser.add_argument("--end")
+    parser.add_argument("--plot", action="store_true", help="plot every column")
+    args = parser.parse_args(argv)
+
+    times, columns = load_log(args.log, args.start, args.end)
+    print(f"{len(times)} lines")
+    for name, values in columns.items():
+        if np.isnan(values).all():
+            continue
+        print(f"{name:>24}: min {np.nanmin(values):10.4g}  max {np.nanmax(values):10.4g}  mean {np.nanmean(values):10.4g}")
+    if args.plot and len(times):
+        import matplotlib.pyplot as plt
+        stamps = (times * 1e6).astype("datetime64[us]")
+        fig, axes = plt.subplots(len(columns), 1, sharex=True, squeeze=False)
+        for ax, (name, values) in zip(axes[:, 0], columns.items()):
+            ax.plot(stamps, values, lw=1)
+            ax.set_ylabel(name, fontsize=7)
+        plt.show()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
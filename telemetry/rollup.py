@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+import numpy as np
+from pathlib import Path
+
+from timeseries import RingBuffer
+
+# One record per closed bin, appended to <root>/<device>/<channel>/<tier>.bin
+ROLLUP_DTYPE = np.dtype([("t", "<f8"), ("count", "<u4"), ("min", "<f4"), ("max", "<f4"), ("mean", "<f4")])
+
+# (name, bin width in seconds), finest first
+TIERS = (("1s", 1), ("1min", 60), ("1h", 3600))
+
+class Rollup():
+    """Incremental min/max/mean/count of one channel at one bin width."""
+    def __init__(self, width):
+        self.width = width
+        self.start = None
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+
+    def add(self, t, value):
+        """Adds a sample and returns the record of the bin it closed, if any."""
+        start = t - t % self.width
+        closed = None
+        if self.start is not None and start != self.start:
+            closed = self.record()
+            self.count = 0
+            self.min = np.inf
+            self.max = -np.inf
+            self.sum = 0.0
+        self.start = start
+        if value == value:  # skip NaN
+            self.count += 1
+            self.sum += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+        return closed
+
+    def record(self):
+        if self.start is None or self.count == 0:
+            return None
+        return (self.start, self.count, self.min, self.max, self.sum / self.count)
+
+class RollupEngine():
+    """Keeps raw samples for a short window and min/max/mean/count rollups on disk.
+
+    Memory per channel is one small raw RingBuffer plus an open bin per tier.
+    Closed bins are batched and appended to fixed-size binary files, so a trend
+    query memory-maps one file and binary searches it instead of parsing logs.
+    """
+    def __init__(self, root, raw_capacity=4096, tiers=TIERS, flush_interval=10.0):
+        self.root = Path(root)
+        self.raw_capacity = raw_capacity
+        self.tiers = tiers
+        self.flush_interval = flush_interval
+        self.channels = {}   # (device, channel) -> (raw RingBuffer, [Rollup per tier])
+        self.pending = {}    # file path -> list of closed records
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def path(self, device, channel, tier):
+        return self.root / device / channel / f"{tier}.bin"
+
+    def add(self, device, channel, value, t=None):
+        if value is None or not isinstance(value, (bool, int, float)):
+            return
+        if t is None:
+            t = time.time()
+        value = float(value)
+        with self.lock:
+            entry = self.channels.get((device, channel))
+            if entry is None:
+                entry = (RingBuffer(self.raw_capacity), [Rollup(width) for _, width in self.tiers])
+                self.channels[(device, channel)] = entry
+            raw, rollups = entry
+            raw.append(t, value)
+            for (tier, _), rollup in zip(self.tiers, rollups):
+                closed = rollup.add(t, value)
+                if closed is not None:
+                    self.pending.setdefault(self.path(device, channel, tier), []).append(closed)
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def add_reading(self, device, reading, t=None):
+        if t is None:
+            t = time.time()
+        for channel, value in reading.items():
+            self.add(device, channel, value, t)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        for path, records in self.pending.items():
+            if not os.path.isdir(path.parent):
+                os.makedirs(path.parent)
+            with open(path, 'ab') as f:
+                f.write(np.array(records, dtype=ROLLUP_DTYPE).tobytes())
+        self.pending = {}
+        self.last_flush = time.monotonic()
+
+    def raw(self, device, channel, start=None):
+        """Returns (t, v) arrays of the raw samples still held in memory."""
+        entry = self.channels.get((device, channel))
+        if entry is None:
+            return np.empty(0), np.empty(0)
+        return entry[0].since(-np.inf if start is None else start)
+
+    def query(self, device, channel, start, end=None, max_points=2000):
+        """Returns a ROLLUP_DTYPE array covering [start, end) in wall time.
+
+        The finest tier that fits the range into max_points bins is used. Bins
+        still open or waiting to be flushed are included.
+        """
+        if end is None:
+            end = time.time()
+        tier_index = len(self.tiers) - 1
+        for i, (_, width) in enumerate(self.tiers):
+            if (end - start) / width <= max_points:
+                tier_index = i
+                break
+        tier, width = self.tiers[tier_index]
+        # Bins are keyed by their start, so the one straddling `start` begins earlier
+        first = start - width
+        path = self.path(device, channel, tier)
+
+        parts = []
+        if os.path.isfile(path) and os.path.getsize(path) >= ROLLUP_DTYPE.itemsize:
+            data = np.memmap(path, dtype=ROLLUP_DTYPE, mode='r')
+            lo = np.searchsorted(data["t"], first, side='right')
+            hi = np.searchsorted(data["t"], end, side='left')
+            parts.append(np.array(data[lo:hi]))
+        with self.lock:
+            recent = list(self.pending.get(path, []))
+            entry = self.channels.get((device, channel))
+            if entry is not None:
+                current = entry[1][tier_index].record()
+                if current is not None:
+                    recent.append(current)
+        if recent:
+            recent = np.array(recent, dtype=ROLLUP_DTYPE)
+            parts.append(recent[(recent["t"] > first) & (recent["t"] < end)])
+        if not parts:
+            return np.empty(0, dtype=ROLLUP_DTYPE)
+        return np.concatenate(parts)
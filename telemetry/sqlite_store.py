@@ -0,0 +1,133 @@
+import queue
+import sqlite3
+import threading
+import time
+import numpy as np
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    id INTEGER PRIMARY KEY,
+    device TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    UNIQUE (device, channel)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    channel_id INTEGER NOT NULL REFERENCES channels(id),
+    t REAL NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_channel_t ON samples (channel_id, t);
+"""
+
+class SQLiteStore():
+    """Telemetry backend writing readings to a local SQLite database.
+
+    The database runs in WAL mode so readers never block the writer. Samples
+    are queued by the acquisition threads and inserted by one writer thread in
+    batched transactions. Samples are indexed by (device, channel) id and time,
+    so range queries only touch the rows they return.
+    """
+    def __init__(self, path, batch_size=1000, flush_interval=1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.channel_ids = {}
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.close()
+
+        self.stop_evt = threading.Event()
+        self.flushed = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def add(self, device, channel, value, t=None):
+        if value is None or not isinstance(value, (bool, int, float)):
+            return
+        if t is None:
+            t = time.time()
+        self.queue.put((device, channel, t, float(value)))
+
+    def add_reading(self, device, reading, t=None):
+        if t is None:
+            t = time.time()
+        for channel, value in reading.items():
+            self.add(device, channel, value, t)
+
+    def flush(self, timeout=5.0):
+        """Blocks until everything queued so far has been committed."""
+        self.flushed.clear()
+        self.queue.put(None)
+        self.flushed.wait(timeout)
+
+    def close(self):
+        self.flush()
+        self.stop_evt.set()
+        self.queue.put(None)
+        self.thread.join(timeout=5)
+
+    def _channel_id(self, conn, device, channel):
+        key = (device, channel)
+        cid = self.channel_ids.get(key)
+        if cid is None:
+            conn.execute("INSERT OR IGNORE INTO channels (device, channel) VALUES (?, ?)", key)
+            cid = conn.execute("SELECT id FROM channels WHERE device = ? AND channel = ?", key).fetchone()[0]
+            self.channel_ids[key] = cid
+        return cid
+
+    def _run(self):
+        conn = self._connect()
+        while not self.stop_evt.is_set():
+            batch = []
+            flush_requested = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    flush_requested = True
+                    break
+                batch.append(item)
+            if batch:
+                with conn:
+                    rows = [(self._channel_id(conn, d, c), t, v) for d, c, t, v in batch]
+                    conn.executemany("INSERT INTO samples (channel_id, t, value) VALUES (?, ?, ?)", rows)
+            if flush_requested:
+                self.flushed.set()
+        conn.close()
+
+    def channels(self):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT device, channel FROM channels ORDER BY device, channel").fetchall()
+        finally:
+            conn.close()
+
+    def query(self, device, channel, start, end=None):
+        """Returns (t, v) arrays for one channel between wall times start and end."""
+        if end is None:
+            end = time.time()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT s.t, s.value FROM samples s JOIN channels c ON s.channel_id = c.id "
+                "WHERE c.device = ? AND c.channel = ? AND s.t >= ? AND s.t < ? ORDER BY s.t",
+                (device, channel, start, end)).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return np.empty(0), np.empty(0)
+        data = np.array(rows, dtype=np.float64)
+        return data[:, 0], data[:, 1]
@@ -0,0 +1,174 @@
+import threading
+import time
+import numpy as np
+
+from decimate import minmax_decimate_pieces
+
+# ~36 h of history at the 0.5 s power supply sample time, 4 MB per channel
+DEFAULT_CAPACITY = 2**18
+
+class RingBuffer():
+    """Preallocated ring of (monotonic time, value) samples for one channel.
+
+    Appends are O(1) and never allocate. Timestamps must be non-decreasing so
+    that window queries can binary search instead of scanning.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.v = np.full(capacity, np.nan, dtype=np.float64)
+        self.head = 0   # next slot to write
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, t, value):
+        with self.lock:
+            i = self.head
+            self.t[i] = t
+            self.v[i] = np.nan if value is None else value
+            self.head = (i + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+
+    def _pieces(self, start):
+        # Views of logical samples [start, count), oldest first, in one or two
+        # contiguous pieces. Logical index 0 is the oldest sample, which sits at
+        # head once the ring has wrapped.
+        first = (self.head - self.count) % self.capacity
+        a = first + start
+        b = first + self.count
+        if b <= self.capacity:
+            return [(self.t[a:b], self.v[a:b])]
+        if a >= self.capacity:
+            a -= self.capacity
+            b -= self.capacity
+            return [(self.t[a:b], self.v[a:b])]
+        b -= self.capacity
+        return [(self.t[a:], self.v[a:]), (self.t[:b], self.v[:b])]
+
+    def _slice(self, start):
+        # Copies logical samples [start, count) out oldest first
+        pieces = self._pieces(start)
+        if len(pieces) == 1:
+            return pieces[0][0].copy(), pieces[0][1].copy()
+        return (np.concatenate([t for t, _ in pieces]),
+                np.concatenate([v for _, v in pieces]))
+
+    def _search(self, t0):
+        # Logical index of the first sample with t >= t0
+        first = (self.head - self.count) % self.capacity
+        older = self.t[first:min(first + self.count, self.capacity)]
+        i = np.searchsorted(older, t0, side='left')
+        if i < len(older):
+            return int(i)
+        newer = self.t[:self.count - len(older)]
+        return len(older) + int(np.searchsorted(newer, t0, side='left'))
+
+    def last(self, n=None):
+        """Returns (t, v) arrays of the last n samples (all if n is None)."""
+        with self.lock:
+            n = self.count if n is None else min(n, self.count)
+            return self._slice(self.count - n)
+
+    def since(self, t0):
+        """Returns (t, v) arrays of every sample taken at or after t0."""
+        with self.lock:
+            return self._slice(self._search(t0))
+
+    def window(self, seconds, now=None):
+        """Returns (t, v) arrays for the last `seconds` of history."""
+        if now is None:
+            now = time.monotonic()
+        return self.since(now - seconds)
+
+    def minmax(self, seconds, n_bins, now=None):
+        """minmax_decimate of the last `seconds`, binned in place so that only
+        the (at most 2*n_bins) points returned are copied out of the ring."""
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            return minmax_decimate_pieces(self._pieces(self._search(now - seconds)), n_bins)
+
+    def latest(self):
+        """Returns the most recent (t, v) sample, or None if empty."""
+        with self.lock:
+            if self.count == 0:
+                return None
+            i = (self.head - 1) % self.capacity
+            return float(self.t[i]), float(self.v[i])
+
+    def stats(self, seconds, now=None):
+        """Returns min/max/mean/count over the last `seconds`, ignoring NaNs."""
+        t, v = self.window(seconds, now)
+        v = v[~np.isnan(v)]
+        if len(v) == 0:
+            return {"min": None, "max": None, "mean": None, "count": 0}
+        return {"min": float(v.min()), "max": float(v.max()), "mean": float(v.mean()), "count": len(v)}
+
+class TimeSeriesStore():
+    """Recent history of every device reading, one RingBuffer per channel.
+
+    Channels are addressed by (device, channel), e.g. ("HV", "IMON"). Buffers
+    are created on first append, so memory is bounded by the number of channels
+    times `capacity`; queries of a channel never appended to return empty
+    results without allocating one.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def buffer(self, device, channel):
+        key = (device, channel)
+        buf = self.buffers.get(key)
+        if buf is None:
+            with self.lock:
+                buf = self.buffers.setdefault(key, RingBuffer(self.capacity))
+        return buf
+
+    def channels(self, device=None):
+        return [key for key in list(self.buffers) if device is None or key[0] == device]
+
+    def append(self, device, channel, value, t=None):
+        if t is None:
+            t = time.monotonic()
+        self.buffer(device, channel).append(t, value)
+
+    def append_reading(self, device, reading, t=None):
+        """Appends every numeric value of a {channel: value} reading at one timestamp."""
+        if t is None:
+            t = time.monotonic()
+        for channel, value in reading.items():
+            if value is None or isinstance(value, (bool, int, float)):
+                self.buffer(device, channel).append(t, value)
+
+    def window(self, device, channel, seconds, now=None):
+        buf = self.buffers.get((device, channel))
+        if buf is None:
+            return np.empty(0), np.empty(0)
+        return buf.window(seconds, now)
+
+    def minmax(self, device, channel, seconds, n_bins, now=None):
+        buf = self.buffers.get((device, channel))
+        if buf is None:
+            return np.empty(0), np.empty(0)
+        return buf.minmax(seconds, n_bins, now)
+
+    def last(self, device, channel, n=None):
+        buf = self.buffers.get((device, channel))
+        if buf is None:
+            return np.empty(0), np.empty(0)
+        return buf.last(n)
+
+    def latest(self, device, channel):
+        buf = self.buffers.get((device, channel))
+        return None if buf is None else buf.latest()
+
+    def stats(self, device, channel, seconds, now=None):
+        buf = self.buffers.get((device, channel))
+        if buf is None:
+            return {"min": None, "max": None, "mean": None, "count": 0}
+        return buf.stats(seconds, now)
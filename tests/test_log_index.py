@@ -0,0 +1,107 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+MAIN_DIR = Path(__file__).parent.parent
+for subdir in ("telemetry", "acquisition"):
+    sys.path.append(str(MAIN_DIR / subdir))
+
+from data_logger import DataLogger
+from log_index import LogIndex, parse_lines
+from pollers import ChillerPoller, HVPoller, poll_stamp
+from session_clock import SESSION_CLOCK, Stamp
+
+class Backend():
+    def __init__(self):
+        self.readings = []
+
+    def add_reading(self, device, reading, t):
+        self.readings.append((device, reading, t))
+
+    def flush(self):
+        pass
+
+class Reader():
+    def __init__(self):
+        self.t_request = self.t_reply = None
+
+class Chiller():
+    """Answers the chiller panel's three commands, stamping each as a serial exchange would."""
+    def __init__(self, temps):
+        self.reader = Reader()
+        self.temps = iter(temps)
+
+    def exchange(self, reply):
+        self.reader.t_request = SESSION_CLOCK.now()
+        self.reader.t_reply = self.reader.t_request + 1000
+        return reply
+
+    def get_temperature(self):
+        return self.exchange(next(self.temps))
+
+    def get_work_temperature(self):
+        return self.exchange(-20.0)
+
+    def get_power(self):
+        return self.exchange("1\r")
+
+def make_logger(tmp_path, device, backend):
+    logger = DataLogger(device, device, "test", [backend])
+    logger.resultdir = tmp_path
+    logger.start()
+    return logger
+
+def test_chiller_panel_log_loads_every_column(tmp_path):
+    backend = Backend()
+    logger = make_logger(tmp_path, "Chiller", backend)
+    chiller = Chiller([20.0, 19.5, 19.0])
+    for _ in range(3):
+        # As ChillerPanel.chiller_run logs a poll
+        messages = ChillerPoller.read_chiller(chiller)
+        values = {key: value for reading, _ in messages for key, value in reading.items()}
+        for reading, stamp in messages:
+            logger.add_reading(reading, stamp)
+        logger.write(ChillerPoller.log_data(values), None, poll_stamp(messages))
+
+    times, columns = LogIndex(logger.outfile).load()
+    assert len(times) == 3
+    assert set(columns) == {"Power", "Set Temp (°C)", "Curr Temp (°C)"}
+    np.testing.assert_array_equal(columns["Curr Temp (°C)"], [20.0, 19.5, 19.0])
+    np.testing.assert_array_equal(columns["Set Temp (°C)"], [-20.0, -20.0, -20.0])
+    # The backends still get one reading per exchange
+    assert len(backend.readings) == 9
+
+def test_hv_panel_log_keeps_columns_read_on_earlier_polls(tmp_path):
+    logger = make_logger(tmp_path, "HV", Backend())
+    values = dict.fromkeys(HVPoller.readers)
+    polls = [{"STAT": 1, "VSET": 100.0, "VMON": 99.9, "ISET": 5.0, "IMON": 0.1},
+             {"VMON": 100.0, "IMON": 0.2},
+             {"IMON": 0.3}]
+    for reading in polls:
+        # As HVPanel.hv_run logs a poll that read only what was due
+        now = SESSION_CLOCK.now()
+        messages = [({param: value}, Stamp(now, now + 1000)) for param, value in reading.items()]
+        values.update(reading)
+        logger.write(HVPoller.log_data(dict(values, OUTPUT=HVPoller.output(values["STAT"]))),
+                     None, poll_stamp(messages))
+
+    times, columns = LogIndex(logger.outfile).load()
+    assert len(times) == 3
+    np.testing.assert_array_equal(columns["VSET"], [100.0, 100.0, 100.0])
+    np.testing.assert_array_equal(columns["VMON"], [99.9, 100.0, 100.0])
+    np.testing.assert_array_equal(columns["IMON"], [0.1, 0.2, 0.3])
+    np.testing.assert_array_equal(columns["OUTPUT"], [1, 1, 1])
+    np.testing.assert_array_equal(columns["Status"], [1, 1, 1])
+
+def test_parse_lines_takes_the_union_of_keys():
+    lines = ["2025-01-01-20-00-00.000000: {'VSET': 100.0, 'VMON': 99.9}",
+             "2025-01-01-20-00-01.000000: {'IMON': 0.2}",
+             "2025-01-01-20-00-02.000000: None",
+             "2025-01-01-20-00-03.000000: {'VMON': 100.0, 'Status': 'ON'}"]
+    names, values = parse_lines(lines)
+    assert names == ["VSET", "VMON", "IMON", "Status"]
+    np.testing.assert_array_equal(values, [[100.0, 99.9, np.nan, np.nan],
+                                           [np.nan, np.nan, 0.2, np.nan],
+                                           [np.nan, np.nan, np.nan, np.nan],
+                                           [np.nan, 100.0, np.nan, np.nan]])